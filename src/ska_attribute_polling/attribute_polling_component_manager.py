@@ -11,13 +11,22 @@ from __future__ import annotations
 import logging
 import time
 from dataclasses import dataclass
+from enum import Enum
 from functools import cached_property
-from typing import Any, Callable, Mapping, Sequence, cast
+from typing import Any, Callable, Iterable, Mapping, Sequence, cast
 
+import numpy as np
 from more_itertools import iter_except
-from ska_control_model import PowerState, TaskStatus
-from ska_tango_base.base import CommunicationStatusCallbackType, TaskCallbackType
-from ska_tango_base.poller import PollingComponentManager
+from ska_control_model import CommunicationStatus, PowerState, TaskStatus
+from ska_tango_base.base import (
+    BaseComponentManager,
+    CommunicationStatusCallbackType,
+    TaskCallbackType,
+)
+
+from .poll_scheduler import PollScheduler
+from .poll_stats import PollStats
+from .shared_poller import shared_poller
 
 
 @dataclass
@@ -31,6 +40,39 @@ class AttrPollRequest:
 AttrPollResponse = dict[str, Any]
 
 
+class SpectrumValue(np.ndarray):
+    """
+    A NumPy array that is equal to any array with the same shape and elements.
+
+    Component state updates are only passed on for values that have changed,
+    which is decided with ``!=``. Plain arrays compare element-wise, and
+    refuse to be used as a bool, so SPECTRUM attribute values that are NumPy
+    arrays should be views of this class.
+    """
+
+    def __eq__(self: SpectrumValue, other: object) -> bool:  # type: ignore[override]
+        """
+        Compare with another value, as a whole.
+
+        :param other: the value to compare with
+
+        :return: whether other is an array-like with the same shape and elements
+        """
+        return bool(np.array_equal(self, cast(Any, other)))
+
+    def __ne__(self: SpectrumValue, other: object) -> bool:  # type: ignore[override]
+        """
+        Compare with another value, as a whole.
+
+        :param other: the value to compare with
+
+        :return: whether other differs in shape or in any element
+        """
+        return not self.__eq__(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+
 @dataclass(frozen=True)
 class AttrInfo:
     """
@@ -44,7 +86,7 @@ class AttrInfo:
     """
 
     # pylint: disable=missing-function-docstring
-    attr_args: dict[str, Any]
+    attr_args: Mapping[str, Any]
     polling_period: float
 
     @cached_property
@@ -55,11 +97,100 @@ class AttrInfo:
     def name(self: AttrInfo) -> str:  # noqa: D102
         return cast(str, self.attr_args["name"])
 
+    @cached_property
+    def deadbands(self: AttrInfo) -> tuple[float | None, float | None]:
+        """
+        Return the absolute and relative (%) change needed to report a new value.
 
-class AttributePollingComponentManager(
-    PollingComponentManager[AttrPollRequest, AttrPollResponse]
-):
-    """An implementation of the attribute polling component manager."""
+        These come from the abs_change and rel_change attribute args, which
+        Tango also uses to decide when to send change events. Tango allows
+        them to be strings, and even a pair of different thresholds for
+        decreases and increases; in that case we use the smaller one.
+
+        :return: the absolute and relative thresholds, or None if not set
+        """
+
+        def threshold(arg: Any) -> float | None:
+            if arg is None:
+                return None
+            if isinstance(arg, str):
+                return min(abs(float(part)) for part in arg.split(","))
+            return abs(float(arg))
+
+        return (
+            threshold(self.attr_args.get("abs_change")),
+            threshold(self.attr_args.get("rel_change")),
+        )
+
+    def is_change(self: AttrInfo, old: Any, new: Any) -> bool:
+        """
+        Return whether a newly polled value should be reported.
+
+        Numeric values, including numeric arrays, only count as changed if
+        they moved by at least one of the deadbands, if there are any.
+        Anything else counts as changed if it's not equal to the old value.
+
+        :param old: the value last reported
+        :param new: the newly polled value
+
+        :return: whether new is different enough from old to report
+        """
+        abs_change, rel_change = self.deadbands
+        if (
+            (abs_change is None and rel_change is None)
+            or not _is_numeric(old)
+            or not _is_numeric(new)
+        ):
+            return bool(old != new)
+        old_array, new_array = np.asarray(old, float), np.asarray(new, float)
+        if old_array.shape != new_array.shape:
+            return True
+        delta = np.abs(new_array - old_array)
+        exceeded = np.zeros(delta.shape, dtype=bool)
+        if abs_change is not None:
+            exceeded |= delta >= abs_change
+        if rel_change is not None:
+            exceeded |= delta >= np.abs(old_array) * rel_change / 100
+        exceeded &= delta > 0
+        exceeded |= np.isnan(old_array) != np.isnan(new_array)
+        return bool(exceeded.any())
+
+
+def _is_numeric(value: Any) -> bool:
+    """
+    Return whether a value is a number, or an array of numbers.
+
+    Booleans and enums are ints, but deadbands make no sense for them.
+
+    :param value: the value to check
+
+    :return: whether deadbands can be applied to the value
+    """
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in "iuf"
+    return isinstance(value, (int, float, np.integer, np.floating)) and not (
+        isinstance(value, (bool, Enum))
+    )
+
+
+class AttributePollingComponentManager(BaseComponentManager):
+    """
+    An implementation of the attribute polling component manager.
+
+    It implements the same poll model as ska-tango-base's
+    PollingComponentManager, but is polled by the process-wide SharedPoller
+    rather than by a poller thread of its own, so that a device server's
+    thread count doesn't grow with its number of devices.
+    """
+
+    # How long to wait after a write before polling, so that a burst of
+    # writes is sent in as few SET PDUs as possible
+    _write_coalescing_window = 0.05
+
+    # Attributes that can't be read this many polls in a row are quarantined,
+    # and read at most once per quarantine period until they can be read again
+    _quarantine_failures = 3
+    _quarantine_period = 60.0
 
     # pylint: disable=too-many-positional-arguments
     def __init__(  # noqa: D107
@@ -75,21 +206,54 @@ class AttributePollingComponentManager(
             logger,
             communication_state_callback,
             component_state_callback,
-            poll_rate=poll_rate,
             **{attr.name: None for attr in attributes},
         )
+        self._poll_rate = poll_rate
 
         # The same map, but mapping by Tango attribute name
         self._attributes: Mapping[str, AttrInfo] = {
             attr.name: attr for attr in attributes
         }
 
-        # Writes accumulate here in between polls
+        # Writes accumulate here in between polls, as do the names of
+        # attributes to read on the next poll whether or not they're due
         self._pending_writes: dict[str, Any] = {}
+        self._pending_reads: dict[str, None] = {}
+
+        # When each attribute is next due to be read. Every attribute is read
+        # once at startup, after which each one is rescheduled polling_period
+        # after its last successful read.
+        self._scheduler: PollScheduler[str] = PollScheduler()
+        for attr in attributes:
+            self._scheduler.schedule(attr.name, float("-inf"))
+
+        # Attributes taken off the schedule by get_request() but not yet
+        # successfully read. They are requested again by the next poll.
+        self._unconfirmed_reads: set[str] = set()
+
+        # How many polls in a row each attribute has been read as invalid
+        self._read_failures: dict[str, int] = {}
+
+        # Diagnostics: see PollStats. Subclasses add their own counts.
+        self.stats = PollStats()
+        self._poll_started = time.monotonic()
 
-        # store the last time each attribute was successfully polled,
-        # used to calculate when to poll again based on polling_period
-        self._last_polled = {attr.name: float("-inf") for attr in attributes}
+    def start_communicating(self: AttributePollingComponentManager) -> None:
+        """Start polling, on the shared poller."""
+        shared_poller().start_polling(self, self._poll_rate)
+
+    def stop_communicating(self: AttributePollingComponentManager) -> None:
+        """Stop polling, once any poll in progress has finished."""
+        shared_poller().stop_polling(self)
+
+    def polling_started(self: AttributePollingComponentManager) -> None:
+        """Respond to polling having started."""
+        self._update_communication_state(CommunicationStatus.NOT_ESTABLISHED)
+
+    def polling_stopped(self: AttributePollingComponentManager) -> None:
+        """Respond to polling having stopped."""
+        self._update_component_state(power=PowerState.UNKNOWN, fault=None)
+        self._update_communication_state(CommunicationStatus.DISABLED)
 
     def get_request(self: AttributePollingComponentManager) -> AttrPollRequest:
         """
@@ -97,20 +261,29 @@ class AttributePollingComponentManager(
 
         The writes appear first, and come from `self._pending_writes`. Reads
         are requested for each attribute whose last successful poll happened
-        longer ago than its polling period, and each attribute being written.
+        longer ago than its polling period, each attribute that the previous
+        poll failed to read, each attribute passed to enqueue_reads(), and
+        each attribute being written.
 
         :return: a list of attributes that should be polled next.
         """
         # atomically drain the write queue
         writes = dict(iter_except(self._pending_writes.popitem, KeyError))
 
+        self._poll_started = time.monotonic()
         now = time.time()
-        reads = [
-            attr_name
-            for attr_name, attr in self._attributes.items()
-            if now - self._last_polled[attr_name] >= attr.polling_period
-            or attr_name in writes  # bonus poll after writing
-        ]
+        # How late the most overdue attribute is. At startup, every
+        # attribute is due at -inf, which isn't lateness.
+        next_deadline = self._scheduler.next_deadline()
+        if float("-inf") < next_deadline <= now:
+            self.stats.lags.add(now - next_deadline)
+
+        reads = self._scheduler.pop_due(now)
+        reads.extend(self._unconfirmed_reads.difference(reads))
+        requested = dict(iter_except(self._pending_reads.popitem, KeyError))
+        reads.extend(requested.keys() - set(reads))
+        reads.extend(writes.keys() - set(reads))  # bonus poll after writing
+        self._unconfirmed_reads = set(reads)
 
         return AttrPollRequest(writes, reads)
 
@@ -135,15 +308,88 @@ class AttributePollingComponentManager(
         Notify the device of the return values of a successful poll.
 
         This involves type coercion from PySNMP- to PyTango-compatible types.
+        Values that haven't changed by at least the attribute's abs_change or
+        rel_change aren't passed on, so the attribute keeps its last reported
+        value and no events are pushed for it.
+
+        A value of None means that the attribute was read, but has no valid
+        value, e.g. because the device doesn't implement it. The attribute's
+        quality becomes invalid, and if this keeps happening, the attribute is
+        quarantined: it is only read once per quarantine period, rather than
+        every polling period, until it has a valid value again.
 
         :param poll_response: the snmp response
         """
-        super().poll_succeeded(poll_response)
+        self._update_communication_state(CommunicationStatus.ESTABLISHED)
+        self.stats.end_cycle(time.monotonic() - self._poll_started)
 
         now = time.time()
-        self._last_polled.update((k, now) for k in poll_response)
+        for attr_name, value in poll_response.items():
+            polling_period = self._polling_period(self._attributes[attr_name])
+            if self._is_quarantined(attr_name, value is None):
+                polling_period = max(polling_period, self._quarantine_period)
+            self._scheduler.schedule(attr_name, now + polling_period)
+        self._unconfirmed_reads.difference_update(poll_response)
+
+        # Only report values that have changed by more than their deadbands,
+        # so that unchanged values don't cause Tango events
+        changes = {
+            attr_name: value
+            for attr_name, value in poll_response.items()
+            if self._attributes[attr_name].is_change(
+                self._component_state[attr_name], value
+            )
+        }
+        self._update_component_state(power=PowerState.ON, **changes)
+
+    def _polling_period(
+        self: AttributePollingComponentManager, attr: AttrInfo
+    ) -> float:
+        """
+        Return how long to wait after reading an attribute before reading it again.
+
+        :param attr: the attribute
 
-        self._update_component_state(power=PowerState.ON, **poll_response)
+        :return: the attribute's polling period, in seconds
+        """
+        return attr.polling_period
+
+    def _is_quarantined(
+        self: AttributePollingComponentManager, attr_name: str, failed: bool
+    ) -> bool:
+        """
+        Count a read of an attribute, and return whether it is quarantined.
+
+        :param attr_name: the name of the attribute that was read
+        :param failed: whether the read returned an invalid value
+
+        :return: whether the attribute has failed too many reads in a row
+        """
+        if not failed:
+            if self._read_failures.pop(attr_name, 0) >= self._quarantine_failures:
+                self.logger.info(f"{attr_name} is readable again")
+            return False
+        failures = self._read_failures.get(attr_name, 0) + 1
+        self._read_failures[attr_name] = failures
+        if failures == self._quarantine_failures:
+            self.logger.warning(
+                f"{attr_name} failed {failures} reads in a row, reading it"
+                f" every {self._quarantine_period}s until it recovers"
+            )
+        return failures >= self._quarantine_failures
+
+    @property
+    def quarantined_attributes(self: AttributePollingComponentManager) -> list[str]:
+        """
+        Return the attributes that are read less often because they keep failing.
+
+        :return: the names of the quarantined attributes
+        """
+        return sorted(
+            name
+            for name, failures in self._read_failures.items()
+            if failures >= self._quarantine_failures
+        )
 
     def enqueue_write(
         self: AttributePollingComponentManager, attr_name: str, val: Any
@@ -152,12 +398,30 @@ class AttributePollingComponentManager(
         Queue an attribute value to be written on the next poll.
 
         If there is already a write pending for the attribute, it will be superseded.
+        Rather than waiting for the next scheduled poll, the poller is woken
+        shortly afterwards, once any other writes in the same burst have
+        been queued too.
 
         :param attr_name: the name of the attribute to be written
         :param val: the attribute value to write
         """
         converted_value = self.from_python(attr_name, val)
         self._pending_writes[attr_name] = converted_value
+        shared_poller().wake(self, self._write_coalescing_window)
+
+    def enqueue_reads(
+        self: AttributePollingComponentManager, attr_names: Iterable[str]
+    ) -> None:
+        """
+        Read attributes on the next poll, even if they aren't due yet.
+
+        As with writes, the poller is woken shortly afterwards rather than
+        waiting for the next scheduled poll.
+
+        :param attr_names: the names of the attributes to read
+        """
+        self._pending_reads.update(dict.fromkeys(attr_names))
+        shared_poller().wake(self, self._write_coalescing_window)
 
     def from_python(
         self: AttributePollingComponentManager, attr_name: str, val: Any
@@ -248,7 +512,9 @@ class AttributePollingComponentManager(
         :param exception: the exception that was raised by a recent poll
             attempt.
         """
-        super().poll_failed(exception)
+        self._update_communication_state(CommunicationStatus.NOT_ESTABLISHED)
+        self.logger.error(f"Poll failed: {exception!r}")
+        self.stats.end_cycle(time.monotonic() - self._poll_started)
 
         # Should this go before or after updating the communication state?
         self._update_component_state(power=PowerState.UNKNOWN)
@@ -8,11 +8,12 @@
 """This module implements a generic pollingdevice."""
 from __future__ import annotations
 
+import time
 from typing import Any
 
 from ska_control_model import CommunicationStatus, PowerState
 from ska_tango_base import SKABaseDevice
-from tango import AttReqType, Attribute, AttrQuality, WAttribute
+from tango import AttrDataFormat, AttReqType, Attribute, AttrQuality, WAttribute
 from tango.server import attribute, device_property
 
 from .attribute_polling_component_manager import (
@@ -73,6 +74,84 @@ class AttributePollingDevice(SKABaseDevice[AttributePollingComponentManager]):
             attr.set_quality(AttrQuality.ATTR_VALID)
             attr.set_value(val)
 
+    # Diagnostics, from the component manager's PollStats
+    # pylint: disable=invalid-name
+
+    @attribute(dtype=float, unit="s")
+    def pollDuration(self: AttributePollingDevice) -> float:
+        """
+        Return how long the last poll took.
+
+        :return: the duration of the last poll, in seconds
+        """
+        return self.component_manager.stats.durations.last
+
+    @attribute(dtype=float, unit="s")
+    def pollDurationP50(self: AttributePollingDevice) -> float:
+        """
+        Return the median duration of recent polls.
+
+        :return: the 50th percentile poll duration, in seconds
+        """
+        return self.component_manager.stats.durations.percentile(50)
+
+    @attribute(dtype=float, unit="s")
+    def pollDurationP95(self: AttributePollingDevice) -> float:
+        """
+        Return the 95th percentile duration of recent polls.
+
+        :return: the 95th percentile poll duration, in seconds
+        """
+        return self.component_manager.stats.durations.percentile(95)
+
+    @attribute(dtype=float, unit="s")
+    def pollDurationP99(self: AttributePollingDevice) -> float:
+        """
+        Return the 99th percentile duration of recent polls.
+
+        :return: the 99th percentile poll duration, in seconds
+        """
+        return self.component_manager.stats.durations.percentile(99)
+
+    @attribute(dtype=int)
+    def pollCount(self: AttributePollingDevice) -> int:
+        """
+        Return the number of polls made.
+
+        :return: the total number of polls, successful or not
+        """
+        return self.component_manager.stats.polls
+
+    @attribute(dtype=float, unit="s")
+    def schedulerLag(self: AttributePollingDevice) -> float:
+        """
+        Return how late the most overdue attribute was in the last poll.
+
+        :return: how long after the end of its polling period the most
+            overdue attribute was read, in seconds
+        """
+        return self.component_manager.stats.lags.last
+
+    @attribute(dtype=float, unit="s")
+    def schedulerLagP95(self: AttributePollingDevice) -> float:
+        """
+        Return the 95th percentile of how late the most overdue attribute was.
+
+        :return: the 95th percentile scheduler lag of recent polls, in seconds
+        """
+        return self.component_manager.stats.lags.percentile(95)
+
+    @attribute(dtype=int)
+    def conversionFailures(self: AttributePollingDevice) -> int:
+        """
+        Return the number of polled values that couldn't be converted.
+
+        :return: the total number of conversion failures
+        """
+        return self.component_manager.stats.totals["conversion_failures"]
+
+    # pylint: enable=invalid-name
+
     def _dynamic_set(self: AttributePollingDevice, attr: WAttribute) -> None:
         value = attr.get_write_value()
         attr_name = attr.get_name()
@@ -86,5 +165,26 @@ class AttributePollingDevice(SKABaseDevice[AttributePollingComponentManager]):
     ) -> None:
         super()._component_state_changed(fault=fault, power=power)
         for name, value in kwargs.items():
+            if value is None:
+                # Tango doesn't send the value of an invalid attribute, but
+                # it still has to be one of the attribute's type
+                args = (_placeholder(self._dynamic_attrs[name]), time.time())
+                self.push_change_event(name, *args, AttrQuality.ATTR_INVALID)
+                self.push_archive_event(name, *args, AttrQuality.ATTR_INVALID)
+                continue
             self.push_change_event(name, value)
             self.push_archive_event(name, value)
+
+
+def _placeholder(attr_info: AttrInfo) -> Any:
+    """
+    Return a value of an attribute's type, to push with invalid quality.
+
+    :param attr_info: the attribute's metadata
+
+    :return: an empty or zero value of the attribute's type
+    """
+    dformat = attr_info.attr_args.get("dformat", AttrDataFormat.SCALAR)
+    if dformat != AttrDataFormat.SCALAR or isinstance(attr_info.dtype, tuple):
+        return []
+    return {str: "", bool: False, float: 0.0}.get(attr_info.dtype, 0)
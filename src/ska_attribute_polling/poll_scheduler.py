@@ -0,0 +1,118 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module implements a deadline scheduler for polled attributes."""
+from __future__ import annotations
+
+import heapq
+import itertools
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class PollScheduler(Generic[K]):
+    """
+    A priority queue of keys, ordered by the time each one is next due.
+
+    Taking the due keys only touches those keys, plus any stale heap entries
+    left behind by rescheduling, so the cost of a poll cycle doesn't grow with
+    the number of attributes that aren't due. Keys scheduled at infinity are
+    never due, and aren't stored at all.
+
+    Taking a key removes it from the schedule; it's up to the caller to
+    schedule it again once it has been polled.
+    """
+
+    def __init__(self: PollScheduler[K]) -> None:
+        """Create an empty scheduler."""
+        # Heap of (deadline, tie-breaker, key). A key's entry is only live if
+        # its deadline matches self._deadlines; rescheduling leaves the old
+        # entry in the heap, to be discarded when it reaches the top.
+        self._heap: list[tuple[float, int, K]] = []
+        self._deadlines: dict[K, float] = {}
+        self._counter = itertools.count()
+
+    def __len__(self: PollScheduler[K]) -> int:
+        """
+        Return the number of scheduled keys.
+
+        :return: the number of keys with a finite deadline
+        """
+        return len(self._deadlines)
+
+    def __contains__(self: PollScheduler[K], key: object) -> bool:
+        """
+        Return whether a key is scheduled.
+
+        :param key: the key to look for
+
+        :return: whether the key has a finite deadline
+        """
+        return key in self._deadlines
+
+    def deadline(self: PollScheduler[K], key: K) -> float:
+        """
+        Return the time a key is next due.
+
+        :param key: the key to look up
+
+        :return: the key's deadline, or infinity if it isn't scheduled
+        """
+        return self._deadlines.get(key, float("inf"))
+
+    def schedule(self: PollScheduler[K], key: K, deadline: float) -> None:
+        """
+        Schedule a key to be due at the given time, replacing any existing deadline.
+
+        :param key: the key to schedule
+        :param deadline: when the key is due, in the same units as the times
+            later passed to pop_due(). Infinity unschedules the key.
+        """
+        if deadline == float("inf"):
+            self._deadlines.pop(key, None)
+            return
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+
+    def pop_due(self: PollScheduler[K], now: float) -> list[K]:
+        """
+        Remove and return every key due at or before the given time.
+
+        :param now: the current time
+
+        :return: the due keys, most overdue first
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                due.append(key)
+        return due
+
+    def next_deadline(self: PollScheduler[K]) -> float:
+        """
+        Return the earliest deadline of any scheduled key.
+
+        :return: the earliest deadline, or infinity if nothing is scheduled
+        """
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            if self._deadlines.get(key) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return float("inf")
+
+    def _compact(self: PollScheduler[K]) -> None:
+        """Rebuild the heap without its stale entries."""
+        self._heap = [
+            entry for entry in self._heap if self._deadlines.get(entry[2]) == entry[0]
+        ]
+        heapq.heapify(self._heap)
@@ -0,0 +1,102 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module implements cheap statistics about poll cycles."""
+from __future__ import annotations
+
+from collections import Counter, deque
+
+import numpy as np
+
+
+class RollingWindow:
+    """
+    The most recent samples of a measurement, for percentiles.
+
+    Adding a sample is just an append to a bounded deque, so it costs the
+    poller nothing. Percentiles are only computed when they are read.
+    """
+
+    def __init__(self: RollingWindow, size: int = 1000) -> None:
+        """
+        Create an empty window.
+
+        :param size: how many of the most recent samples to keep
+        """
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def __len__(self: RollingWindow) -> int:
+        """
+        Return the number of samples in the window.
+
+        :return: the number of samples
+        """
+        return len(self._samples)
+
+    def add(self: RollingWindow, sample: float) -> None:
+        """
+        Add a sample, dropping the oldest one if the window is full.
+
+        :param sample: the measurement
+        """
+        self._samples.append(sample)
+
+    @property
+    def last(self: RollingWindow) -> float:
+        """
+        Return the most recent sample.
+
+        :return: the last sample added, or 0 if there are none
+        """
+        return self._samples[-1] if self._samples else 0.0
+
+    def percentile(self: RollingWindow, percent: float) -> float:
+        """
+        Return a percentile of the samples in the window.
+
+        :param percent: the percentile to compute, from 0 to 100
+
+        :return: the percentile, or 0 if there are no samples
+        """
+        if not self._samples:
+            return 0.0
+        return float(np.percentile(self._samples, percent))
+
+
+class PollStats:
+    """
+    Statistics about the poll cycles of a component manager.
+
+    Poll durations and scheduler lag are kept in rolling windows. Anything
+    else is a named count, added to the current cycle's counter while it
+    runs; when the cycle ends, its counts are kept as last_cycle and added
+    to the running totals. polls counts the cycles that have ended.
+    """
+
+    def __init__(self: PollStats, window: int = 1000) -> None:
+        """
+        Create empty statistics.
+
+        :param window: how many cycles to compute percentiles over
+        """
+        self.durations = RollingWindow(window)
+        self.lags = RollingWindow(window)
+        self.cycle: Counter[str] = Counter()
+        self.last_cycle: Counter[str] = Counter()
+        self.totals: Counter[str] = Counter()
+        self.polls = 0
+
+    def end_cycle(self: PollStats, duration: float) -> None:
+        """
+        Record the end of a poll cycle.
+
+        :param duration: how long the cycle took, in seconds
+        """
+        self.durations.add(duration)
+        self.polls += 1
+        self.last_cycle, self.cycle = self.cycle, Counter()
+        self.totals.update(self.last_cycle)
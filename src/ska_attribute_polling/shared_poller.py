@@ -0,0 +1,282 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module implements the process-wide poller of attribute polling devices."""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+from .poll_scheduler import PollScheduler
+
+# Set to the number of worker threads of the shared poller
+POLL_WORKERS_ENV = "SKA_ATTRIBUTE_POLLING_WORKERS"
+DEFAULT_POLL_WORKERS = 8
+
+
+class PollModel(Protocol):
+    """The hooks through which the shared poller polls a component manager."""
+
+    # pylint: disable=missing-function-docstring
+    logger: logging.Logger
+
+    def __hash__(self) -> int:  # noqa: D105
+        ...
+
+    def get_request(self) -> Any:  # noqa: D102
+        ...
+
+    def poll(self, poll_request: Any) -> Any:  # noqa: D102
+        ...
+
+    def poll_succeeded(self, poll_response: Any) -> None:  # noqa: D102
+        ...
+
+    def poll_failed(self, exception: Exception) -> None:  # noqa: D102
+        ...
+
+    def polling_started(self) -> None:  # noqa: D102
+        ...
+
+    def polling_stopped(self) -> None:  # noqa: D102
+        ...
+
+
+@dataclass
+class _PollState:
+    """How a component manager is being polled."""
+
+    poll_rate: float
+    # Whether the component manager should be polled
+    polling: bool = False
+    # Whether polling_started() has been called, without polling_stopped()
+    started: bool = False
+    # Whether a worker has taken it off the schedule, to poll it
+    busy: bool = False
+    # Whether to poll it again as soon as the poll in progress has finished
+    woken: bool = False
+
+
+class SharedPoller:
+    """
+    The poller of every attribute polling component manager in the process.
+
+    Rather than each component manager having a poller thread of its own,
+    a small pool of worker threads polls all of them, so the number of
+    threads doesn't grow with the number of devices. A PollScheduler holds
+    the time each communicating component manager is next due to be polled,
+    and whichever worker is free takes the most overdue one.
+
+    Each component manager is polled as ska-tango-base's Poller would: poll
+    cycles run one at a time, poll_rate seconds apart, between calls to
+    polling_started() and polling_stopped(). Different component managers
+    are polled concurrently, by different workers.
+    """
+
+    def __init__(self: SharedPoller, workers: int = DEFAULT_POLL_WORKERS) -> None:
+        """
+        Start the worker threads.
+
+        :param workers: how many component managers may be polled at once
+        """
+        self._condition = threading.Condition()
+        self._states: dict[PollModel, _PollState] = {}
+        self._schedule: PollScheduler[PollModel] = PollScheduler()
+        # Component managers that are due, but not yet taken by a worker
+        self._ready: deque[PollModel] = deque()
+        for number in range(max(1, workers)):
+            threading.Thread(
+                target=self._work, name=f"poller-{number}", daemon=True
+            ).start()
+
+    def start_polling(
+        self: SharedPoller, component_manager: PollModel, poll_rate: float
+    ) -> None:
+        """
+        Start polling a component manager.
+
+        :param component_manager: the component manager to poll
+        :param poll_rate: how long to wait after each poll before the next one
+        """
+        with self._condition:
+            state = self._states.setdefault(component_manager, _PollState(poll_rate))
+            state.poll_rate = poll_rate
+            self._set_polling(component_manager, state, True)
+
+    def stop_polling(self: SharedPoller, component_manager: PollModel) -> None:
+        """
+        Stop polling a component manager, once any poll in progress has finished.
+
+        :param component_manager: the component manager to stop polling
+        """
+        with self._condition:
+            state = self._states.get(component_manager)
+            if state is not None:
+                self._set_polling(component_manager, state, False)
+
+    def wake(
+        self: SharedPoller, component_manager: PollModel, delay: float = 0.0
+    ) -> None:
+        """
+        Poll a component manager soon, rather than at its next scheduled time.
+
+        Waking it again before the delay has passed doesn't postpone the
+        poll, so a burst of wakes leads to a single poll. If it is being
+        polled already, it is polled again straight afterwards. Component
+        managers that aren't being polled are left alone.
+
+        :param component_manager: the component manager to poll
+        :param delay: how long to wait before polling it, in seconds
+        """
+        with self._condition:
+            state = self._states.get(component_manager)
+            if state is None or not state.polling:
+                return
+            if state.busy:
+                state.woken = True
+                return
+            deadline = time.monotonic() + delay
+            if deadline < self._schedule.deadline(component_manager):
+                self._schedule.schedule(component_manager, deadline)
+                self._condition.notify()
+
+    def _set_polling(
+        self: SharedPoller,
+        component_manager: PollModel,
+        state: _PollState,
+        polling: bool,
+    ) -> None:
+        """
+        Start or stop polling a component manager. The condition must be held.
+
+        The transition itself happens on a worker, which calls
+        polling_started() or polling_stopped(), so that it can't overlap a
+        poll in progress.
+
+        :param component_manager: the component manager
+        :param state: its poll state
+        :param polling: whether it should be polled
+        """
+        state.polling = polling
+        if not state.busy and state.polling != state.started:
+            self._schedule.schedule(component_manager, float("-inf"))
+            self._condition.notify()
+
+    def _work(self: SharedPoller) -> None:
+        """Poll component managers as they become due, forever."""
+        while True:
+            with self._condition:
+                component_manager = self._next_due()
+                state = self._states[component_manager]
+            self._poll(component_manager, state)
+            with self._condition:
+                self._reschedule(component_manager, state)
+
+    def _next_due(self: SharedPoller) -> PollModel:
+        """
+        Wait for a component manager to be due, and take it off the schedule.
+
+        The condition must be held.
+
+        :return: the most overdue component manager
+        """
+        while not self._ready:
+            now = time.monotonic()
+            self._ready.extend(self._schedule.pop_due(now))
+            for component_manager in self._ready:
+                self._states[component_manager].busy = True
+            if len(self._ready) > 1:
+                self._condition.notify(len(self._ready) - 1)
+            if not self._ready:
+                deadline = self._schedule.next_deadline()
+                self._condition.wait(
+                    None if deadline == float("inf") else deadline - now
+                )
+        return self._ready.popleft()
+
+    def _poll(
+        self: SharedPoller, component_manager: PollModel, state: _PollState
+    ) -> None:
+        """
+        Run one poll cycle of a component manager.
+
+        :param component_manager: the component manager to poll
+        :param state: its poll state
+        """
+        try:
+            with self._condition:
+                polling = state.polling
+            if polling != state.started:
+                state.started = polling
+                if polling:
+                    component_manager.polling_started()
+                else:
+                    component_manager.polling_stopped()
+            if polling:
+                try:
+                    poll_response = component_manager.poll(
+                        component_manager.get_request()
+                    )
+                except Exception as exception:  # pylint: disable=broad-exception-caught
+                    component_manager.poll_failed(exception)
+                else:
+                    component_manager.poll_succeeded(poll_response)
+        except Exception:  # pylint: disable=broad-exception-caught
+            component_manager.logger.exception("Unexpected error while polling")
+
+    def _reschedule(
+        self: SharedPoller, component_manager: PollModel, state: _PollState
+    ) -> None:
+        """
+        Schedule the next poll cycle of a component manager, if there is one.
+
+        The condition must be held.
+
+        :param component_manager: the component manager that was polled
+        :param state: its poll state
+        """
+        state.busy = False
+        if state.polling != state.started:
+            deadline = float("-inf")
+        elif state.polling:
+            deadline = (
+                float("-inf") if state.woken else time.monotonic() + state.poll_rate
+            )
+        else:
+            del self._states[component_manager]
+            return
+        state.woken = False
+        self._schedule.schedule(component_manager, deadline)
+        self._condition.notify()
+
+
+_shared_poller: SharedPoller | None = None
+_shared_poller_lock = threading.Lock()
+
+
+def shared_poller() -> SharedPoller:
+    """
+    Return the process-wide SharedPoller, creating it if needed.
+
+    Its number of workers is taken from the SKA_ATTRIBUTE_POLLING_WORKERS
+    environment variable, if set.
+
+    :return: the shared poller
+    """
+    global _shared_poller  # pylint: disable=global-statement
+    with _shared_poller_lock:
+        if _shared_poller is None:
+            workers = os.getenv(POLL_WORKERS_ENV, "").strip()
+            _shared_poller = SharedPoller(
+                int(workers) if workers else DEFAULT_POLL_WORKERS
+            )
+        return _shared_poller
@@ -0,0 +1,272 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module implements an SNMP component manager using pysnmp's asyncio API."""
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+import weakref
+from typing import Any, Coroutine, Sequence, TypeVar
+
+from pysnmp.entity.engine import SnmpEngine
+from pysnmp.hlapi import ContextData
+from pysnmp.hlapi.asyncio import UdpTransportTarget, bulkCmd, getCmd, setCmd
+
+from ska_snmp_device.snmp_component_manager import (
+    DeadlineExceeded,
+    SNMPComponentManager,
+    TrafficCounters,
+    response_error,
+)
+
+T = TypeVar("T")
+
+
+class SharedSNMPEngine:
+    """
+    The process-wide SNMP engine used by every AsyncioSNMPComponentManager.
+
+    A single SnmpEngine, UDP socket and event loop thread serve every
+    asyncio-backed device in the device server, so adding such devices adds
+    no SNMP engines, sockets or I/O threads. The total number of outstanding
+    requests is capped, so that a large fleet can't flood the socket or the
+    network.
+
+    Component managers register while they are communicating. When the last
+    one unregisters, the socket is closed and the engine discarded, to be
+    rebuilt if any component manager starts communicating again.
+    """
+
+    def __init__(self: SharedSNMPEngine, max_in_flight: int = 64) -> None:
+        """
+        Start the event loop thread.
+
+        :param max_in_flight: how many requests may be outstanding at once,
+            across all component managers
+        """
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=self.loop.run_forever, name="snmp-asyncio", daemon=True
+        ).start()
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.traffic = TrafficCounters()
+        self._engine: SnmpEngine | None = None
+        self._managers: weakref.WeakSet[SNMPComponentManager] = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def register(
+        self: SharedSNMPEngine, component_manager: SNMPComponentManager
+    ) -> SnmpEngine:
+        """
+        Register a component manager as a user of the engine.
+
+        :param component_manager: the component manager that will use the engine
+
+        :return: the shared SNMP engine
+        """
+        with self._lock:
+            if self._engine is None:
+                self._engine = SnmpEngine()
+                self.traffic.observe(self._engine)
+            self._managers.add(component_manager)
+            return self._engine
+
+    def unregister(
+        self: SharedSNMPEngine, component_manager: SNMPComponentManager
+    ) -> None:
+        """
+        Unregister a component manager, closing the engine if it was the last user.
+
+        :param component_manager: the component manager that no longer needs
+            the engine
+        """
+        with self._lock:
+            self._managers.discard(component_manager)
+            if self._managers or self._engine is None:
+                return
+            engine, self._engine = self._engine, None
+        if engine.transportDispatcher is not None:
+            self.loop.call_soon_threadsafe(engine.transportDispatcher.closeDispatcher)
+
+    def run(self: SharedSNMPEngine, coro: Coroutine[Any, Any, T]) -> T:
+        """
+        Run a coroutine on the event loop, and wait for its result.
+
+        :param coro: the coroutine to run
+
+        :return: the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+_shared_engine: SharedSNMPEngine | None = None
+_shared_engine_lock = threading.Lock()
+
+
+def shared_snmp_engine() -> SharedSNMPEngine:
+    """
+    Return the process-wide SharedSNMPEngine, creating it if needed.
+
+    :return: the shared engine
+    """
+    global _shared_engine  # pylint: disable=global-statement
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = SharedSNMPEngine()
+        return _shared_engine
+
+
+class AsyncioSNMPComponentManager(SNMPComponentManager):
+    """
+    An SNMP component manager whose requests run on a shared asyncio event loop.
+
+    Polling is still driven by the shared poller, whose worker only waits on
+    the result of a coroutine; the requests themselves are all multiplexed
+    onto the SharedSNMPEngine's event loop and socket. This means polls of
+    many attributes and many devices overlap, rather than each one blocking
+    its own dispatcher, and the SNMP machinery doesn't grow with the number
+    of devices.
+    """
+
+    _get_cmd = staticmethod(getCmd)
+    _set_cmd = staticmethod(setCmd)
+    _bulk_cmd = staticmethod(bulkCmd)
+    _transport_cls = UdpTransportTarget
+
+    def _snmp_cmds(
+        self,
+        cmd_fn: SNMPComponentManager.SNMPCmdFn,
+        chunks: Sequence[Sequence[Any]],
+        max_in_flight: int,
+        deadline: float = math.inf,
+    ) -> list[SNMPComponentManager.SNMPCmdResult]:
+        """
+        Execute the given SNMP command once for each chunk of objects.
+
+        The requests are run on the shared event loop, with up to
+        max_in_flight of them outstanding at once (subject to the shared
+        engine's own limit), and this blocks until they have all completed.
+
+        Requests still waiting to be sent or for a response when the deadline
+        passes are abandoned, and fail with DeadlineExceeded.
+
+        :param cmd_fn: the snmp command: Get, Set or GetBulk
+        :param chunks: the arguments for each request: a list of OIDs, or for
+            GETBULK, non-repeaters and max-repetitions followed by the OIDs
+        :param max_in_flight: how many requests may be outstanding at once
+        :param deadline: the time.monotonic() at which to give up on requests
+
+        :return: an (error, var_binds) pair for each chunk, in order
+        """
+        engine, transport = self._get_engine()
+        return shared_snmp_engine().run(
+            self._gather_cmds(
+                engine, transport, cmd_fn, chunks, max_in_flight, deadline
+            )
+        )
+
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    async def _gather_cmds(
+        self,
+        engine: SnmpEngine,
+        transport: UdpTransportTarget,
+        cmd_fn: SNMPComponentManager.SNMPCmdFn,
+        chunks: Sequence[Sequence[Any]],
+        max_in_flight: int,
+        deadline: float,
+    ) -> list[SNMPComponentManager.SNMPCmdResult]:
+        """
+        Run the given SNMP command for each chunk, and gather the results.
+
+        :param engine: the SNMP engine
+        :param transport: the transport target for the agent
+        :param cmd_fn: the snmp command: Get, Set or GetBulk
+        :param chunks: the arguments for each request: a list of OIDs, or for
+            GETBULK, non-repeaters and max-repetitions followed by the OIDs
+        :param max_in_flight: how many requests may be outstanding at once
+        :param deadline: the time.monotonic() at which to give up on requests
+
+        :return: an (error, var_binds) pair for each chunk, in order
+        """
+        in_flight = asyncio.Semaphore(max(1, max_in_flight))
+        shared_in_flight = shared_snmp_engine().in_flight
+
+        async def send_cmd(args: Sequence[Any]) -> Any:
+            result: Any = await cmd_fn(
+                engine,
+                self._access,
+                transport,
+                ContextData(),
+                *args,
+                lookupMib=False,
+            )
+            # pysnmp-lextudio 5's coroutines return a future, not a result
+            if isinstance(result, asyncio.Future):
+                result = await result
+            return result
+
+        async def run_cmd(
+            args: Sequence[Any],
+        ) -> SNMPComponentManager.SNMPCmdResult:
+            async with in_flight, shared_in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return DeadlineExceeded(), []
+                try:
+                    result = await asyncio.wait_for(
+                        send_cmd(args), None if remaining == math.inf else remaining
+                    )
+                except asyncio.TimeoutError:
+                    return DeadlineExceeded(), []
+            error_indication, error_status, error_index, var_binds = result
+            return (
+                response_error(error_indication, error_status, error_index),
+                var_binds,
+            )
+
+        return list(await asyncio.gather(*(run_cmd(args) for args in chunks)))
+
+    def _get_engine(self) -> tuple[SnmpEngine, UdpTransportTarget]:
+        """
+        Return the shared SNMP engine and this device's transport target.
+
+        :return: the shared engine and the asyncio transport target for this device
+        """
+        if self._engine is None or self._transport is None:
+            self._engine = shared_snmp_engine().register(self)
+            self._transport = self._transport_cls(
+                (self._host, self._port), timeout=self._timeout, retries=self._retries
+            )
+            if self._traffic is not shared_snmp_engine().traffic:
+                # The shared counts may include earlier devices for this agent
+                self._traffic = shared_snmp_engine().traffic
+                self._transport_address = self._transport.transportAddr
+                self._traffic_baseline = self._traffic.get(self._transport_address)
+        return self._engine, self._transport
+
+    def _close_engine(self) -> None:
+        """Stop using the shared engine, which closes it if we were the last user."""
+        engine, self._engine, self._transport = self._engine, None, None
+        if engine is not None:
+            shared_snmp_engine().unregister(self)
+
+    def _resolve_oids(self) -> None:
+        """
+        Build the pre-resolved GET objects and the numeric OID index.
+
+        The shared engine's MIB view is otherwise only used from the event
+        loop, so resolution happens there too, rather than in this thread.
+        """
+        resolve_oids = super()._resolve_oids
+
+        async def resolve_in_loop() -> None:
+            resolve_oids()
+
+        shared_snmp_engine().run(resolve_in_loop())
@@ -6,25 +6,45 @@
 # Distributed under the terms of the BSD 3-clause new license.
 # See LICENSE for more info.
 """Functions to handle parsing and validating device definition files."""
+from __future__ import annotations
 
+import argparse
+import copy
+import dataclasses
+import hashlib
 import itertools
+import json
 import logging
 import os
 import string
+import tempfile
+import threading
+from collections import OrderedDict
+from enum import Enum, EnumMeta, IntEnum
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Generator
+from types import MappingProxyType
+from typing import Any, Generator, cast
 
+import pysmi
 import yaml
+from pyasn1.type.univ import Integer
+from pysmi.searcher.pyfile import PyFileSearcher
 from pysnmp.smi.builder import MibBuilder
 from pysnmp.smi.compiler import addMibCompiler
-from ska_telmodel.data import TMData
-from tango import AttrWriteType
+from pysnmp.smi.error import MibNotFoundError
+from pysnmp.smi.rfc1902 import ObjectIdentity
+from pysnmp.smi.view import MibViewController
+from tango import AttrDataFormat, AttrWriteType, CmdArgType
 
 from ska_snmp_device.snmp_types import (
+    BitEnum,
     SNMPAttrInfo,
     attr_args_from_snmp_type,
     dtype_string_to_type,
+    syntax_name,
 )
+from ska_snmp_device.telmodel_cache import TELMODEL_CACHE_TTL, shared_telmodel_cache
 
 AccessType = {
     "read": AttrWriteType.READ,
@@ -37,13 +57,56 @@ AccessType = {
     "read-write": AttrWriteType.READ_WRITE,
 }
 
+# The values of an attribute's "rate" option
+RATE_OPTIONS = ("alongside", "instead")
+
+MIB_LIBRARY = Path(__file__).parent / "mib_library"
+MIB_REPOSITORY = "https://mibs.pysnmp.com/asn1/@mib@"
+
+# Set to override where compiled MIBs are cached
+MIB_CACHE_ENV = "SKA_SNMP_DEVICE_MIB_CACHE"
+# Set to a non-zero integer to never fetch MIBs from MIB_REPOSITORY, even
+# when they are missing from MIB_LIBRARY
+MIB_OFFLINE_ENV = "SKA_SNMP_DEVICE_MIB_OFFLINE"
+
+# Every definition is parsed with the same MIB view, built on first use.
+# MibBuilder isn't thread-safe, so the lock is held for as long as it's used.
+_mib_view: MibViewController | None = None
+_mib_view_lock = threading.Lock()
+
+# Parsed definitions, keyed by a hash of their contents, least recently used
+# first. Devices with identical definitions share the same attribute metadata.
+PARSED_DEFINITION_CACHE_SIZE = 32
+_parsed_definitions: OrderedDict[str, tuple[SNMPAttrInfo, ...]] = OrderedDict()
+_parsed_definitions_lock = threading.Lock()
+
+# A compiled definition is marked by this key, whose value is the format
+# version. Bump the version whenever the format changes.
+COMPILED_DEFINITION_KEY = "compiled_definition_version"
+COMPILED_DEFINITION_VERSION = 3
+
+# The values that can appear in compiled attribute args, other than JSON's own
+_COMPILED_TYPES = {cls.__name__: cls for cls in (bool, float, int, str)}
+_COMPILED_TANGO_ENUMS = {
+    cls.__name__: cls for cls in (AttrDataFormat, AttrWriteType, CmdArgType)
+}
+_COMPILED_ENUM_BASES: dict[str, EnumMeta] = {
+    cls.__name__: cls for cls in (BitEnum, IntEnum)
+}
 
-def load_device_definition(filename: str, repo: str | None) -> Any:
+
+def load_device_definition(
+    filename: str, repo: str | None, telmodel_ttl: float = TELMODEL_CACHE_TTL
+) -> Any:
     """
     Return the parsed contents of the YAML file at filename.
 
+    Definitions fetched from telmodel are cached; see TelmodelCache.
+
     :param filename: configuration file yaml file
     :param repo: the telmodel repo that we're pulling from
+    :param telmodel_ttl: how long, in seconds, a definition fetched from
+        telmodel is used before checking the repo for a newer version
 
     :raises Exception: no configuration file found
     :return: the configuration dictionary
@@ -51,8 +114,7 @@ def load_device_definition(filename: str, repo: str | None) -> Any:
     if repo:
         try:
             logging.info(f"attempting to load device definition from repo {repo}")
-            tmdata = TMData([repo])
-            return tmdata[filename].get_dict()
+            return shared_telmodel_cache().get(repo, filename, telmodel_ttl)
         # pylint: disable=broad-exception-caught
         except Exception:
             logging.warning(f"{repo} {filename} is not an SKA_TelModel configuration")
@@ -63,6 +125,8 @@ def load_device_definition(filename: str, repo: str | None) -> Any:
         logging.info(f"loading yaml file {path}")
         with open(path, encoding="utf-8") as def_file:
             logging.info(f"loading yaml file {path}")
+            if path.suffix == ".json":
+                return json.load(def_file)
             return yaml.safe_load(def_file)
     except Exception as ex:
         logging.error(f"No configuration file {filename} to load")
@@ -73,54 +137,320 @@ def parse_device_definition(definition: dict[str, Any]) -> list[SNMPAttrInfo]:
     """
     Build attribute metadata from a deserialised device definition file.
 
+    Compiled definitions, from compile_device_definition(), are accepted too.
+    They are loaded without consulting any MIBs.
+
+    The most recently parsed definitions are cached by the hash of their
+    contents, so parsing the same definition again returns the same
+    SNMPAttrInfo objects, with read-only attr_args. They must not be modified.
+
+    :param definition: device definition file
+
+    :return: list of deserialised attribute metadata
+    """
+    digest = hashlib.sha256(
+        json.dumps(definition, sort_keys=True, default=repr).encode()
+    ).hexdigest()
+    with _parsed_definitions_lock:
+        if digest in _parsed_definitions:
+            _parsed_definitions.move_to_end(digest)
+            return list(_parsed_definitions[digest])
+
+    if COMPILED_DEFINITION_KEY in definition:
+        attributes = parse_compiled_definition(definition)
+    else:
+        # Parsing consumes parts of the definition, so leave the caller's intact
+        attributes = _parse_definition_with_mibs(copy.deepcopy(definition))
+
+    with _parsed_definitions_lock:
+        _parsed_definitions[digest] = tuple(attributes)
+        while len(_parsed_definitions) > PARSED_DEFINITION_CACHE_SIZE:
+            _parsed_definitions.popitem(last=False)
+    return attributes
+
+
+def _parse_definition_with_mibs(definition: dict[str, Any]) -> list[SNMPAttrInfo]:
+    """
+    Build attribute metadata from a device definition, by looking it up in MIBs.
+
+    :param definition: device definition file
+
+    :return: list of deserialised attribute metadata
+    """
+    global _mib_view  # pylint: disable=global-statement
+    with _mib_view_lock:
+        if _mib_view is None:
+            _mib_view = MibViewController(_create_mib_builder())
+        return [
+            attr
+            for attr_template in definition["attributes"]
+            for attr_info in _expand_attribute(attr_template)
+            for attr in _build_attr_infos(_mib_view, attr_info)
+        ]
+
+
+def compile_device_definition(definition: dict[str, Any]) -> dict[str, Any]:
+    """
+    Parse a device definition into a compiled definition.
+
+    The compiled definition holds everything parse_device_definition() would
+    otherwise look up in the MIBs - numeric OIDs, types, SMI syntaxes, enum
+    labels and value ranges - and can be serialised as JSON. Passing it back
+    to parse_device_definition() yields the same attribute metadata, but
+    doesn't need the MIBs or the MIB compiler, for reading or writing.
+
     :param definition: device definition file
 
+    :return: the compiled definition
+    """
+    return {
+        COMPILED_DEFINITION_KEY: COMPILED_DEFINITION_VERSION,
+        "attributes": [
+            {
+                "attr_args": {
+                    key: _compile_value(value) for key, value in attr.attr_args.items()
+                },
+                "polling_period": attr.polling_period,
+                "identity": list(attr.identity),
+                "oid": list(attr.oid) if attr.oid is not None else None,
+                "elements": [list(element) for element in attr.elements],
+                "trap_polling_period": attr.trap_polling_period,
+                "rate": attr.rate,
+                "syntax": attr.syntax,
+            }
+            for attr in parse_device_definition(definition)
+        ],
+    }
+
+
+def parse_compiled_definition(compiled: dict[str, Any]) -> list[SNMPAttrInfo]:
+    """
+    Build attribute metadata from a deserialised compiled definition.
+
+    :param compiled: compiled definition, from compile_device_definition()
+
+    :raises ValueError: the definition was compiled by an incompatible version
     :return: list of deserialised attribute metadata
     """
-    # Keep this out of the loop so that we only create this thing once
-    mib_builder = _create_mib_builder()
+    version = compiled.get(COMPILED_DEFINITION_KEY)
+    if version != COMPILED_DEFINITION_VERSION:
+        raise ValueError(
+            f"Compiled definition has version {version}, but only version"
+            f" {COMPILED_DEFINITION_VERSION} is supported - recompile it"
+        )
     return [
-        _build_attr_info(mib_builder, attr_info)
-        for attr_template in definition["attributes"]
-        for attr_info in _expand_attribute(attr_template)
+        SNMPAttrInfo(
+            attr_args=MappingProxyType(
+                {
+                    key: _load_compiled_value(value)
+                    for key, value in attr["attr_args"].items()
+                }
+            ),
+            polling_period=attr["polling_period"],
+            identity=tuple(attr["identity"]),
+            oid=tuple(attr["oid"]) if attr["oid"] is not None else None,
+            elements=tuple(tuple(element) for element in attr["elements"]),
+            trap_polling_period=attr["trap_polling_period"],
+            rate=attr["rate"],
+            syntax=attr["syntax"],
+        )
+        for attr in compiled["attributes"]
     ]
 
 
-def _build_attr_info(mib_builder: MibBuilder, attr: dict[str, Any]) -> SNMPAttrInfo:
+def _compile_value(value: Any) -> Any:
+    """
+    Convert an attribute arg value to a JSON-serialisable form.
+
+    :param value: the value of an attribute arg
+
+    :raises TypeError: the value can't be compiled
+    :return: the value as JSON-compatible data
+    """
+    if isinstance(value, EnumMeta):
+        base = next(
+            name for name, cls in _COMPILED_ENUM_BASES.items() if issubclass(value, cls)
+        )
+        enum_members = cast(type[Enum], value).__members__
+        members = [[name, member.value] for name, member in enum_members.items()]
+        return {"enum": base, "name": value.__name__, "members": members}
+    # Checked before int, because older PyTango enums aren't Python enums
+    if type(value) in _COMPILED_TANGO_ENUMS.values():
+        return {"tango": type(value).__name__, "name": value.name}
+    if isinstance(value, Enum):
+        raise TypeError(f"Can't compile enum value {value!r}")
+    if isinstance(value, type):
+        type_name = value.__name__
+        if _COMPILED_TYPES.get(type_name) is not value:
+            raise TypeError(f"Can't compile type {value!r}")
+        return {"type": type_name}
+    if isinstance(value, (list, tuple)):
+        return [_compile_value(item) for item in value]
+    if value is None or isinstance(value, (bool, float, int, str)):
+        return value
+    raise TypeError(f"Can't compile attribute arg {value!r}")
+
+
+def _load_compiled_value(value: Any) -> Any:
+    """
+    Convert a compiled attribute arg value back to its original form.
+
+    :param value: the compiled value, from _compile_value()
+
+    :return: the attribute arg value
+    """
+    if isinstance(value, list):
+        return [_load_compiled_value(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if "enum" in value:
+        members = tuple((name, member_value) for name, member_value in value["members"])
+        return _compiled_enum(value["enum"], value["name"], members)
+    if "tango" in value:
+        return getattr(_COMPILED_TANGO_ENUMS[value["tango"]], value["name"])
+    return _COMPILED_TYPES[value["type"]]
+
+
+@lru_cache(maxsize=1024)
+def _compiled_enum(
+    base: str, name: str, members: tuple[tuple[str, int], ...]
+) -> EnumMeta:
+    """
+    Create an enum class for a compiled definition.
+
+    Creating enum classes is slow, so attributes with identical enums share
+    the same class.
+
+    :param base: the name of the enum's base class
+    :param name: the name of the enum
+    :param members: the (name, value) of each of the enum's members
+
+    :return: the enum class
+    """
+    return _COMPILED_ENUM_BASES[base](name, members)
+
+
+def _build_attr_infos(
+    mib_view: MibViewController, attr: dict[str, Any]
+) -> list[SNMPAttrInfo]:
     """
-    Build a SNMPAttrInfo describing the provided attribute.
+    Build SNMPAttrInfos describing the provided attribute.
 
     Using the relevant MIB files, we inspect the SNMP type and return
     useful metadata about the attribute in an SNMPAttrInfo, including
     suitable arguments to pass to tango.server.attribute().
 
-    :param mib_builder: mib builder
+    With "rate: instead", the attribute is the rate of change of its
+    counter object. With "rate: alongside", there are two attributes: the
+    counter itself, and its rate, named after it with a "Rate" suffix.
+
+    :param mib_view: mib view controller
     :param attr: attribute
 
+    :raises ValueError: the rate option isn't one of RATE_OPTIONS
+    :raises TypeError: a rate is asked for of an object that isn't a counter
     :return: SNMP attribute information
     """
     # Pop off the values we're going to use in this function. The rest will
     # be used as overrides to the generated tango.server.attribute() args.
     mib_name, symbol_name, *_ = oid = tuple(attr.pop("oid"))
+    elements = attr.pop("elements", None)
     polling_period = attr.pop("polling_period", 0) / 1000
+    trap_polling_period = attr.pop("trap_polling_period", None)
+    rate = attr.pop("rate", None)
+    if rate is not None and rate not in RATE_OPTIONS:
+        raise ValueError(
+            f'Attribute "{attr["name"]}" has rate "{rate}",'
+            f" which isn't one of {', '.join(RATE_OPTIONS)}"
+        )
 
     # get metadata about the SNMP object definition in the MIB
-    (mib_info,) = mib_builder.importSymbols(mib_name, symbol_name)
+    (mib_info,) = mib_view.mibBuilder.importSymbols(mib_name, symbol_name)
+
+    # Resolve the numeric OID now, so the poller never has to consult the MIB
+    numeric_oid = ObjectIdentity(*oid).resolveWithMib(mib_view).getOid().asTuple()
 
     attr = _adjust_overrides(attr)
 
     # Build args to be passed to tango.server.attribute()
-    attr_args = {
+    generated_args = {
         "access": AccessType[mib_info.maxAccess],
         **attr_args_from_snmp_type(mib_info.syntax),
+    }
+    rate_args: dict[str, Any] = {"dtype": float, "access": AttrWriteType.READ}
+    if rate is not None and (
+        elements is not None
+        or not isinstance(mib_info.syntax, Integer)
+        or mib_info.syntax.namedValues
+    ):
+        raise TypeError(
+            f'Attribute "{attr["name"]}" has a rate, but its object'
+            " isn't a scalar integer"
+        )
+    attr_args = {
+        **(rate_args if rate == "instead" else generated_args),
         **attr,  # allow user to override generated args
     }
 
-    return SNMPAttrInfo(
+    numeric_elements: tuple[tuple[int, ...], ...] = ()
+    if elements is not None:
+        numeric_elements = tuple(
+            ObjectIdentity(*element).resolveWithMib(mib_view).getOid().asTuple()
+            for element in elements
+        )
+        attr_args = _spectrum_attr_args(attr_args, len(elements))
+
+    attr_info = SNMPAttrInfo(
         polling_period=polling_period,
-        attr_args=attr_args,
+        attr_args=MappingProxyType(attr_args),
         identity=oid,
+        oid=numeric_oid,
+        elements=numeric_elements,
+        trap_polling_period=(
+            None if trap_polling_period is None else trap_polling_period / 1000
+        ),
+        rate=rate == "instead",
+        syntax=syntax_name(mib_info.syntax),
     )
+    if rate != "alongside":
+        return [attr_info]
+    rate_args["name"] = f"{attr_info.name}Rate"
+    return [
+        attr_info,
+        dataclasses.replace(
+            attr_info, attr_args=MappingProxyType(rate_args), rate=True
+        ),
+    ]
+
+
+def _spectrum_attr_args(attr_args: dict[str, Any], length: int) -> dict[str, Any]:
+    """
+    Adapt the attribute args of a table column's type to a SPECTRUM of it.
+
+    Spectrum attributes are read-only, and enumerated columns are exposed
+    as their integer values.
+
+    :param attr_args: the args for a single element of the column
+    :param length: the number of elements
+
+    :raises TypeError: the column's type can't be made into a spectrum
+    :return: the args for the SPECTRUM attribute
+    """
+    if attr_args.get("dformat") == AttrDataFormat.SPECTRUM:
+        raise TypeError(
+            f'Spectrum attribute "{attr_args["name"]}" has elements'
+            " that are already spectrums"
+        )
+    dtype = attr_args.get("dtype")
+    if isinstance(dtype, EnumMeta):
+        dtype = int
+    return {
+        **attr_args,
+        "access": AttrWriteType.READ,
+        "dtype": dtype,
+        "dformat": AttrDataFormat.SPECTRUM,
+        "max_dim_x": length,
+    }
 
 
 def _adjust_overrides(attr: dict[str, Any]) -> dict[str, Any]:
@@ -156,28 +486,132 @@ def _adjust_overrides(attr: dict[str, Any]) -> dict[str, Any]:
     return attr
 
 
+class _LocalFirstMibBuilder(MibBuilder):
+    """
+    A MibBuilder that only fetches MIBs from MIB_REPOSITORY as a last resort.
+
+    MIBs are loaded from the cache, or compiled from the MIB library. Only
+    once a module can't be found in either is MIB_REPOSITORY added as a
+    source, and the module loaded again, unless $SKA_SNMP_DEVICE_MIB_OFFLINE
+    is set.
+    """
+
+    def __init__(self: _LocalFirstMibBuilder, destination: str) -> None:
+        """
+        Create the builder, with a compiler for the MIB library only.
+
+        :param destination: the directory to cache compiled MIBs in
+        """
+        self._destination = destination
+        self._remote = False
+        super().__init__()
+        self.loadTexts = True
+        self._add_compiler([str(MIB_LIBRARY)])
+
+    def loadModules(
+        self: _LocalFirstMibBuilder, *modNames: str, **userCtx: Any
+    ) -> _LocalFirstMibBuilder:
+        """
+        Load MIB modules, compiling them if need be.
+
+        :param modNames: the names of the modules to load
+        :param userCtx: context passed on to the modules
+
+        :raises MibNotFoundError: a module can't be found or compiled
+        :return: this builder
+        """
+        try:
+            return cast(
+                _LocalFirstMibBuilder, super().loadModules(*modNames, **userCtx)
+            )
+        except MibNotFoundError:
+            if self._remote or int(os.getenv(MIB_OFFLINE_ENV, "0").strip()):
+                raise
+        logging.info(f"Fetching MIBs missing from {MIB_LIBRARY} from {MIB_REPOSITORY}")
+        self._remote = True
+        self._add_compiler([str(MIB_LIBRARY), MIB_REPOSITORY])
+        return cast(_LocalFirstMibBuilder, super().loadModules(*modNames, **userCtx))
+
+    def _add_compiler(self: _LocalFirstMibBuilder, sources: list[str]) -> None:
+        """
+        Compile MIBs from the given sources into the cache.
+
+        MIBs already in the cache are used as they are, rather than being
+        compiled again along with the MIBs that import them.
+
+        :param sources: the URLs or directories to read MIBs from
+        """
+        addMibCompiler(self, sources=sources, destination=self._destination)
+        self.getMibCompiler().addSearchers(PyFileSearcher(self._destination))
+
+
 def _create_mib_builder() -> MibBuilder:
     """
     Initialise a MibBuilder that knows where to look for MIBs.
 
     :return: the mib builder
     """
-    mib_builder: MibBuilder = MibBuilder()
-    mib_builder.loadTexts = True
-
     # Adding a compiler allows the builder to fetch and compile novel MIBs.
     # mibs.pysnmp.com is built from https://github.com/lextudio/mibs.pysnmp.com
     # and contains thousands of standard MIBs and vendor MIBs for COTS hardware.
-    # Extra MIBs can be dropped in ./mibs, which will be searched first.
-    addMibCompiler(
-        mib_builder,
-        sources=[
-            str(Path(__file__).parent / "mib_library"),
-            "https://mibs.pysnmp.com/asn1/@mib@",
-        ],
-    )
+    # It is only used for MIBs that aren't in the cache or the MIB library.
+    #
+    # The builder loads compiled MIBs from the destination before trying to
+    # compile them, so each MIB is only compiled once per cache directory.
+    cache_dir = mib_cache_dir()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _expire_changed_mibs(cache_dir)
+    except OSError:
+        cache_dir = Path(tempfile.mkdtemp(prefix="ska-snmp-device-mibs-"))
+        logging.warning(f"MIB cache is not writable, compiling MIBs into {cache_dir}")
+    return _LocalFirstMibBuilder(str(cache_dir))
+
+
+def mib_cache_dir() -> Path:
+    """
+    Return the directory in which compiled MIBs are cached.
+
+    The cache lives in $SKA_SNMP_DEVICE_MIB_CACHE, or else under the user's
+    cache directory, in a subdirectory for the MIB compiler version, so
+    everything is recompiled when the compiler changes. Within it, each MIB
+    is kept by its module name, and recompiled when its own source changes;
+    see _expire_changed_mibs().
+
+    :return: the cache directory for the current MIB compiler
+    """
+    cache_root = os.getenv(MIB_CACHE_ENV, "").strip()
+    if not cache_root:
+        user_cache = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+        cache_root = str(Path(user_cache) / "ska-snmp-device" / "mibs")
+    return Path(cache_root) / f"pysmi-{pysmi.__version__}"
+
 
-    return mib_builder
+def _expire_changed_mibs(cache_dir: Path) -> None:
+    """
+    Remove compiled MIBs whose source in the MIB library has changed.
+
+    The SHA-256 digest of each library MIB's source is kept next to its
+    compiled module, as <module>.sha256. A module whose digest doesn't match
+    its source is removed, so that only it is compiled again. MIBs fetched
+    from MIB_REPOSITORY have no digest, and are kept until the library has
+    a MIB of the same name.
+
+    :param cache_dir: the cache directory, from mib_cache_dir()
+    """
+    for source in sorted(MIB_LIBRARY.iterdir()):
+        if not source.is_file():
+            continue
+        digest = hashlib.sha256(source.read_bytes()).hexdigest()
+        digest_path = cache_dir / f"{source.name}.sha256"
+        if digest_path.exists() and digest_path.read_text("utf-8") == digest:
+            continue
+        for compiled in itertools.chain(
+            cache_dir.glob(f"{source.name}.py*"),
+            cache_dir.glob(f"__pycache__/{source.name}.*"),
+        ):
+            compiled.unlink(missing_ok=True)
+        digest_path.write_text(digest, "utf-8")
 
 
 def _expand_attribute(attr: Any) -> Generator[Any, None, None]:
@@ -196,6 +630,10 @@ def _expand_attribute(attr: Any) -> Generator[Any, None, None]:
     names formating placeholder_index is substituted which the new starting index
     (i1 ..., placeholder_index, ... iN)
 
+    If "spectrum" is true, a single attribute is yielded instead, with its
+    name unformatted and an "elements" key listing the OID of every element
+    in the order above. It will become a SPECTRUM attribute.
+
     If "indexes" is not present, attr will be yielded unmodified. This
     function also performs some validation on the attribute definition.
 
@@ -209,11 +647,21 @@ def _expand_attribute(attr: Any) -> Generator[Any, None, None]:
     start_index = attr.pop("start_index", None)
     placeholder_index = attr.pop("placeholder_index", 0)
     indexes = attr.pop("indexes", [])
+    spectrum = attr.pop("spectrum", False)
     name = attr["name"]
 
     # Be kind, provide useful error messages
     replacements = [x for _, x, _, _ in string.Formatter().parse(name) if x is not None]
-    if indexes:
+    if spectrum:
+        if not indexes:
+            raise ValueError(
+                f'Spectrum attribute "{name}" must define the indexes of its elements'
+            )
+        if replacements:
+            raise ValueError(
+                f'Spectrum attribute "{name}" must not contain format specifiers'
+            )
+    elif indexes:
         if not replacements:
             raise ValueError(
                 f'Attribute name "{name}" contains no format specifiers,'
@@ -235,6 +683,20 @@ def _expand_attribute(attr: Any) -> Generator[Any, None, None]:
         (range(v[0], v[1] + v[2], v[2])) if len(v) > 2 else (range(v[0], v[1] + 1))
         for v in indexes
     )
+    if spectrum:
+        if not name.isidentifier():
+            raise ValueError(
+                f'Attribute name "{name}" is not a valid Python identifier'
+            )
+        yield {
+            **attr,
+            "elements": [
+                [*attr["oid"], *index_vars]
+                for index_vars in itertools.product(*index_ranges)
+            ],
+        }
+        return
+
     for element in itertools.product(*([i] for i in suffix), *index_ranges):
         index_vars = element[len(suffix) :]  # black wants this space T_T
         index_vars_list = list(index_vars)
@@ -252,3 +714,41 @@ def _expand_attribute(attr: Any) -> Generator[Any, None, None]:
             "name": formatted_name,
             "oid": [*attr["oid"], *index_vars],
         }
+
+
+def compile_main(argv: list[str] | None = None) -> int:
+    """
+    Compile a device definition from the command line.
+
+    :param argv: command line arguments, if not sys.argv
+
+    :return: exit code
+    """
+    parser = argparse.ArgumentParser(
+        description="Compile an SNMP device definition, so that devices can"
+        " load it without consulting the MIBs."
+    )
+    parser.add_argument("definition", help="the device definition to compile")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="where to write the compiled definition"
+        " (default: DEFINITION with its extension replaced by .compiled.json)",
+    )
+    parser.add_argument(
+        "--repo", default="", help="the telmodel repo to load the definition from"
+    )
+    args = parser.parse_args(argv)
+
+    compiled = compile_device_definition(
+        load_device_definition(args.definition, args.repo)
+    )
+    definition_path = Path(args.definition)
+    output = Path(
+        args.output
+        or definition_path.with_name(f"{definition_path.stem}.compiled.json")
+    )
+    with open(output, "w", encoding="utf-8") as compiled_file:
+        json.dump(compiled, compiled_file)
+    print(f"Compiled {len(compiled['attributes'])} attributes to {output}")
+    return 0
@@ -0,0 +1,537 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""
+This module implements SNMP agents that live in the process, for tests and benchmarks.
+
+A FakeAgent answers SNMPv1 and SNMPv2c requests from a .snmprec-style
+dataset, optionally adding latency, losing requests, or refusing requests
+of too many objects with tooBig. Component managers from FAKE_BACKENDS
+reach the agents in FAKE_AGENTS by address, through a transport that hands
+messages straight to the agent instead of sending them over UDP, so polls
+cost only the component manager's and pysnmp's own CPU time. FakeSNMPDevice
+is an SNMPDevice using them.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import itertools
+import random
+import socket
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from pyasn1.codec.ber import decoder, encoder
+from pyasn1.type.univ import Null
+from pysnmp.carrier.asyncio.dgram.udp import UdpAsyncioTransport
+from pysnmp.carrier.asyncore.dgram import udp
+from pysnmp.hlapi.asyncio import UdpTransportTarget as AsyncioUdpTransportTarget
+from pysnmp.hlapi.asyncore import UdpTransportTarget
+from pysnmp.proto import api
+from pysnmp.proto.rfc1902 import (
+    Counter32,
+    Counter64,
+    Gauge32,
+    Integer32,
+    IpAddress,
+    ObjectIdentifier,
+    OctetString,
+    Opaque,
+    TimeTicks,
+)
+from pysnmp.proto.rfc1905 import endOfMibView, noSuchInstance, noSuchObject
+
+from ska_snmp_device.asyncio_component_manager import AsyncioSNMPComponentManager
+from ska_snmp_device.snmp_component_manager import SNMPComponentManager
+from ska_snmp_device.snmp_device import SNMPDevice
+from ska_snmp_device.snmp_types import NO_VALUE_TYPES
+
+# The transport domain of the fake transports. It's a sub-domain of UDP, so
+# addresses are (IPv4 address, port) pairs, but engines keep a transport for
+# it apart from their real UDP transport.
+FAKE_DOMAIN = udp.domainName + (1024,)
+
+# The agents reachable through the fake transports, by (IPv4 address, port)
+FAKE_AGENTS: dict[tuple[str, int], FakeAgent] = {}
+
+# The SNMP types of .snmprec tags. Tags ending in "x" have hex-encoded values.
+SNMPREC_TYPES: dict[str, Callable[..., Any]] = {
+    "2": Integer32,
+    "4": OctetString,
+    "5": Null,
+    "6": ObjectIdentifier,
+    "64": IpAddress,
+    "65": Counter32,
+    "66": Gauge32,
+    "67": TimeTicks,
+    "68": Opaque,
+    "70": Counter64,
+}
+
+# Error statuses of the responses we make
+_TOO_BIG = 1
+_NO_SUCH_NAME = 2
+_NO_CREATION = 11
+
+
+class FakeAgent:
+    """
+    An SNMP agent answering from an in-memory dataset.
+
+    The dataset is a set of (OID, tag, value) records, as in the lines of a
+    .snmprec file. GET, GETNEXT, GETBULK and SET are supported, for SNMPv1
+    and SNMPv2c with any community; SNMPv3 requests are ignored. Values
+    written with SET replace the dataset's.
+
+    Faults can be injected: each request is lost with probability loss,
+    requests of more than max_varbinds objects are answered with tooBig
+    (and GETBULK responses truncated to that many objects), and responses
+    are delivered latency seconds after their requests.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self: FakeAgent,
+        records: Iterable[tuple[str, str, str]],
+        *,
+        latency: float = 0.0,
+        loss: float = 0.0,
+        max_varbinds: int = 0,
+        seed: int | None = None,
+    ) -> None:
+        """
+        Create an agent.
+
+        :param records: (OID, tag, value) of each object. The OID is dotted,
+            and the tag and value are as in .snmprec files, e.g. "4x" for a
+            hex-encoded OCTET STRING.
+        :param latency: the delay before each response, in seconds
+        :param loss: the probability that a request gets no response
+        :param max_varbinds: the most objects a request may have without
+            being answered with tooBig, or 0 for no limit
+        :param seed: seed for the random choice of lost requests
+        """
+        self._values = {
+            tuple(int(arc) for arc in oid.split(".")): _snmprec_value(tag, value)
+            for oid, tag, value in records
+        }
+        self._oids = sorted(self._values)
+        self.latency = latency
+        self.loss = loss
+        self.max_varbinds = max_varbinds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # requests, lost and too_big
+        self.counts: Counter[str] = Counter()
+
+    @classmethod
+    def from_snmprec(
+        cls: type[FakeAgent], path: str | Path, **kwargs: Any
+    ) -> FakeAgent:
+        """
+        Create an agent serving the contents of a .snmprec file.
+
+        :param path: the .snmprec file
+        :param kwargs: any other FakeAgent arguments
+
+        :return: the agent
+        """
+        with open(path, encoding="utf-8") as snmprec:
+            records = [
+                line.rstrip("\n").split("|", 2) for line in snmprec if line.strip()
+            ]
+        return cls([(oid, tag, value) for oid, tag, value in records], **kwargs)
+
+    def respond(self: FakeAgent, message: bytes) -> bytes | None:
+        """
+        Answer an SNMP request message.
+
+        :param message: the BER-encoded request
+
+        :return: the BER-encoded response, or None if there is none
+        """
+        version = int(api.decodeMessageVersion(message))
+        if version not in api.protoModules:
+            return None
+        p_mod = api.protoModules[version]
+        request, _ = decoder.decode(message, asn1Spec=p_mod.Message())
+        request_pdu = p_mod.apiMessage.getPDU(request)
+        response = p_mod.apiMessage.getResponse(request)
+        response_pdu = p_mod.apiMessage.getPDU(response)
+        var_binds = p_mod.apiPDU.getVarBinds(request_pdu)
+
+        with self._lock:
+            self.counts["requests"] += 1
+            if self._random.random() < self.loss:
+                self.counts["lost"] += 1
+                return None
+            is_bulk = version != api.protoVersion1 and request_pdu.isSameTypeWith(
+                p_mod.GetBulkRequestPDU()
+            )
+            if self.max_varbinds and len(var_binds) > self.max_varbinds and not is_bulk:
+                self.counts["too_big"] += 1
+                p_mod.apiPDU.setErrorStatus(response_pdu, _TOO_BIG)
+                return encoder.encode(response)
+
+            # The (status, index) of an error that fails the whole request
+            error: tuple[int, int] | None = None
+            if request_pdu.isSameTypeWith(p_mod.GetRequestPDU()):
+                results = [(oid, self._get(oid)) for oid, _ in var_binds]
+            elif request_pdu.isSameTypeWith(p_mod.GetNextRequestPDU()):
+                results = [self._get_next(oid) for oid, _ in var_binds]
+            elif is_bulk:
+                results = self._get_bulk(
+                    [oid for oid, _ in var_binds],
+                    int(p_mod.apiBulkPDU.getNonRepeaters(request_pdu)),
+                    int(p_mod.apiBulkPDU.getMaxRepetitions(request_pdu)),
+                )
+            elif request_pdu.isSameTypeWith(p_mod.SetRequestPDU()):
+                results = var_binds
+                missing = self._set(var_binds)
+                if missing:
+                    status = (
+                        _NO_SUCH_NAME if version == api.protoVersion1 else _NO_CREATION
+                    )
+                    error = status, missing
+            else:
+                return None
+
+        if version == api.protoVersion1 and error is None:
+            # SNMPv1 has no exception values, so missing objects are errors
+            missing = next(
+                (
+                    index
+                    for index, (_, value) in enumerate(results, start=1)
+                    if isinstance(value, NO_VALUE_TYPES)
+                ),
+                0,
+            )
+            if missing:
+                error = _NO_SUCH_NAME, missing
+        if error is not None:
+            p_mod.apiPDU.setErrorStatus(response_pdu, error[0])
+            p_mod.apiPDU.setErrorIndex(response_pdu, error[1])
+            results = var_binds
+        p_mod.apiPDU.setVarBinds(response_pdu, results)
+        return encoder.encode(response)
+
+    def _get(self: FakeAgent, oid: tuple[int, ...]) -> Any:
+        """
+        Return the value of an object.
+
+        :param oid: the object's OID
+
+        :return: its value, or noSuchInstance if the agent has other
+            instances of the same object, or else noSuchObject
+        """
+        oid = tuple(oid)
+        if oid in self._values:
+            return self._values[oid]
+        following = bisect.bisect(self._oids, oid[:-1])
+        if (
+            following < len(self._oids)
+            and self._oids[following][: len(oid) - 1] == oid[:-1]
+        ):
+            return noSuchInstance
+        return noSuchObject
+
+    def _get_next(self: FakeAgent, oid: tuple[int, ...]) -> tuple[Any, Any]:
+        """
+        Return the object following an OID.
+
+        :param oid: the OID
+
+        :return: the OID and value of the next object, or the given OID
+            and endOfMibView if there isn't one
+        """
+        following = bisect.bisect(self._oids, tuple(oid))
+        if following == len(self._oids):
+            return oid, endOfMibView
+        next_oid = self._oids[following]
+        return next_oid, self._values[next_oid]
+
+    def _get_bulk(
+        self: FakeAgent,
+        oids: list[tuple[int, ...]],
+        non_repeaters: int,
+        max_repetitions: int,
+    ) -> list[tuple[Any, Any]]:
+        """
+        Walk the objects following some OIDs, as for GETBULK.
+
+        :param oids: the OIDs in the request
+        :param non_repeaters: how many of the OIDs to get the next object of
+            only once
+        :param max_repetitions: how many objects to walk from each of the rest
+
+        :return: the objects in the response
+        """
+        results = [self._get_next(oid) for oid in oids[:non_repeaters]]
+        repeaters = oids[non_repeaters:]
+        for _ in range(max_repetitions if repeaters else 0):
+            row = [self._get_next(oid) for oid in repeaters]
+            results.extend(row)
+            if all(value is endOfMibView for _, value in row):
+                break
+            repeaters = [oid for oid, _ in row]
+        if self.max_varbinds:
+            del results[max(self.max_varbinds, non_repeaters) :]
+        return results
+
+    def _set(self: FakeAgent, var_binds: list[tuple[Any, Any]]) -> int:
+        """
+        Write the values of some objects, if they all exist.
+
+        :param var_binds: the OIDs and values to write
+
+        :return: the index, from 1, of the first object that doesn't exist,
+            or 0 if every object was written
+        """
+        for index, (oid, _) in enumerate(var_binds, start=1):
+            if tuple(oid) not in self._values:
+                return index
+        for oid, value in var_binds:
+            self._values[tuple(oid)] = value
+        return 0
+
+
+def _snmprec_value(tag: str, value: str) -> Any:
+    """
+    Return the SNMP value of a .snmprec record.
+
+    :param tag: the record's tag
+    :param value: the record's value
+
+    :raises ValueError: the tag is unknown, or names a variation module
+    :return: the value
+    """
+    hex_encoded = tag.endswith("x")
+    snmp_type = SNMPREC_TYPES.get(tag.removesuffix("x"))
+    if snmp_type is None:
+        raise ValueError(f"Unsupported .snmprec tag {tag}")
+    if hex_encoded:
+        return snmp_type(hexValue=value)
+    if snmp_type in (Integer32, Counter32, Counter64, Gauge32, TimeTicks):
+        return snmp_type(int(value))
+    if snmp_type is Null:
+        return snmp_type("")
+    return snmp_type(value)
+
+
+def _respond(message: bytes, address: Any) -> tuple[bytes | None, float]:
+    """
+    Pass a request to the fake agent at an address.
+
+    :param message: the BER-encoded request
+    :param address: the address the request was sent to
+
+    :return: the response, or None if there is none, and the agent's latency
+    """
+    agent = FAKE_AGENTS.get(tuple(address)[:2])
+    if agent is None:
+        return None, 0.0
+    return agent.respond(message), agent.latency
+
+
+class _DelayedCalls:
+    """Calls functions after a delay, on a thread of their own."""
+
+    def __init__(self: _DelayedCalls) -> None:
+        """Create the scheduler. Its thread is started when first needed."""
+        self._heap: list[tuple[float, int, Callable[..., None], tuple[Any, ...]]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def call_later(
+        self: _DelayedCalls, delay: float, func: Callable[..., None], *args: Any
+    ) -> None:
+        """
+        Call a function after a delay.
+
+        :param delay: how long to wait, in seconds
+        :param func: the function to call
+        :param args: the function's arguments
+        """
+        with self._condition:
+            due = time.monotonic() + delay
+            heapq.heappush(self._heap, (due, next(self._counter), func, args))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="FakeAgentLatency", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self: _DelayedCalls) -> None:
+        """Make each call once it's due, forever."""
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = (
+                        self._heap[0][0] - time.monotonic() if self._heap else None
+                    )
+                    self._condition.wait(timeout)
+                _, _, func, args = heapq.heappop(self._heap)
+            func(*args)
+
+
+_delayed_calls = _DelayedCalls()
+
+
+class FakeSocketTransport(udp.UdpSocketTransport):
+    """
+    An asyncore transport that passes messages to FAKE_AGENTS, not over UDP.
+
+    The dispatcher only wakes up for sockets, so the arrival of responses
+    is signalled on one end of a socket pair.
+    """
+
+    def __init__(self: FakeSocketTransport, sock: Any = None, sockMap: Any = None):
+        """
+        Create the transport.
+
+        :param sock: ignored; the transport makes its own socket
+        :param sockMap: the dispatcher's socket map
+        """
+        # pylint: disable=invalid-name
+        sock, self._wakeup = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._responses: deque[tuple[Any, bytes]] = deque()
+        super().__init__(sock, sockMap)
+
+    def sendMessage(
+        self: FakeSocketTransport, outgoingMessage: bytes, transportAddress: Any
+    ) -> None:
+        """
+        Pass a request to the fake agent at its address.
+
+        :param outgoingMessage: the BER-encoded request
+        :param transportAddress: the address of the agent
+        """
+        # pylint: disable=invalid-name
+        response, latency = _respond(outgoingMessage, transportAddress)
+        if response is None:
+            return
+        if latency > 0:
+            _delayed_calls.call_later(
+                latency, self._deliver, transportAddress, response
+            )
+        else:
+            self._deliver(transportAddress, response)
+
+    def _deliver(self: FakeSocketTransport, address: Any, response: bytes) -> None:
+        """
+        Queue a response, and wake the dispatcher to receive it.
+
+        :param address: the address of the agent
+        :param response: the BER-encoded response
+        """
+        self._responses.append((address, response))
+        try:
+            self._wakeup.send(b"\0")
+        except OSError:
+            # Either the dispatcher already has wake-ups to read, or the
+            # transport has been closed
+            pass
+
+    def handle_read(self: FakeSocketTransport) -> None:
+        """Receive every queued response."""
+        try:
+            self.socket.recv(4096)
+        except OSError:
+            pass
+        while self._responses:
+            address, response = self._responses.popleft()
+            self._cbFun(self, udp.UdpTransportAddress(address), response)
+
+    def closeTransport(self: FakeSocketTransport) -> None:
+        """Close both ends of the socket pair."""
+        super().closeTransport()
+        self._wakeup.close()
+
+
+class AsyncioFakeTransport(UdpAsyncioTransport):
+    """An asyncio transport that passes messages to FAKE_AGENTS, not over UDP."""
+
+    def openClientMode(
+        self: AsyncioFakeTransport, iface: Any = None
+    ) -> AsyncioFakeTransport:
+        """
+        Open the transport, which needs no socket.
+
+        :param iface: ignored
+
+        :return: the transport
+        """
+        return self
+
+    def sendMessage(
+        self: AsyncioFakeTransport, outgoingMessage: bytes, transportAddress: Any
+    ) -> None:
+        """
+        Pass a request to the fake agent at its address.
+
+        :param outgoingMessage: the BER-encoded request
+        :param transportAddress: the address of the agent
+        """
+        # pylint: disable=invalid-name
+        response, latency = _respond(outgoingMessage, transportAddress)
+        if response is not None:
+            self.loop.call_later(latency, self._deliver, transportAddress, response)
+
+    def _deliver(self: AsyncioFakeTransport, address: Any, response: bytes) -> None:
+        """
+        Receive a response, unless the transport has been closed since.
+
+        :param address: the address of the agent
+        :param response: the BER-encoded response
+        """
+        if self._cbFun is not None:
+            self._cbFun(self, self.addressType(address), response)
+
+
+class FakeTransportTarget(UdpTransportTarget):
+    """A transport target for a fake agent, for the asyncore backend."""
+
+    transportDomain = FAKE_DOMAIN
+    protoTransport = FakeSocketTransport
+
+
+class AsyncioFakeTransportTarget(AsyncioUdpTransportTarget):
+    """A transport target for a fake agent, for the asyncio backend."""
+
+    transportDomain = FAKE_DOMAIN
+    protoTransport = AsyncioFakeTransport
+
+
+class FakeSNMPComponentManager(SNMPComponentManager):
+    """An SNMPComponentManager that polls the agent in FAKE_AGENTS at its address."""
+
+    _transport_cls = FakeTransportTarget
+
+
+class AsyncioFakeSNMPComponentManager(AsyncioSNMPComponentManager):
+    """An AsyncioSNMPComponentManager that polls the agent in FAKE_AGENTS."""
+
+    _transport_cls = AsyncioFakeTransportTarget
+
+
+FAKE_BACKENDS: dict[str, type[SNMPComponentManager]] = {
+    "asyncore": FakeSNMPComponentManager,
+    "asyncio": AsyncioFakeSNMPComponentManager,
+}
+
+
+class FakeSNMPDevice(SNMPDevice):
+    """An SNMPDevice that polls the agent in FAKE_AGENTS at its Host and Port."""
+
+    _backends = FAKE_BACKENDS
@@ -0,0 +1,419 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""
+This module implements a load test of many SNMPDevices, for capacity planning.
+
+ska-snmp-load-test runs a fleet of SNMPDevices in one device server, each
+polling an agent of its own, and reports whether they keep up with their
+UpdateRate: the poll rate they achieve, how long their polls take and how
+late they start, and the CPU and memory the process uses. The devices'
+definition is generated from a template such as
+docs/src/examples/EN6808.yaml, with its tables widened to make larger
+devices. The agents are FakeAgents in the same process, or snmpsim
+processes serving values made up for the definition.
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import resource
+import tempfile
+import time
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from enum import EnumMeta
+from math import ceil
+from pathlib import Path
+from typing import Any, Iterable, Mapping
+
+import yaml
+from ska_control_model import AdminMode
+from tango import DeviceProxy
+from tango.test_context import MultiDeviceTestContext
+
+from ska_snmp_device.definitions import load_device_definition, parse_device_definition
+from ska_snmp_device.fake_agent import FAKE_AGENTS, FakeAgent, FakeSNMPDevice
+from ska_snmp_device.simulator import run_simulator
+from ska_snmp_device.snmp_device import SNMPDevice
+from ska_snmp_device.snmp_types import SNMPAttrInfo, is_bit_enum, valid_enum_values
+
+# Where the agents listen: one port per device, counting up from LOAD_TEST_PORT
+LOAD_TEST_HOST = "127.0.0.1"
+LOAD_TEST_PORT = 10161
+LOAD_TEST_COMMUNITY = "public"
+
+# The kinds of agent the devices can poll
+AGENTS = ("fake", "snmpsim")
+
+# The fraction of 1 / UpdateRate polls per second that devices must achieve
+# to keep up with it. Each poll waits UpdateRate after the previous one
+# ends, so even an idle device falls a little short.
+SUSTAINED_FRACTION = 0.9
+
+
+@dataclass(frozen=True)
+class LoadTestReport:
+    """
+    The results of a load test.
+
+    poll_rate is the mean over the devices; the percentiles are those of
+    the worst device. cpu is the process's CPU time over the measurement,
+    in cores, and max_rss its peak resident set size in bytes.
+    """
+
+    devices: int
+    attributes: int
+    update_rate: float
+    duration: float
+    poll_rate: float
+    poll_duration_p95: float
+    scheduler_lag_p95: float
+    cpu: float
+    max_rss: int
+
+    @property
+    def target_poll_rate(self: LoadTestReport) -> float:
+        """
+        Return the poll rate that the devices' UpdateRate asks for.
+
+        :return: polls per second, per device
+        """
+        return 1 / self.update_rate
+
+    @property
+    def sustained(self: LoadTestReport) -> bool:
+        """
+        Return whether the devices kept up with their UpdateRate.
+
+        :return: whether they achieved at least SUSTAINED_FRACTION of the
+            target poll rate
+        """
+        return self.poll_rate >= SUSTAINED_FRACTION * self.target_poll_rate
+
+    def summary(self: LoadTestReport) -> str:
+        """
+        Describe the results for people.
+
+        :return: a few lines of text
+        """
+        verdict = "sustained" if self.sustained else "NOT sustained"
+        return "\n".join(
+            [
+                f"{self.devices} devices x {self.attributes} attributes"
+                f" at UpdateRate {self.update_rate:g} s: {verdict}",
+                f"  poll rate:          {self.poll_rate:.3f}/s per device"
+                f" (target {self.target_poll_rate:.3f}/s)",
+                f"  poll duration P95:  {self.poll_duration_p95 * 1000:.1f} ms",
+                f"  scheduler lag P95:  {self.scheduler_lag_p95 * 1000:.1f} ms",
+                f"  CPU:                {self.cpu * 100:.1f}% of a core",
+                f"  peak RSS:           {self.max_rss / 2**20:.1f} MiB",
+            ]
+        )
+
+
+def scale_definition(definition: dict[str, Any], scale: int) -> dict[str, Any]:
+    """
+    Make a larger device definition, by widening the template's tables.
+
+    The last index range of each indexed attribute is made scale times as
+    long, so, for instance, a PDU of 24 outlets becomes one of 24 * scale
+    outlets. Attributes without indexes are left alone.
+
+    :param definition: the template device definition
+    :param scale: how many times as many rows each table should have
+
+    :return: a new definition
+    """
+    scaled = copy.deepcopy(definition)
+    for attr in scaled["attributes"]:
+        if not attr.get("indexes"):
+            continue
+        start, stop, *step = attr["indexes"][-1]
+        increment = step[0] if step else 1
+        rows = (stop - start) // increment + 1
+        attr["indexes"][-1] = [start, start + (rows * scale - 1) * increment, *step]
+    return scaled
+
+
+def snmprec_records(attributes: Iterable[SNMPAttrInfo]) -> list[tuple[str, str, str]]:
+    """
+    Make up a valid value for every object that some attributes read.
+
+    Values are the first member of enumerations, a string's attribute name,
+    and zero, or the nearest value to it in range, for numbers.
+
+    :param attributes: the attributes, as parsed from a device definition
+
+    :raises ValueError: if an attribute's numeric OID isn't known
+    :return: (OID, tag, value) of each object, in OID order, as in the
+        lines of a .snmprec file
+    """
+    records: dict[tuple[int, ...], tuple[str, str]] = {}
+    for attr in attributes:
+        if attr.oid is None:
+            raise ValueError(f"Attribute {attr.name} has no numeric OID")
+        record = _snmprec_record(attr)
+        for oid in attr.elements or (attr.oid,):
+            records[oid] = record
+    return [
+        (".".join(map(str, oid)), tag, value)
+        for oid, (tag, value) in sorted(records.items())
+    ]
+
+
+def _snmprec_record(attr: SNMPAttrInfo) -> tuple[str, str]:
+    """
+    Make up a valid value for the objects an attribute reads.
+
+    :param attr: the attribute
+
+    :return: the .snmprec tag and value
+    """
+    dtype = attr.dtype
+    if is_bit_enum(dtype):
+        return "4x", "00" * ceil(len(dtype) / 8)
+    if isinstance(dtype, EnumMeta):
+        valid = valid_enum_values(dtype)
+        return "2", str(valid[0] if valid else 0)
+    if dtype == str:
+        return "4", attr.name
+    value = max(0, attr.attr_args.get("min_value", 0))
+    value = min(value, attr.attr_args.get("max_value", value))
+    # Integer32, or Counter64 for values beyond its range
+    return ("2" if value < 2**31 else "70"), str(value)
+
+
+# pylint: disable=too-many-arguments, too-many-locals
+def run_load_test(
+    template: dict[str, Any],
+    devices: int,
+    *,
+    scale: int = 1,
+    update_rate: float = 2.0,
+    duration: float = 30.0,
+    warmup: float = 10.0,
+    agents: str = "fake",
+    latency: float = 0.0,
+    loss: float = 0.0,
+    properties: Mapping[str, Any] | None = None,
+    port: int = LOAD_TEST_PORT,
+) -> LoadTestReport:
+    """
+    Run SNMPDevices polling agents of their own in this process, and measure them.
+
+    Tango only allows one device server per process, so this can only be
+    called once per process.
+
+    :param template: the device definition to generate the devices' from
+    :param devices: the number of devices
+    :param scale: how many times as many rows the template's tables should
+        have; see scale_definition()
+    :param update_rate: the devices' UpdateRate, in seconds
+    :param duration: how long to measure for, in seconds
+    :param warmup: how long to let the devices start polling before that
+    :param agents: "fake" for FakeAgents, or "snmpsim" for snmpsim processes
+    :param latency: the fake agents' latency, in seconds
+    :param loss: the probability that a fake agent loses a request
+    :param properties: any other device properties, e.g. SNMPBackend
+    :param port: the port of the first agent; the others count up from it
+
+    :raises ValueError: for unknown agents, or fault injection with snmpsim
+    :return: the results
+    """
+    if agents not in AGENTS:
+        raise ValueError(f"agents must be one of {', '.join(AGENTS)}")
+    if agents != "fake" and (latency or loss):
+        raise ValueError("latency and loss can only be injected into fake agents")
+
+    definition = scale_definition(template, scale)
+    attributes = parse_device_definition(copy.deepcopy(definition))
+    records = snmprec_records(attributes)
+    ports = range(port, port + devices)
+
+    with tempfile.TemporaryDirectory() as work_dir, ExitStack() as stack:
+        definition_path = Path(work_dir) / "definition.yaml"
+        with open(definition_path, "w", encoding="utf-8") as definition_file:
+            yaml.safe_dump(definition, definition_file)
+
+        device_class: type[SNMPDevice]
+        if agents == "fake":
+            device_class = FakeSNMPDevice
+            for agent_port in ports:
+                FAKE_AGENTS[LOAD_TEST_HOST, agent_port] = FakeAgent(
+                    records, latency=latency, loss=loss
+                )
+                stack.callback(FAKE_AGENTS.pop, (LOAD_TEST_HOST, agent_port), None)
+        else:
+            device_class = SNMPDevice
+            # snmpsim may run as another user, who needs to read the data
+            os.chmod(work_dir, 0o755)
+            snmprec_path = Path(work_dir) / f"{LOAD_TEST_COMMUNITY}.snmprec"
+            with open(snmprec_path, "w", encoding="utf-8") as snmprec:
+                snmprec.writelines(f"{'|'.join(record)}\n" for record in records)
+            os.chmod(snmprec_path, 0o644)
+            for agent_port in ports:
+                stack.enter_context(run_simulator(work_dir, agent_port))
+
+        names = [f"load-test/snmp/{index}" for index in range(devices)]
+        device_properties = {
+            "DeviceDefinition": str(definition_path),
+            "Host": LOAD_TEST_HOST,
+            "V2Community": LOAD_TEST_COMMUNITY,
+            "UpdateRate": update_rate,
+            **(properties or {}),
+        }
+        context = stack.enter_context(
+            MultiDeviceTestContext(
+                [
+                    {
+                        "class": device_class,
+                        "devices": [
+                            {
+                                "name": name,
+                                "properties": {**device_properties, "Port": agent_port},
+                            }
+                            for name, agent_port in zip(names, ports)
+                        ],
+                    }
+                ]
+            )
+        )
+        proxies = [context.get_device(name) for name in names]
+        for proxy in proxies:
+            proxy.adminMode = AdminMode.ONLINE
+
+        time.sleep(warmup)
+        start, start_cpu, start_polls = _sample(proxies)
+        time.sleep(duration)
+        end, end_cpu, end_polls = _sample(proxies)
+
+        elapsed = end - start
+        polls = sum(end_polls) - sum(start_polls)
+        return LoadTestReport(
+            devices=devices,
+            attributes=len(attributes),
+            update_rate=update_rate,
+            duration=elapsed,
+            poll_rate=polls / devices / elapsed,
+            poll_duration_p95=max(proxy.pollDurationP95 for proxy in proxies),
+            scheduler_lag_p95=max(proxy.schedulerLagP95 for proxy in proxies),
+            cpu=(end_cpu - start_cpu) / elapsed,
+            # ru_maxrss is in KiB on Linux
+            max_rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        )
+
+
+def _sample(proxies: list[DeviceProxy]) -> tuple[float, float, list[int]]:
+    """
+    Read the clocks, and how many polls each device has made.
+
+    :param proxies: the devices
+
+    :return: the wall clock and CPU time, in seconds, and the poll counts
+    """
+    polls = [proxy.pollCount for proxy in proxies]
+    return time.monotonic(), time.process_time(), polls
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Run a load test from the command line.
+
+    :param argv: command line arguments, if not sys.argv
+
+    :return: exit code: 0 if the devices kept up with their UpdateRate,
+        else 1
+    """
+    parser = argparse.ArgumentParser(
+        description="Measure how many SNMPDevices, of how many attributes,"
+        " one device server can poll at a given UpdateRate."
+    )
+    parser.add_argument(
+        "template", help="the device definition to generate the devices' from"
+    )
+    parser.add_argument(
+        "-n", "--devices", type=int, default=10, help="the number of devices"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=1,
+        help="how many times as many rows the template's tables should have",
+    )
+    parser.add_argument(
+        "--update-rate",
+        type=float,
+        default=2.0,
+        help="the devices' UpdateRate, in seconds",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30.0, help="how long to measure for"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=10.0,
+        help="how long to let the devices start polling first",
+    )
+    parser.add_argument("--agents", choices=AGENTS, default="fake")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="the fake agents' latency"
+    )
+    parser.add_argument(
+        "--loss",
+        type=float,
+        default=0.0,
+        help="the probability that a fake agent loses a request",
+    )
+    parser.add_argument(
+        "-p",
+        "--property",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="another device property, e.g. SNMPBackend=asyncio",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=LOAD_TEST_PORT,
+        help="the port of the first agent",
+    )
+    parser.add_argument(
+        "--repo", default="", help="the telmodel repo to load the template from"
+    )
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(
+        load_device_definition(args.template, args.repo),
+        args.devices,
+        scale=args.scale,
+        update_rate=args.update_rate,
+        duration=args.duration,
+        warmup=args.warmup,
+        agents=args.agents,
+        latency=args.latency,
+        loss=args.loss,
+        properties=dict(prop.split("=", 1) for prop in args.property),
+        port=args.port,
+    )
+    print(report.summary())
+    if args.json:
+        results = {
+            **asdict(report),
+            "target_poll_rate": report.target_poll_rate,
+            "sustained": report.sustained,
+            "agents": args.agents,
+            "properties": args.property,
+        }
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=2)
+    return 0 if report.sustained else 1
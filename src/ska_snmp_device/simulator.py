@@ -0,0 +1,83 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""
+This module runs snmpsim agents for tests, benchmarks and load tests.
+
+It needs snmpsim-command-responder on the PATH.
+"""
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Any, Generator
+
+# Set to "user:group" to run snmpsim as another user, as it refuses to run as root
+SIMULATOR_USER_ENV = "SKA_SNMP_DEVICE_SIMULATOR_USER"
+
+# Where the simulators listen
+SIMULATOR_HOST = "127.0.0.1"
+
+
+# pylint: disable=consider-using-with
+@contextmanager
+def run_simulator(
+    data_dir: str, port: int, *extra_args: str
+) -> Generator[tuple[str, int], None, None]:
+    """
+    Run snmpsim in a subprocess, serving the .snmprec files in a directory.
+
+    Each file is served to the community named after it.
+
+    :param data_dir: the directory holding the simulation data
+    :param port: the UDP port to listen on
+    :param extra_args: any other snmpsim-command-responder arguments
+
+    :yields: host & port
+    :raises RuntimeError: Simulator failed
+    """
+    sim_user = os.getenv(SIMULATOR_USER_ENV, "").strip()
+    if sim_user:
+        user, group = sim_user.split(":")
+        user_args = [f"--process-user={user}", f"--process-group={group}"]
+    else:
+        user_args = []
+    host = SIMULATOR_HOST
+    sim_process: Any = subprocess.Popen(  # Any because mypy seems to hate Popen
+        [
+            "snmpsim-command-responder",
+            *user_args,
+            f"--data-dir={data_dir}",
+            *extra_args,
+            f"--agent-udpv4-endpoint={host}:{port}",
+        ],
+        encoding="utf-8",
+        stderr=subprocess.PIPE,
+    )
+    try:
+        while sim_process.poll() is None:
+            line = sim_process.stderr.readline()
+            if line.startswith(f"  Listening at UDP/IPv4 endpoint {host}:{port}"):
+                # The simulator logs every request, and would block once
+                # the pipe filled up if nobody kept reading it
+                threading.Thread(target=sim_process.stderr.read, daemon=True).start()
+                yield host, port
+                break
+        else:
+            cmd = " ".join(sim_process.args)
+            return_code = sim_process.returncode
+            raise RuntimeError(
+                f'Simulator command "{cmd}" exited with code {return_code}'
+                " without ever listening"
+            )
+    finally:
+        sim_process.send_signal(signal.SIGTERM)
+        sim_process.terminate()
+        sim_process.wait()
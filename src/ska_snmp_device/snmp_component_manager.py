@@ -9,22 +9,159 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Callable, Generator, Iterable, Mapping, Sequence, Union
+import math
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import groupby
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Mapping,
+    Sequence,
+    TypeVar,
+    Union,
+)
 
-from more_itertools import chunked
+from more_itertools import chunked, iter_except
 from pysnmp.entity.engine import SnmpEngine
-from pysnmp.hlapi import ContextData, UdpTransportTarget, getCmd, setCmd
+from pysnmp.hlapi import ContextData, UdpTransportTarget
+from pysnmp.hlapi.asyncore import bulkCmd, getCmd, setCmd
 from pysnmp.hlapi.auth import CommunityData, UsmUserData
-from pysnmp.proto.errind import ErrorIndication
+from pysnmp.hlapi.varbinds import CommandGeneratorVarBinds
+from pysnmp.proto.errind import ErrorIndication, RequestTimedOut
+from pysnmp.proto.rfc1902 import Counter32, Counter64, TimeTicks
 from pysnmp.smi.rfc1902 import ObjectIdentity, ObjectType
 from ska_tango_base.base import CommunicationStatusCallbackType
 
 from ska_attribute_polling.attribute_polling_component_manager import (
     AttributePollingComponentManager,
+    AttrInfo,
     AttrPollRequest,
     AttrPollResponse,
 )
-from ska_snmp_device.snmp_types import SNMPAttrInfo, python_to_snmp, snmp_to_python
+from ska_snmp_device.snmp_types import (
+    NO_VALUE_TYPES,
+    SNMPAttrInfo,
+    spectrum_array,
+)
+from ska_snmp_device.trap_receiver import trap_receiver
+
+T = TypeVar("T")
+
+# SNMPv2-MIB::sysUpTime.0, which every agent has, to check that it's alive
+SYS_UPTIME_OID = (1, 3, 6, 1, 2, 1, 1, 3, 0)
+
+
+class SNMPErrorStatus(Exception):
+    """
+    An error status in an agent's response, such as tooBig or genErr.
+
+    pysnmp reports these separately from its error indications, which
+    are failures to get a valid response at all.
+    """
+
+    def __init__(self: SNMPErrorStatus, status: str, index: int = 0) -> None:
+        """
+        Initialise the error.
+
+        :param status: the name of the error status, e.g. "tooBig"
+        :param index: the 1-based index of the varbind at fault, or 0
+        """
+        super().__init__(f"{status} at varbind {index}" if index else status)
+        self.status = status
+        self.index = index
+
+
+class AgentBackoff(Exception):
+    """Raised instead of polling an unreachable agent, until it's time to retry."""
+
+
+class DeadlineExceeded(Exception):
+    """The error for a request that the poll ran out of time to send or finish."""
+
+
+class TrafficCounters:
+    """
+    Counts of the SNMP packets and bytes exchanged with each agent.
+
+    These are gathered with pysnmp's execution observer, so they include
+    retries and SNMPv3 discovery, which are invisible to the caller.
+    """
+
+    # The pysnmp execution points at which messages are sent and received
+    EXECPOINTS = ("rfc3412.sendPdu", "rfc3412.receiveMessage:response")
+
+    def __init__(self: TrafficCounters) -> None:
+        """Create empty counters."""
+        self._counts: defaultdict[tuple[Any, ...], Counter[str]] = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def observe(self: TrafficCounters, engine: SnmpEngine) -> None:
+        """
+        Count the messages that an SNMP engine sends and receives.
+
+        :param engine: the SNMP engine
+        """
+        engine.observer.registerObserver(self._count, *self.EXECPOINTS)
+
+    def get(self: TrafficCounters, address: tuple[Any, ...]) -> Counter[str]:
+        """
+        Return the counts for an agent.
+
+        :param address: the agent's transport address, as resolved by pysnmp
+
+        :return: packets_sent, bytes_sent, packets_received and bytes_received
+        """
+        with self._lock:
+            return Counter(self._counts.get(tuple(address)[:2], {}))
+
+    def _count(
+        self: TrafficCounters,
+        engine: SnmpEngine,
+        execpoint: str,
+        variables: dict[str, Any],
+        cb_ctx: Any,
+    ) -> None:
+        """
+        Count a message, as an observer of an SNMP engine.
+
+        :param engine: the SNMP engine
+        :param execpoint: the execution point: sending or receiving
+        :param variables: the execution context, including the message
+        :param cb_ctx: unused
+        """
+        # pylint: disable=unused-argument
+        if execpoint == "rfc3412.sendPdu":
+            direction, message = "sent", variables["outgoingMessage"]
+        else:
+            direction, message = "received", variables["wholeMsg"]
+        with self._lock:
+            counts = self._counts[tuple(variables["transportAddress"])[:2]]
+            counts[f"packets_{direction}"] += 1
+            counts[f"bytes_{direction}"] += len(message)
+
+
+def response_error(
+    error_indication: ErrorIndication | None, error_status: Any, error_index: Any
+) -> Exception | None:
+    """
+    Return the error of an SNMP response, if it has one.
+
+    :param error_indication: pysnmp's error indication, if the request failed
+    :param error_status: the response's error-status field
+    :param error_index: the response's error-index field
+
+    :return: the error indication, or an SNMPErrorStatus if the agent
+        reported an error status, or None if the request succeeded
+    """
+    if error_indication:
+        return error_indication
+    if error_status:
+        return SNMPErrorStatus(error_status.prettyPrint(), int(error_index))
+    return None
 
 
 class SNMPComponentManager(AttributePollingComponentManager):
@@ -32,16 +169,28 @@ class SNMPComponentManager(AttributePollingComponentManager):
 
     _attributes: Mapping[str, SNMPAttrInfo]
 
-    SNMPCmdFn = Callable[
-        [
-            SnmpEngine,
-            Union[CommunityData, UsmUserData],
-            UdpTransportTarget,
-            ContextData,
-            ObjectType,
-        ],
-        Iterable[tuple[ErrorIndication, str, int, Iterable[ObjectType]]],
-    ]
+    # (engine, authority, transport, context, *args, **options) -> result.
+    # The results and keyword options differ between pysnmp's APIs.
+    SNMPCmdFn = Callable[..., Any]
+
+    SNMPCmdResult = tuple[Union[Exception, None], Sequence[ObjectType]]
+
+    # The callback-based commands from pysnmp.hlapi.asyncore, which let
+    # us have several requests in flight at once on the same engine.
+    # Subclasses built on another pysnmp API provide their own commands
+    # and transport target class.
+    _get_cmd = staticmethod(getCmd)
+    _set_cmd = staticmethod(setCmd)
+    _bulk_cmd = staticmethod(bulkCmd)
+    _transport_cls = UdpTransportTarget
+
+    # The number of objects per request is learnt from the agent's
+    # responses, within this limit. It grows by an eighth at a time, once
+    # this many polls in a row have succeeded with full-size requests, and
+    # sizes that have failed are tried again after this many more.
+    _pdu_size_limit = 128
+    _pdu_growth_polls = 10
+    _pdu_retry_polls = 100
 
     # pylint: disable=too-many-positional-arguments
     def __init__(  # noqa: D107
@@ -55,8 +204,17 @@ class SNMPComponentManager(AttributePollingComponentManager):
         component_state_callback: Callable[..., None],
         attributes: Sequence[SNMPAttrInfo],
         poll_rate: float,
+        max_in_flight_pdus: int = 1,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 60.0,
+        reconnect_jitter: float = 0.2,
+        timeout: float = 1.0,
+        retries: int = 5,
+        poll_deadline: float = 0.0,
+        trap_port: int = 0,
+        trap_engine_id: str = "",
     ):
-        # pylint: disable=too-many-arguments
+        # pylint: disable=too-many-arguments, too-many-locals
         super().__init__(
             logger,
             communication_state_callback,
@@ -79,55 +237,733 @@ class SNMPComponentManager(AttributePollingComponentManager):
             )
 
         # This determines how many OIDs will be stuffed into an SNMP
-        # Protocol Data Unit, i.e. a single packet
-        self._max_objects_per_pdu = max_objects_per_pdu
+        # Protocol Data Unit, i.e. a single packet. It starts at the given
+        # size, then adapts to the agent; see _adapt_pdu_size().
+        self._pdu_size = self._pdu_size_start = max(1, max_objects_per_pdu)
+        # The largest size that has worked, and the smallest that has failed
+        self._pdu_size_good = 0
+        self._pdu_size_bad = self._pdu_size_limit + 1
+        self._pdu_growth_count = self._pdu_retry_count = 0
+
+        # How many GET PDUs may be awaiting a response at the same time.
+        # With more than one, the chunks of a poll overlap rather than
+        # each costing a full round trip to the agent.
+        self._max_in_flight_pdus = max_in_flight_pdus
+
+        # Building an SnmpEngine is expensive (it loads a stack of MIBs),
+        # and each new engine opens its own socket and, for SNMPv3, has to
+        # rediscover the agent's engine ID. So we create them lazily, keep
+        # them for as long as we're polling, and only rebuild after a failure.
+        self._engine: SnmpEngine | None = None
+        self._transport: UdpTransportTarget | None = None
+
+        # Diagnostic counts of the messages exchanged with the agent, whose
+        # resolved address is only known once the transport has been built
+        self._traffic = TrafficCounters()
+        self._transport_address: tuple[Any, ...] = ()
+        self._traffic_baseline: Counter[str] = Counter()
+
+        # Resolving an ObjectIdentity against the MIB is slow, so we do it
+        # once for each OID and reuse the resolved ObjectTypes in every
+        # GET. Spectrum attributes have an OID for each element, in order.
+        # Several attributes can be read from the same OID, e.g. a counter
+        # and its rate.
+        self._read_oids: dict[str, tuple[tuple[int, ...], ...]] = {}
+        self._read_objects: dict[tuple[int, ...], ObjectType] = {}
+        self._oid_names: defaultdict[tuple[int, ...], list[str]] = defaultdict(list)
+
+        # For GETBULK, a resolved object for the OID just before each OID,
+        # whose successor is the OID itself.
+        self._bulk_objects: dict[tuple[int, ...], ObjectType] = {}
+        self._probe_object: ObjectType | None = None
+
+        # After a failed poll, the agent isn't polled again until the reconnect
+        # delay has passed. The delay doubles with each failure, up to the
+        # maximum, less a random fraction of up to reconnect_jitter so that
+        # devices that failed together don't all retry together. Each retry
+        # starts with a single-object GET, and the full poll only follows if
+        # the agent answers it.
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._reconnect_jitter = reconnect_jitter
+        self._failed_polls = 0
+        self._reconnect_at = 0.0
+
+        # How long to wait for each response, and how many times to resend a
+        # request that gets none. If poll_deadline is set, requests that
+        # haven't been sent by then, poll_deadline seconds after the poll
+        # started, are left for the next poll.
+        self._timeout = timeout
+        self._retries = retries
+        self._poll_deadline = poll_deadline
+
+        # If trap_port is set, notifications from the agent are received on
+        # that port while polling. Values they carry are reported by the poll
+        # they wake, and attributes with a trap_polling_period are read by it
+        # too, but otherwise only polled that often, as a consistency check.
+        self._trap_port = trap_port
+        self._trap_engine_id = trap_engine_id
+        self._receiving_traps = False
+        # Notified values accumulate here, by numeric OID, until the next
+        # poll applies them on the polling thread
+        self._notified_values: dict[tuple[int, ...], Any] = {}
+
+        # The last (count, sysUpTime, time.monotonic()) read for each rate
+        # attribute, to work out its next rate from
+        self._counter_samples: dict[str, tuple[int, TimeTicks | None, float]] = {}
 
     def poll(self, poll_request: AttrPollRequest) -> AttrPollResponse:
         """
         Group by writes and reads, chunk, and run the appropriate SNMP command.
 
-        Aggregate any returned ObjectTypes from GET commands as the poll response.
+        Aggregate any returned ObjectTypes from GET commands as the poll
+        response, along with any values notified since the last poll.
 
         :param poll_request: a list of attributes to poll
 
+        :raises error_indication: if every GET and GETBULK request sent
+            failed to get a response
         :return: the snmp response
         """
-        for write_chunk in chunked(
-            poll_request.writes.items(), self._max_objects_per_pdu
+        # This happens on the first poll, rather than holding up initialisation
+        if not self._read_oids:
+            self._resolve_oids()
+        if self._failed_polls:
+            self._probe(poll_request)
+        deadline = (
+            time.monotonic() + self._poll_deadline
+            if self._poll_deadline > 0
+            else math.inf
+        )
+
+        # The (size, error) of every request, to learn the best size from
+        requests: list[tuple[int, Exception | None]] = []
+
+        self._write(poll_request.writes, requests)
+        gets, runs = self._plan_reads(poll_request.reads)
+        values: dict[tuple[int, ...], Any] = {}
+
+        fallback_gets, bulk_errors = self._read_runs(runs, values, requests, deadline)
+        gets.extend(fallback_gets)
+
+        def get_args(read_chunk: list[tuple[int, ...]]) -> list[ObjectType]:
+            return [self._read_objects[oid] for oid in read_chunk]
+
+        results = self._run_chunks(
+            self._get_cmd,
+            chunked(gets, self._pdu_size),
+            get_args,
+            len,
+            self._max_in_flight_pdus,
+            requests,
+            deadline,
+        )
+        self._adapt_pdu_size(requests)
+
+        # A failed chunk only loses its own attributes, which will be polled
+        # again next time. If every chunk sent failed to get a response, the
+        # agent is unreachable. Chunks cut short by the deadline say nothing
+        # about the agent, so a poll that only ran out of time is a partial
+        # success.
+        chunk_errors = bulk_errors + [error for _, (error, _) in results]
+        errors = [error for error in chunk_errors if error]
+        deferred = [error for error in errors if isinstance(error, DeadlineExceeded)]
+        failed = [error for error in errors if not isinstance(error, DeadlineExceeded)]
+        if failed and len(failed) == len(chunk_errors) - len(deferred):
+            if not any(isinstance(error, SNMPErrorStatus) for error in failed):
+                error_indication, *_ = failed
+                raise error_indication
+        if deferred:
+            self._logger.warning(
+                f"Poll exceeded its {self._poll_deadline}s deadline,"
+                f" leaving {len(deferred)} requests for the next poll"
+            )
+        for error in errors:
+            if isinstance(error, DeadlineExceeded):
+                continue
+            if not isinstance(error, SNMPErrorStatus) or not error.index:
+                self._logger.warning(f"SNMP GET failed for one chunk: {error}")
+
+        for read_chunk, (status, var_binds) in results:
+            values.update((oid.asTuple(), val) for oid, val in var_binds)
+            if isinstance(status, SNMPErrorStatus) and status.index:
+                # The agent rejected this object, so it has no value
+                values.update((oid, status) for oid in read_chunk)
+        self._failed_polls = 0
+        # Values read just now are newer than any notified before the poll
+        return {**self._notified_response(), **self._decode(poll_request.reads, values)}
+
+    def _probe(self, poll_request: AttrPollRequest) -> None:
+        """
+        Check that an agent that failed the last poll is reachable again.
+
+        Until the reconnect delay has passed, this fails without sending
+        anything. After that, the agent is sent a GET of sysUpTime, and
+        only if it answers does the full poll go ahead.
+
+        :param poll_request: the poll that is waiting to be sent
+
+        :raises AgentBackoff: if it's too early to try the agent again
+        :raises error_indication: if the agent didn't answer
+        """
+        wait = self._reconnect_at - time.monotonic()
+        if wait > 0:
+            if poll_request.writes:
+                self._logger.warning(
+                    f"Discarding writes to {', '.join(poll_request.writes)},"
+                    " as the agent is unreachable"
+                )
+            raise AgentBackoff(f"Agent unreachable, retrying in {wait:.1f}s")
+        packets_sent = self.traffic["packets_sent"]
+        results = self._snmp_cmds(self._get_cmd, [[self._probe_object]], 1)
+        self._count_retries(packets_sent, results)
+        ((error_indication, _),) = results
+        self._count_request(1, error_indication)
+        # Any response at all, even an error status, means it's alive
+        if error_indication and not isinstance(error_indication, SNMPErrorStatus):
+            raise error_indication
+        self._logger.info("Agent is reachable again, resuming polling")
+
+    def _write(
+        self, writes: Mapping[str, Any], requests: list[tuple[int, Exception | None]]
+    ) -> None:
+        """
+        Write values to the agent, with SET requests.
+
+        Objects are written by their numeric OIDs, with the values already
+        converted to their SMI types by from_python(), so writing doesn't
+        need the objects' MIBs. Only attributes whose types aren't known
+        fall back to the MIB that resolved their symbolic OIDs.
+
+        :param writes: the values to write, by attribute name
+        :param requests: the (size, error) of each request sent is appended
+            to this list
+
+        :raises error_indication: if a request failed to get a response
+        """
+        objects = [
+            ObjectType(ObjectIdentity(self._read_oids[attr_name][0]), value)
+            for attr_name, value in writes.items()
+        ]
+        # The value returned from a SET will just be what we put in,
+        # but the internal state of the device as returned by a GET
+        # may not have changed yet. So instead of updating state after
+        # setting, just wait for a poll to reflect the new reality.
+        for objs, (error_indication, _) in self._run_chunks(
+            self._set_cmd, chunked(objects, self._pdu_size), list, len, 1, requests
         ):
-            objs = [
-                ObjectType(ObjectIdentity(*self._attributes[attr_name].identity), value)
-                for attr_name, value in write_chunk
-            ]
-            # The value returned from a SET will just be what we put in,
-            # but the internal state of the device as returned by a GET
-            # may not have changed yet. So instead of updating state after
-            # setting, just wait for a poll to reflect the new reality.
-            for _ in self._snmp_cmd(setCmd, objs):
-                pass
+            if isinstance(error_indication, SNMPErrorStatus):
+                self._logger.warning(f"SNMP SET of {objs} failed: {error_indication}")
+            elif error_indication:
+                raise error_indication
+
+    def _read_runs(
+        self,
+        runs: list[list[tuple[int, ...]]],
+        values: dict[tuple[int, ...], Any],
+        requests: list[tuple[int, Exception | None]],
+        deadline: float,
+    ) -> tuple[list[tuple[int, ...]], list[Exception | None]]:
+        """
+        Read runs of consecutive table rows, with GETBULK requests.
+
+        Each run of a table column is fetched with a single GETBULK varbind.
+        Anything the agent didn't return, e.g. because the column has gaps
+        or the response was truncated, falls back to an ordinary GET.
+
+        :param runs: runs of OIDs, each the successor of the one before
+        :param values: the values read are added to this dict, by OID
+        :param requests: the (size, error) of each request sent is appended
+            to this list
+        :param deadline: the time.monotonic() after which no more requests
+            are sent
+
+        :return: the OIDs to fall back to GET for, and the error of each
+            GETBULK request, or None if it succeeded
+        """
+
+        def bulk_args(run_chunk: list[list[tuple[int, ...]]]) -> list[Any]:
+            first_oids = (self._bulk_objects[run[0]] for run in run_chunk)
+            return [0, len(run_chunk[0]), *first_oids]
+
+        def bulk_size(run_chunk: list[list[tuple[int, ...]]]) -> int:
+            return sum(len(run) for run in run_chunk)
+
+        run_chunks = [
+            run_chunk
+            for run_length, length_runs in groupby(sorted(runs, key=len), key=len)
+            for run_chunk in chunked(length_runs, max(1, self._pdu_size // run_length))
+        ]
+        results = self._run_chunks(
+            self._bulk_cmd,
+            run_chunks,
+            bulk_args,
+            bulk_size,
+            self._max_in_flight_pdus,
+            requests,
+            deadline,
+        )
+        fallback: list[tuple[int, ...]] = []
+        for run_chunk, (error, var_bind_table) in results:
+            if isinstance(error, SNMPErrorStatus) and error.index:
+                # Find out which of the run's objects the agent objects to
+                fallback.extend(oid for run in run_chunk for oid in run)
+            if error:
+                continue
+            # GETBULK responses may run past the end of the requested range
+            requested = {oid for run in run_chunk for oid in run}
+            for row in var_bind_table:
+                for oid, val in row:
+                    if oid.asTuple() in requested:
+                        values[oid.asTuple()] = val
+            fallback.extend(requested.difference(values))
+        return fallback, [error for _, (error, _) in results]
+
+    def _count_request(self, size: int, error: Exception | None) -> None:
+        """
+        Count a request and its outcome in the poll statistics.
+
+        :param size: the number of varbinds in the request
+        :param error: the request's error, if it failed
+        """
+        if isinstance(error, DeadlineExceeded):
+            return  # it wasn't sent
+        self.stats.cycle["pdus"] += 1
+        self.stats.cycle["varbinds"] += size
+        if isinstance(error, RequestTimedOut):
+            self.stats.cycle["timeouts"] += 1
+
+    def _count_retries(
+        self, packets_sent: int, results: Sequence[SNMPCmdResult]
+    ) -> None:
+        """
+        Count the packets sent for some requests beyond the requests themselves.
+
+        :param packets_sent: the number of packets sent before the requests
+        :param results: the results of the requests
+        """
+        requests = sum(not isinstance(error, DeadlineExceeded) for error, _ in results)
+        extra = self.traffic["packets_sent"] - packets_sent - requests
+        self.stats.cycle["retries"] += max(0, extra)
+
+    @property
+    def traffic(self) -> Counter[str]:
+        """
+        Return counts of the SNMP messages exchanged with the agent.
+
+        :return: packets_sent, bytes_sent, packets_received and
+            bytes_received, since the component manager was created
+        """
+        return self._traffic.get(self._transport_address) - self._traffic_baseline
+
+    @property
+    def objects_per_pdu(self) -> int:
+        """
+        Return the number of objects currently sent in each request.
+
+        :return: the current maximum number of varbinds per PDU
+        """
+        return self._pdu_size
+
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    def _run_chunks(
+        self,
+        cmd_fn: SNMPCmdFn,
+        chunks: Iterable[list[T]],
+        to_args: Callable[[list[T]], Sequence[Any]],
+        size: Callable[[list[T]], int],
+        max_in_flight: int,
+        requests: list[tuple[int, Exception | None]],
+        deadline: float = math.inf,
+    ) -> list[tuple[list[T], SNMPCmdResult]]:
+        """
+        Execute the given SNMP command for each chunk, splitting any that are too big.
+
+        If the agent responds tooBig to a chunk, its two halves are sent
+        instead, and so on until they fit or can't be split any further.
+        If it responds with any other error status for one of the chunk's
+        varbinds, e.g. noSuchName from an SNMPv1 agent, that item is
+        returned on its own with the error, and the rest are sent again.
+
+        :param cmd_fn: the snmp command: Get, Set or GetBulk
+        :param chunks: the chunks of items to send, one request each
+        :param to_args: returns the request arguments for a chunk
+        :param size: returns the number of varbinds in a chunk's request
+        :param max_in_flight: how many requests may be outstanding at once
+        :param requests: the (size, error) of each request sent is appended
+            to this list
+        :param deadline: the time.monotonic() after which no more requests
+            are sent
+
+        :return: each chunk that was finally sent, or item that was
+            rejected, and its result
+        """
+        done: list[tuple[list[T], SNMPComponentManager.SNMPCmdResult]] = []
+        pending = list(chunks)
+        while pending:
+            packets_sent = self.traffic["packets_sent"]
+            results = self._snmp_cmds(
+                cmd_fn, [to_args(chunk) for chunk in pending], max_in_flight, deadline
+            )
+            self._count_retries(packets_sent, results)
+            retry = []
+            for chunk, result in zip(pending, results):
+                error, _ = result
+                requests.append((size(chunk), error))
+                self._count_request(size(chunk), error)
+                if len(chunk) > 1 and _is_too_big(error):
+                    half = (len(chunk) + 1) // 2
+                    retry.extend([chunk[:half], chunk[half:]])
+                elif (
+                    len(chunk) > 1
+                    and isinstance(error, SNMPErrorStatus)
+                    and 0 < error.index <= len(chunk)
+                ):
+                    done.append(([chunk[error.index - 1]], result))
+                    retry.append(chunk[: error.index - 1] + chunk[error.index :])
+                else:
+                    done.append((chunk, result))
+            pending = retry
+        return done
+
+    def _adapt_pdu_size(self, requests: Sequence[tuple[int, Exception | None]]) -> None:
+        """
+        Learn how many objects to send in each request, from a poll's requests.
+
+        Requests that the agent says are tooBig, or that time out when
+        smaller requests have worked, were too big. The size drops to
+        below the smallest of those, but no lower than the largest size
+        known to work, and won't reach that failed size again for a while.
+
+        Otherwise, if the poll's full-size requests all worked, the size
+        grows cautiously, or if it was only reduced because of timeouts,
+        it recovers quickly. Timeouts with no evidence that smaller requests
+        would work could just mean the agent is down, so they only shrink
+        requests if no request has ever worked.
+
+        :param requests: the (size, error) of each request in the poll
+        """
+        succeeded = [size for size, error in requests if error is None]
+        self._pdu_size_good = max([self._pdu_size_good, *succeeded])
+        too_big = [
+            size
+            for size, error in requests
+            if size > 1
+            and (
+                _is_too_big(error)
+                or isinstance(error, RequestTimedOut)
+                and 0 < self._pdu_size_good < size
+            )
+        ]
+        if too_big:
+            failed = min(too_big)
+            self._pdu_size_bad = min(self._pdu_size_bad, failed)
+            self._pdu_size_good = min(self._pdu_size_good, failed - 1)
+            self._pdu_size = max(1, failed // 2, self._pdu_size_good)
+            self._pdu_growth_count = self._pdu_retry_count = 0
+            self._logger.info(
+                f"Requests of {failed} objects are too big for the agent,"
+                f" sending {self._pdu_size} at a time"
+            )
+            return
+
+        if not succeeded:
+            if self._pdu_size_good == 0 and any(
+                isinstance(error, RequestTimedOut) for _, error in requests
+            ):
+                self._pdu_size = max(1, self._pdu_size // 2)
+            return
+
+        self._pdu_retry_count += 1
+        if self._pdu_retry_count >= self._pdu_retry_polls:
+            self._pdu_size_bad = self._pdu_size_limit + 1
+        if max(succeeded) < self._pdu_size:
+            return  # this poll didn't need full-size requests
+        if self._pdu_size < self._pdu_size_start < self._pdu_size_bad:
+            self._pdu_size = min(2 * self._pdu_size, self._pdu_size_start)
+            return
+        self._pdu_growth_count += 1
+        if self._pdu_growth_count < self._pdu_growth_polls:
+            return
+        self._pdu_growth_count = 0
+        pdu_size = min(
+            self._pdu_size + max(1, self._pdu_size // 8),
+            self._pdu_size_bad - 1,
+            self._pdu_size_limit,
+        )
+        if pdu_size > self._pdu_size:
+            self._logger.debug(f"Trying requests of {pdu_size} objects")
+            self._pdu_size = pdu_size
+
+    def _plan_reads(
+        self, reads: Sequence[str]
+    ) -> tuple[list[tuple[int, ...]], list[list[tuple[int, ...]]]]:
+        """
+        Split the OIDs to be read into scalars and runs of table columns.
+
+        A run is two or more OIDs in the same table column with consecutive
+        indexes, such as the instances of an attribute defined with "indexes"
+        in the device definition, or the elements of a spectrum attribute.
+        Runs are no longer than the maximum number of objects per PDU.
+
+        sysUpTime is read too whenever a rate attribute is, to detect restarts.
+
+        :param reads: the names of the attributes to read
+
+        :return: the OIDs to fetch with GET, and the runs to fetch with GETBULK
+        """
+        oids = {oid for name in reads for oid in self._read_oids[name]}
+        if any(self._attributes[name].rate for name in reads):
+            oids.add(SYS_UPTIME_OID)
+        runs: list[list[tuple[int, ...]]] = []
+        previous_oid: tuple[int, ...] = ()
+        for oid in sorted(oids):
+            if (
+                runs
+                and oid[:-1] == previous_oid[:-1]
+                and oid[-1] == previous_oid[-1] + 1
+                and len(runs[-1]) < self._pdu_size
+            ):
+                runs[-1].append(oid)
+            else:
+                runs.append([oid])
+            previous_oid = oid
+        gets = [oid for run in runs if len(run) == 1 for oid in run]
+        return gets, [run for run in runs if len(run) > 1]
+
+    def _decode(
+        self, reads: Sequence[str], values: Mapping[tuple[int, ...], Any]
+    ) -> AttrPollResponse:
+        """
+        Convert response values to Python values, keyed by attribute name.
+
+        Values for OIDs that don't belong to an attribute being read are
+        ignored. A spectrum attribute is only included if every one of its
+        elements was read.
+
+        Attributes the agent has no value for, e.g. because it returned
+        noSuchObject or noSuchInstance, or whose values can't be converted,
+        are included as None, so that just those attributes become invalid.
+
+        Rate attributes are only included once there is a rate to report:
+        see _counter_rate().
+
+        :param reads: the names of the attributes that were read
+        :param values: values from SNMP responses, or the error status for
+            objects the agent rejected, keyed by numeric OID
 
+        :return: the poll response
+        """
         state_updates: AttrPollResponse = {}
-        for read_chunk in chunked(poll_request.reads, self._max_objects_per_pdu):
-            oid_attr_map = {
-                attr.identity: attr
-                for attr_name in read_chunk
-                for attr in [self._attributes[attr_name]]
-            }
-            objs = [
-                ObjectType(ObjectIdentity(*self._attributes[attr_name].identity))
-                for attr_name in read_chunk
-            ]
-            for oid, val in self._snmp_cmd(getCmd, objs):
-                attr = oid_attr_map[self._mib_symbolic(oid)]
-                try:
-                    pyval = snmp_to_python(attr, val)
-                    state_updates[attr.name] = pyval
-                except ValueError as exc:
-                    self._logger.warn(
-                        f"Couldn't convert {attr} value {val} due to {exc}"
-                    )
+        now = time.monotonic()
+        uptime = values.get(SYS_UPTIME_OID)
+        if not isinstance(uptime, TimeTicks):
+            uptime = None
+        for name in reads:
+            attr = self._attributes[name]
+            oids = self._read_oids[name]
+            if attr.elements:
+                if all(oid in values for oid in oids):
+                    spectrum = spectrum_array(attr)
+                    for element, oid in enumerate(oids):
+                        pyval = self._convert(attr, values[oid])
+                        if pyval is None:
+                            state_updates[name] = None
+                            break
+                        spectrum[element] = pyval
+                    else:
+                        state_updates[name] = spectrum
+                continue
+            (oid,) = oids
+            if oid not in values:
+                continue
+            val = values[oid]
+            if attr.rate and not isinstance(val, (SNMPErrorStatus, *NO_VALUE_TYPES)):
+                rate = self._counter_rate(name, val, uptime, now)
+                if rate is not None:
+                    state_updates[name] = rate
+            else:
+                state_updates[name] = self._convert(attr, val)
         return state_updates
 
+    def _convert(self, attr: SNMPAttrInfo, val: Any) -> Any:
+        """
+        Convert a response value to an attribute's Python value.
+
+        :param attr: the attribute
+        :param val: the value from the SNMP response, or the error status
+            if the agent rejected the object
+
+        :return: the converted value, or None if there isn't a valid one
+        """
+        if isinstance(val, (SNMPErrorStatus, *NO_VALUE_TYPES)):
+            self._logger.debug(f"No value for {attr.name}: {val!r}")
+            return None
+        try:
+            return attr.from_snmp(val)
+        except ValueError as exc:
+            self._logger.warning(f"Couldn't convert {attr} value {val} due to {exc}")
+            self.stats.cycle["conversion_failures"] += 1
+            return None
+
+    def _counter_rate(
+        self, name: str, val: Any, uptime: TimeTicks | None, now: float
+    ) -> float | None:
+        """
+        Return the rate of change per second of a counter, since it was last read.
+
+        A Counter32 or Counter64 that has gone down is taken to have wrapped
+        around. Any other integer that has gone down is taken to have been
+        reset, as is every counter if the agent's sysUpTime has gone down,
+        i.e. if the agent has restarted. There is no rate for the first
+        reading after a reset, nor the first reading of all, which only
+        provide a baseline for the next.
+
+        :param name: the name of the rate attribute
+        :param val: the counter's value from the SNMP response
+        :param uptime: the agent's sysUpTime from the same response, if read
+        :param now: the time.monotonic() of the response
+
+        :return: the rate, or None if there is no rate yet
+        """
+        count = int(val)
+        previous = self._counter_samples.get(name)
+        self._counter_samples[name] = (count, uptime, now)
+        if previous is None:
+            return None
+        previous_count, previous_uptime, previous_time = previous
+        if uptime is not None and previous_uptime is not None:
+            if uptime < previous_uptime:
+                self._logger.info(f"Agent has restarted; restarting {name}")
+                return None
+        increase = count - previous_count
+        if increase < 0:
+            if not isinstance(val, (Counter32, Counter64)):
+                return None
+            increase += 2 ** (64 if isinstance(val, Counter64) else 32)
+        if now <= previous_time:
+            return None
+        return increase / (now - previous_time)
+
+    def poll_failed(self, exception: Exception) -> None:
+        """
+        Discard the SNMP engine after a failed poll.
+
+        The engine may be left with stale state (e.g. an outdated SNMPv3
+        engine ID if the agent has rebooted), so the next poll builds a new one.
+
+        Polling is then backed off: see _probe().
+
+        :param exception: the exception that was raised by a recent poll
+            attempt.
+        """
+        if isinstance(exception, AgentBackoff):
+            return  # nothing was sent, so nothing has changed
+        self._close_engine()
+        self._failed_polls += 1
+        delay = min(
+            self._reconnect_delay * 2 ** min(self._failed_polls - 1, 32),
+            self._max_reconnect_delay,
+        ) * random.uniform(1 - self._reconnect_jitter, 1)
+        self._reconnect_at = time.monotonic() + delay
+        super().poll_failed(exception)
+
+    def polling_started(self) -> None:
+        """
+        Start receiving the agent's notifications, if a trap port is set.
+
+        If they can't be received, e.g. because the port is in use, this is
+        logged, and attributes are polled at their usual polling periods.
+        """
+        super().polling_started()
+        if not self._trap_port:
+            return
+        try:
+            trap_receiver(self._trap_port).subscribe(
+                self._host,
+                self._access,
+                self._notification_received,
+                self._trap_engine_id,
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            self._logger.exception(
+                f"Can't receive notifications on port {self._trap_port}"
+            )
+        else:
+            self._receiving_traps = True
+
+    def polling_stopped(self) -> None:
+        """
+        Release the SNMP engine and its socket when polling stops.
+
+        This is called by the shared poller after stop_communicating(),
+        once any poll in progress has finished, so it can't race with a poll
+        that is still using the engine.
+        """
+        self._close_engine()
+        self._counter_samples.clear()
+        if self._receiving_traps:
+            self._receiving_traps = False
+            trap_receiver(self._trap_port).unsubscribe(
+                self._host, self._access, self._notification_received
+            )
+            self._notified_values.clear()
+        super().polling_stopped()
+
+    def _notification_received(
+        self, var_binds: Sequence[tuple[tuple[int, ...], Any]]
+    ) -> None:
+        """
+        Queue the values in a notification, and read trap-driven attributes.
+
+        This is called on the trap receiver's thread, so the values are
+        left for the next poll, which follows shortly afterwards, to report
+        on the polling thread. Notifications often only say that something
+        happened, e.g. that an alarm was raised, so every attribute with a
+        trap_polling_period is read by that poll too.
+
+        :param var_binds: the notification's numeric OIDs and values
+        """
+        self._logger.debug(f"Notification received: {var_binds}")
+        self._notified_values.update(var_binds)
+        self.enqueue_reads(
+            attr.name
+            for attr in self._attributes.values()
+            if attr.trap_polling_period is not None
+        )
+
+    def _notified_response(self) -> AttrPollResponse:
+        """
+        Take the values notified since the last poll, as a poll response.
+
+        Rate attributes are left out: their rates are worked out from
+        counts read together with sysUpTime, which notifications don't carry.
+
+        :return: the notified values of attributes' objects, by attribute name
+        """
+        values = dict(iter_except(self._notified_values.popitem, KeyError))
+        names = {
+            name
+            for oid in values
+            for name in self._oid_names.get(oid, [])
+            if not self._attributes[name].rate
+        }
+        return self._decode(sorted(names), values)
+
+    def _polling_period(self, attr: AttrInfo) -> float:
+        """
+        Return the polling period, or trap polling period, of an attribute.
+
+        :param attr: the attribute
+
+        :return: the attribute's trap_polling_period if it has one and
+            notifications are being received, or else its polling_period
+        """
+        trap_polling_period = self._attributes[attr.name].trap_polling_period
+        if self._receiving_traps and trap_polling_period is not None:
+            return trap_polling_period
+        return attr.polling_period
+
     def from_python(self, attr_name: str, val: Any) -> Any:
         """
         Convert from raw Python type to a hardware-compatible type.
@@ -141,56 +977,135 @@ class SNMPComponentManager(AttributePollingComponentManager):
         :return: the value as an snmp data type
         """
         attr = self._attributes[attr_name]
-        return python_to_snmp(attr, val)
+        return attr.to_snmp(val)
 
-    def _snmp_cmd(
-        self, cmd_fn: SNMPCmdFn, objects: Iterable[ObjectType]
-    ) -> Generator[ObjectType, None, None]:
+    def _snmp_cmds(
+        self,
+        cmd_fn: SNMPCmdFn,
+        chunks: Sequence[Sequence[Any]],
+        max_in_flight: int,
+        deadline: float = math.inf,
+    ) -> list[SNMPCmdResult]:
         """
-        Execute the given SNMP command with the given objects.
+        Execute the given SNMP command once for each chunk of objects.
+
+        Up to max_in_flight requests are sent before waiting for responses,
+        so their round trips overlap. A failure in one request doesn't affect
+        the others; it's returned in place of that chunk's result.
 
-        Yields each valued ObjectType in the response in the case of GET, and
-        nothing in the case of SET. No other commands are currently supported.
+        Once the deadline has passed, no more requests are sent, and the
+        rest fail with DeadlineExceeded. Requests already sent are allowed
+        to finish, which takes at most the timeout times (retries + 1).
 
-        :param cmd_fn: the snmp command either Get or Set
-        :param objects: lists of OIDs
+        :param cmd_fn: the snmp command: Get, Set or GetBulk
+        :param chunks: the arguments for each request: a list of OIDs, or for
+            GETBULK, non-repeaters and max-repetitions followed by the OIDs
+        :param max_in_flight: how many requests may be outstanding at once
+        :param deadline: the time.monotonic() after which no more requests
+            are sent
 
-        :raises error_indication: for snmp failure
-        :yields: the result from snmp command
+        :return: an (error, var_binds) pair for each chunk, in order, where
+            error is the error indication or SNMPErrorStatus, if the request
+            failed. For GETBULK, var_binds is a table of rows of varbinds.
         """
-        iterator = cmd_fn(
-            SnmpEngine(),
-            self._access,
-            UdpTransportTarget((self._host, self._port)),
-            ContextData(),
-            *objects,
-        )
+        engine, transport = self._get_engine()
+        results: list[SNMPComponentManager.SNMPCmdResult] = [(None, [])] * len(chunks)
 
-        error_indication: ErrorIndication
-        result: Iterable[ObjectType]
-        for error_indication, _, _, result in iterator:
-            # noqa: T101 TODO error handling could be more sophisticated
-            if error_indication:
-                raise error_indication
-            yield from result
+        # pylint: disable=too-many-arguments, too-many-positional-arguments
+        def on_response(
+            snmp_engine: SnmpEngine,
+            send_request_handle: int,
+            error_indication: ErrorIndication | None,
+            error_status: Any,
+            error_index: int,
+            var_binds: Sequence[ObjectType],
+            index: int,
+        ) -> None:
+            error = response_error(error_indication, error_status, error_index)
+            results[index] = (error, var_binds)
+
+        for window in chunked(enumerate(chunks), max(1, max_in_flight)):
+            if time.monotonic() >= deadline:
+                for index, _ in window:
+                    results[index] = (DeadlineExceeded(), [])
+                continue
+            for index, objects in window:
+                cmd_fn(
+                    engine,
+                    self._access,
+                    transport,
+                    ContextData(),
+                    *objects,
+                    cbFun=on_response,
+                    cbCtx=index,
+                    lookupMib=False,
+                )
+            engine.transportDispatcher.runDispatcher()
+        return results
 
-    @staticmethod
-    def _mib_symbolic(oid: ObjectIdentity) -> tuple[str | int, ...]:
+    def _get_engine(self) -> tuple[SnmpEngine, UdpTransportTarget]:
         """
-        Construct a (mib_name, symbol_name, indexes) tuple from an ObjectIdentity.
+        Return the SNMP engine and transport target, creating them if needed.
 
-        This is nearly the same as ObjectIdentity.getMibSymbol(), but that returns
-        the indexes as a nested tuple, which we need to flatten. The returned value
-        is suitable to be unpacked as the arguments to ObjectIdentity.__init__().
+        :return: the long-lived engine and transport target for this device
+        """
+        if self._engine is None or self._transport is None:
+            self._engine = SnmpEngine()
+            self._traffic.observe(self._engine)
+            self._transport = self._transport_cls(
+                (self._host, self._port), timeout=self._timeout, retries=self._retries
+            )
+            self._transport_address = self._transport.transportAddr
+        return self._engine, self._transport
 
-        There is another complication when dealing with SNMP objects that are not
-        part of a table (i.e. OIDs whose last segment is 0). PySNMP returns
-        these indexes as ObjectName, rather than Integer32. ObjectName is an
-        iterable, which adds another level of nesting that we need to unroll.
+    def _resolve_oids(self) -> None:
+        """
+        Build the pre-resolved GET objects and the numeric OID index.
 
-        :param oid: an snmp ObjectIdentity
-        :return: ObjectIdentity as a tuple
+        Attributes parsed from a device definition already carry a numeric OID;
+        otherwise the symbolic identity is resolved against the engine's MIBs.
+        Resolved ObjectTypes remain valid for any engine, so this only happens
+        once per component manager.
         """
-        mib, name, indices = oid.getMibSymbol()
-        indices = (y for x in indices for y in (x if isinstance(x, Iterable) else [x]))
-        return mib, name, *indices
+        engine, _ = self._get_engine()
+        mib_view = CommandGeneratorVarBinds.getMibViewController(engine)
+        for attr in self._attributes.values():
+            if attr.elements:
+                oids = attr.elements
+            elif attr.oid is not None:
+                oids = (attr.oid,)
+            else:
+                identity = ObjectIdentity(*attr.identity).resolveWithMib(mib_view)
+                oids = (identity.getOid().asTuple(),)
+            self._read_oids[attr.name] = oids
+            for oid in oids:
+                self._oid_names[oid].append(attr.name)
+        # sysUpTime is read alongside counters, to tell if the agent restarted
+        for oid in [*self._oid_names, SYS_UPTIME_OID]:
+            self._read_objects[oid] = ObjectType(ObjectIdentity(oid)).resolveWithMib(
+                mib_view
+            )
+            # The successor of an index's predecessor is the index itself
+            *prefix, index = oid
+            previous = (*prefix, index - 1) if index else tuple(prefix)
+            self._bulk_objects[oid] = ObjectType(
+                ObjectIdentity(previous)
+            ).resolveWithMib(mib_view)
+        self._probe_object = self._read_objects[SYS_UPTIME_OID]
+
+    def _close_engine(self) -> None:
+        """Close the SNMP engine's socket, so that a new one is built when needed."""
+        engine, self._engine, self._transport = self._engine, None, None
+        if engine is not None and engine.transportDispatcher is not None:
+            engine.transportDispatcher.closeDispatcher()
+
+
+def _is_too_big(error: Exception | None) -> bool:
+    """
+    Return whether an error means that a request or its response was too big.
+
+    :param error: the error of an SNMP request, if any
+
+    :return: whether the agent responded tooBig
+    """
+    return isinstance(error, SNMPErrorStatus) and error.status == "tooBig"
@@ -8,18 +8,30 @@
 """This module implements a generic snmp device."""
 from __future__ import annotations
 
-from tango.server import device_property
+from tango.server import attribute, device_property
 
 from ska_attribute_polling.attribute_polling_device import AttributePollingDevice
+from ska_snmp_device.asyncio_component_manager import AsyncioSNMPComponentManager
 from ska_snmp_device.definitions import load_device_definition, parse_device_definition
 from ska_snmp_device.snmp_component_manager import SNMPComponentManager
+from ska_snmp_device.telmodel_cache import TELMODEL_CACHE_TTL
+
+# Implementations of the SNMP I/O, selectable with the SNMPBackend property
+SNMP_BACKENDS: dict[str, type[SNMPComponentManager]] = {
+    "asyncore": SNMPComponentManager,
+    "asyncio": AsyncioSNMPComponentManager,
+}
 
 
 class SNMPDevice(AttributePollingDevice):
     """An implementation of a generic snmp Tango device."""
 
+    # The component manager class of each SNMPBackend
+    _backends = SNMP_BACKENDS
+
     DeviceDefinition = device_property(dtype=str, mandatory=True)
     TelmodelRepo = device_property(dtype=str, default_value="")
+    TelmodelCacheTTL = device_property(dtype=float, default_value=TELMODEL_CACHE_TTL)
     Host = device_property(dtype=str, mandatory=True)
     Port = device_property(dtype=int, default_value=161)
     V2Community = device_property(dtype=str)
@@ -27,17 +39,30 @@ class SNMPDevice(AttributePollingDevice):
     V3AuthKey = device_property(dtype=str)
     V3PrivKey = device_property(dtype=str)
     MaxObjectsPerSNMPCmd = device_property(dtype=int, default_value=24)
+    MaxInFlightPDUs = device_property(dtype=int, default_value=1)
+    SNMPBackend = device_property(dtype=str, default_value="asyncore")
+    ReconnectDelay = device_property(dtype=float, default_value=1.0)
+    MaxReconnectDelay = device_property(dtype=float, default_value=60.0)
+    ReconnectJitter = device_property(dtype=float, default_value=0.2)
+    SNMPTimeout = device_property(dtype=float, default_value=1.0)
+    SNMPRetries = device_property(dtype=int, default_value=5)
+    PollDeadline = device_property(dtype=float, default_value=0.0)
+    TrapPort = device_property(dtype=int, default_value=0)
+    TrapEngineID = device_property(dtype=str, default_value="")
 
     def create_component_manager(self: SNMPDevice) -> SNMPComponentManager:
         """
         Create and return a component manager. Called during init_device().
 
+        :raises ValueError: if SNMPBackend isn't the name of a backend
         :returns: tne component manager
         """
         # This goes here because you don't have access to properties
         # until tango.server.BaseDevice.init_device() has been called
         dynamic_attrs = parse_device_definition(
-            load_device_definition(self.DeviceDefinition, self.TelmodelRepo)
+            load_device_definition(
+                self.DeviceDefinition, self.TelmodelRepo, self.TelmodelCacheTTL
+            )
         )
 
         self._dynamic_attrs = {attr.name: attr for attr in dynamic_attrs}
@@ -55,7 +80,13 @@ class SNMPDevice(AttributePollingDevice):
                 "privKey": self.V3PrivKey,
             }
 
-        return SNMPComponentManager(
+        if self.SNMPBackend not in self._backends:
+            raise ValueError(
+                f"Unknown SNMPBackend {self.SNMPBackend!r},"
+                f" must be one of {', '.join(self._backends)}"
+            )
+
+        return self._backends[self.SNMPBackend](
             host=self.Host,
             port=self.Port,
             authority=authority,
@@ -65,8 +96,83 @@ class SNMPDevice(AttributePollingDevice):
             component_state_callback=self._component_state_changed,
             attributes=dynamic_attrs,
             poll_rate=self.UpdateRate,
+            max_in_flight_pdus=self.MaxInFlightPDUs,
+            reconnect_delay=self.ReconnectDelay,
+            max_reconnect_delay=self.MaxReconnectDelay,
+            reconnect_jitter=self.ReconnectJitter,
+            timeout=self.SNMPTimeout,
+            retries=self.SNMPRetries,
+            poll_deadline=self.PollDeadline,
+            trap_port=self.TrapPort,
+            trap_engine_id=self.TrapEngineID,
         )
 
+    @attribute(dtype=int)
+    def objectsPerSNMPCmd(self: SNMPDevice) -> int:  # pylint: disable=invalid-name
+        """
+        Return the number of SNMP objects currently sent in each request.
+
+        This starts at MaxObjectsPerSNMPCmd, then adapts to the agent.
+
+        :return: the current number of objects per request PDU
+        """
+        return self.component_manager.objects_per_pdu
+
+    @attribute(dtype=int)
+    def pdusPerPoll(self: SNMPDevice) -> int:  # pylint: disable=invalid-name
+        """
+        Return the number of SNMP requests sent by the last poll.
+
+        :return: the number of request PDUs in the last poll
+        """
+        return self.component_manager.stats.last_cycle["pdus"]
+
+    @attribute(dtype=int)
+    def varbindsPerPoll(self: SNMPDevice) -> int:  # pylint: disable=invalid-name
+        """
+        Return the number of objects requested by the last poll.
+
+        :return: the number of varbinds in the last poll's requests
+        """
+        return self.component_manager.stats.last_cycle["varbinds"]
+
+    @attribute(dtype=int)
+    def snmpTimeouts(self: SNMPDevice) -> int:  # pylint: disable=invalid-name
+        """
+        Return the number of SNMP requests that got no response.
+
+        :return: the total number of requests that timed out
+        """
+        return self.component_manager.stats.totals["timeouts"]
+
+    @attribute(dtype=int)
+    def snmpRetries(self: SNMPDevice) -> int:  # pylint: disable=invalid-name
+        """
+        Return the number of SNMP packets sent that weren't new requests.
+
+        :return: the total number of retransmissions, and SNMPv3 discovery
+            messages
+        """
+        return self.component_manager.stats.totals["retries"]
+
+    @attribute(dtype=int, unit="B")
+    def bytesSent(self: SNMPDevice) -> int:  # pylint: disable=invalid-name
+        """
+        Return the number of bytes of SNMP messages sent to the agent.
+
+        :return: the total size of the messages sent
+        """
+        return self.component_manager.traffic["bytes_sent"]
+
+    @attribute(dtype=int, unit="B")
+    def bytesReceived(self: SNMPDevice) -> int:  # pylint: disable=invalid-name
+        """
+        Return the number of bytes of SNMP messages received from the agent.
+
+        :return: the total size of the messages received
+        """
+        return self.component_manager.traffic["bytes_received"]
+
 
 # ----------
 # Run server
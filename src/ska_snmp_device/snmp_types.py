@@ -11,24 +11,61 @@ Functions to handle translation between PyTango- and PySNMP-compatible types.
 It should be possible to add support for new types by only modifying
 the functions in this module.
 """
+from __future__ import annotations
 
 from dataclasses import dataclass
 from enum import Enum, EnumMeta, IntEnum
-from functools import reduce
+from functools import cached_property, lru_cache, reduce
 from math import ceil
-from typing import Any
+from typing import Any, Callable, cast
 
+import numpy as np
 from pyasn1.type.base import Asn1Type
 from pyasn1.type.constraint import ConstraintsUnion, ValueRangeConstraint
 from pyasn1.type.namedval import NamedValues
 from pyasn1.type.univ import Integer
+from pysnmp.proto import rfc1902
 from pysnmp.proto.rfc1902 import Bits, OctetString
+from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchInstance, NoSuchObject
 from tango import AttrDataFormat, DevEnum, DevULong64
 
-from ska_attribute_polling.attribute_polling_component_manager import AttrInfo
+from ska_attribute_polling.attribute_polling_component_manager import (
+    AttrInfo,
+    SpectrumValue,
+)
 
 _SNMP_ENUM_INVALID_PREFIX = "_SNMPEnum_INVALID_"
 
+# Values an agent returns in place of an object it doesn't have
+NO_VALUE_TYPES = (NoSuchObject, NoSuchInstance, EndOfMibView)
+
+# The positions of the bits set in each byte value, as numbered in SNMP BITS
+# (most significant first)
+_BYTE_BITS = tuple(
+    tuple(bit for bit in range(8) if byte & (0b10000000 >> bit)) for byte in range(256)
+)
+
+
+# The SMI base types of SNMP objects, by name, for writing values as the
+# right type without the MIB that defines the object
+SNMP_SYNTAXES: dict[str, type[Asn1Type]] = {
+    cls.__name__: cls
+    for cls in (
+        rfc1902.Bits,
+        rfc1902.Counter32,
+        rfc1902.Counter64,
+        rfc1902.Gauge32,
+        rfc1902.Integer,
+        rfc1902.Integer32,
+        rfc1902.IpAddress,
+        rfc1902.ObjectIdentifier,
+        rfc1902.OctetString,
+        rfc1902.Opaque,
+        rfc1902.TimeTicks,
+        rfc1902.Unsigned32,
+    )
+}
+
 
 class BitEnum(IntEnum):
     """This exists to let us dispatch on Enum subclass elsewhere."""
@@ -47,9 +84,51 @@ def strbool(value: Asn1Type) -> bool:
 
 @dataclass(frozen=True)
 class SNMPAttrInfo(AttrInfo):
-    """Helper class to hold attribute information."""
+    """
+    Helper class to hold attribute information.
+
+    :param identity: the symbolic (mib_name, symbol_name, *indexes) OID.
+
+    :param oid: the numeric OID, if it has already been resolved from the MIB.
+
+    :param elements: for a SPECTRUM attribute made from the rows of a table
+        column, the numeric OID of each element, in order.
+
+    :param trap_polling_period: for an attribute whose changes the agent
+        announces with notifications, the polling period to use instead
+        while notifications are being received, in seconds.
+
+    :param rate: whether the attribute's value is the rate of change of its
+        counter object, per second, rather than the object's value.
+
+    :param syntax: the name of the object's SMI base type in SNMP_SYNTAXES,
+        which values written to it are converted to, if known.
+    """
 
     identity: tuple[str | int, ...]
+    oid: tuple[int, ...] | None = None
+    elements: tuple[tuple[int, ...], ...] = ()
+    trap_polling_period: float | None = None
+    rate: bool = False
+    syntax: str | None = None
+
+    @cached_property
+    def from_snmp(self: SNMPAttrInfo) -> Callable[[Asn1Type], Any]:
+        """
+        Return the function converting this attribute's PySNMP values to Python.
+
+        :return: the converter built by snmp_converter()
+        """
+        return snmp_converter(self)
+
+    @cached_property
+    def to_snmp(self: SNMPAttrInfo) -> Callable[[Any], Any]:
+        """
+        Return the function converting this attribute's Python values for PySNMP.
+
+        :return: the converter built by python_converter()
+        """
+        return python_converter(self)
 
 
 def dtype_string_to_type(dtype: str) -> Any:
@@ -79,6 +158,8 @@ def snmp_to_python(attr: SNMPAttrInfo, value: Asn1Type) -> Any:
     """
     Coerce a PySNMP value to a PyTango-compatible Python type.
 
+    This uses the attribute's precompiled converter; see snmp_converter().
+
     :param attr: attribute information
     :param value: data type of the attribute
 
@@ -86,58 +167,186 @@ def snmp_to_python(attr: SNMPAttrInfo, value: Asn1Type) -> Any:
     :return: the python value
     """
     try:
-        if isinstance(value, Integer) or attr.dtype == int:
-            value = int(value)
-        elif isinstance(value, Bits):
-            value = [
-                attr.dtype((byte * 8) + bit)
-                for byte, int_val in enumerate(bytes(value))
-                for bit in range(8)
-                if int_val & (0b10000000 >> bit)
-            ]
-        elif attr.dtype == bool:
-            value = strbool(value)
-        elif attr.dtype == float:
-            value = float(value)
-        elif attr.dtype == DevEnum and attr.attr_args.get("enum_labels"):
-            value = int(value)
-        elif isinstance(value, OctetString):
-            value = str(value)
-        else:
-            raise ValueError(f"Cannot convert unsupported type {type(value)}")
-        return value
+        return attr.from_snmp(value)
     except ValueError as exc:
         raise ValueError(
             f"{attr.name} cannot convert to '{value}' to {attr.dtype}"
         ) from exc
 
 
+# pylint: disable=too-many-return-statements
+def snmp_converter(attr: SNMPAttrInfo) -> Callable[[Asn1Type], Any]:
+    """
+    Build a function that coerces PySNMP values of an attribute to Python.
+
+    Choosing the conversion involves a chain of type checks, which only
+    depend on the attribute, so they are done once here, rather than for
+    every value polled. Integer values are always converted to int, as
+    that's how they arrive for integer and enum objects alike.
+
+    :param attr: attribute information
+
+    :return: a function converting one value, raising ValueError on failure
+    """
+    dtype = attr.dtype
+    if dtype == int or (dtype == DevEnum and attr.attr_args.get("enum_labels")):
+        return int
+
+    if is_bit_enum(dtype):
+        members = {member.value: member for member in dtype}
+
+        def convert_bits(value: Asn1Type) -> Any:
+            if isinstance(value, Integer):
+                return int(value)
+            # Without a MIB lookup, BITS values arrive as plain OCTET STRINGs
+            try:
+                return [
+                    members[byte * 8 + bit]
+                    for byte, int_val in enumerate(value.asOctets())
+                    for bit in _BYTE_BITS[int_val]
+                ]
+            except KeyError as exc:
+                raise ValueError(f"bit {exc} is not a member of {dtype}") from exc
+
+        return convert_bits
+
+    non_integer: Callable[[Asn1Type], Any]
+    if dtype == bool:
+        non_integer = strbool
+    elif dtype == float:
+        non_integer = float
+    else:
+
+        def non_integer(value: Asn1Type) -> Any:
+            if isinstance(value, OctetString):
+                return str(value)
+            raise ValueError(f"Cannot convert unsupported type {type(value)}")
+
+    def convert(value: Asn1Type) -> Any:
+        if isinstance(value, Integer):
+            return int(value)
+        return non_integer(value)
+
+    return convert
+
+
+def spectrum_array(attr: SNMPAttrInfo) -> SpectrumValue:
+    """
+    Allocate an array to hold the value of a SPECTRUM attribute.
+
+    The elements are uninitialised, and are filled in from the poll response.
+
+    :param attr: attribute information, with elements
+
+    :return: an uninitialised array with an element for each of attr.elements
+    """
+    numpy_dtypes: dict[Any, Any] = {
+        int: np.int64,
+        DevULong64: np.uint64,
+        float: np.float64,
+        bool: np.bool_,
+    }
+    dtype = numpy_dtypes.get(attr.dtype, object)
+    return np.empty(len(attr.elements), dtype=dtype).view(SpectrumValue)
+
+
 def python_to_snmp(attr: SNMPAttrInfo, value: Any) -> Any:
     """
     Coerce a Python/PyTango value to a PySNMP-compatible type.
 
-    This has less work to do than snmp_to_python(), as PySNMP does a pretty
-    good job of type coercion. We don't actually have to create an Asn1Type
-    object here; that happens deep in the bowels of PySNMP.
+    This uses the attribute's precompiled converter; see python_converter().
 
     :param attr: attribute information
     :param value: data type of the attribute
 
-    :raises ValueError: If there is an invalid enum
     :return: the snmp value
     """
-    if issubclass(attr.dtype, BitEnum):
-        n_bytes = ceil(len(attr.dtype) / 8)
-        int_vals = [0] * n_bytes
-        for bit in value:
-            int_vals[bit // 8] |= 0b10000000 >> bit
-        bytes_val = bytes(int_vals)
-        return bytes_val
-    if issubclass(attr.dtype, Enum):
+    return attr.to_snmp(value)
+
+
+def python_converter(attr: SNMPAttrInfo) -> Callable[[Any], Any]:
+    """
+    Build a function that coerces Python/PyTango values of an attribute for PySNMP.
+
+    This has less work to do than snmp_converter(), as PySNMP does a pretty
+    good job of type coercion. If the attribute's SMI syntax is known, the
+    values are converted to that type here, so that they can be written
+    without the object's MIB. Otherwise PySNMP converts them, using the MIB.
+
+    :param attr: attribute information
+
+    :return: a function converting one value, raising ValueError if it's an
+        invalid enum value
+    """
+    convert = _python_value_converter(attr)
+    if attr.syntax is None:
+        return convert
+    syntax = SNMP_SYNTAXES[attr.syntax]
+
+    def convert_to_syntax(value: Any) -> Any:
+        return syntax(convert(value))
+
+    return convert_to_syntax
+
+
+def _python_value_converter(attr: SNMPAttrInfo) -> Callable[[Any], Any]:
+    """
+    Build a function that coerces Python/PyTango values to plain Python values.
+
+    :param attr: attribute information
+
+    :return: a function converting one value, raising ValueError if it's an
+        invalid enum value
+    """
+    dtype = attr.dtype
+    if is_bit_enum(dtype):
+        n_bytes = ceil(len(dtype) / 8)
+
+        def convert_bits(value: Any) -> bytes:
+            int_vals = [0] * n_bytes
+            for bit in value:
+                int_vals[bit // 8] |= 0b10000000 >> (bit % 8)
+            return bytes(int_vals)
+
+        return convert_bits
+
+    if isinstance(dtype, EnumMeta):
         # I'd prefer to get enum labels directly from Tango, but I can't
         # figure it an easy way, so we refer back to our attr args.
-        if attr.dtype(value).name.startswith(_SNMP_ENUM_INVALID_PREFIX):
-            raise ValueError(f"Enum value {value} for {attr.name} is invalid.")
+        valid = set(valid_enum_values(dtype))
+
+        def convert_enum(value: Any) -> Any:
+            if value not in valid:
+                raise ValueError(f"Enum value {value} for {attr.name} is invalid.")
+            return value
+
+        return convert_enum
+
+    return _identity
+
+
+def syntax_name(snmp_type: Asn1Type) -> str | None:
+    """
+    Return the name of the SMI base type of an SNMP object's syntax.
+
+    :param snmp_type: the syntax of the object, from its MIB
+
+    :return: the name of its type in SNMP_SYNTAXES, or None if it has none
+    """
+    for cls in type(snmp_type).__mro__:
+        if SNMP_SYNTAXES.get(cls.__name__) is cls:
+            return cls.__name__
+    return None
+
+
+def _identity(value: Any) -> Any:
+    """
+    Return the value unchanged.
+
+    :param value: any value
+
+    :return: the value
+    """
     return value
 
 
@@ -226,13 +435,55 @@ def _enum_from_named_values(
     # Tango DevEnum requires that values start at 0 and increment, but many
     # SNMP enum values start at 1, so we insert "invalid" entries in that
     # case, and check for them when attributes are written.
-    enum_entries = [
+    enum_entries = tuple(
         (valued_names.get(x, _SNMP_ENUM_INVALID_PREFIX + str(x)), x)
         for x in range(max(valued_names) + 1)
-    ]
+    )
+    return _create_enum(cls, enum_entries)
+
+
+@lru_cache(maxsize=1024)
+def _create_enum(cls: EnumMeta, enum_entries: tuple[tuple[str, int], ...]) -> EnumMeta:
+    """
+    Create an Enum subclass with the given entries.
+
+    Objects of the same SNMP type share the same class, rather than each
+    attribute getting its own copy.
+
+    :param cls: data type class
+    :param enum_entries: the (name, value) of each member
+
+    :return: the tango enum
+    """
     return cls("SNMPEnum", enum_entries)
 
 
+def valid_enum_values(dtype: EnumMeta) -> list[int]:
+    """
+    Return the values of an SNMP enum, without the invalid fillers.
+
+    :param dtype: the attribute's enum class, from its MIB syntax
+
+    :return: the values that the object can take, in order
+    """
+    return [
+        member.value
+        for member in cast(type[Enum], dtype)
+        if not member.name.startswith(_SNMP_ENUM_INVALID_PREFIX)
+    ]
+
+
+def is_bit_enum(dtype: Any) -> bool:
+    """
+    Return whether the given attribute dtype is a BitEnum.
+
+    :param dtype: the attribute's dtype, which may not be a class at all
+
+    :return: whether dtype is a BitEnum subclass
+    """
+    return isinstance(dtype, EnumMeta) and issubclass(dtype, BitEnum)
+
+
 def _range_intersection(a: tuple[int, int], b: tuple[int, int]) -> tuple[int, int]:
     """
     Return the intersection of ranges a and b, defined as (start, end) tuples.
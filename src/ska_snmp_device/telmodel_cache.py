@@ -0,0 +1,221 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module implements a cache of device definitions fetched from telmodel."""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from ska_telmodel.data import TMData
+
+# Set to override where fetched definitions are cached
+TELMODEL_CACHE_ENV = "SKA_SNMP_DEVICE_TELMODEL_CACHE"
+# How long fetched data is used before checking for a newer version, in seconds
+TELMODEL_CACHE_TTL = 3600.0
+
+
+class TelmodelCache:
+    """
+    A cache of data fetched from telmodel repos, kept in memory and on disk.
+
+    Fetched data is stored as JSON, under the hash of its contents, and each
+    (repo, key) pair refers to the hash of the data last fetched for it.
+    Data younger than the TTL is returned without going to the repo at all.
+    Older data is fetched again, but if the repo can't be reached, the last
+    good copy is returned instead, however old it is.
+
+    Fetches are serialised, so many devices starting at once with the same
+    definition only fetch it once.
+    """
+
+    def __init__(self: TelmodelCache, cache_dir: Path | None = None) -> None:
+        """
+        Initialise the cache.
+
+        :param cache_dir: where to persist fetched data, if not the default
+            given by telmodel_cache_dir()
+        """
+        self._cache_dir = cache_dir or telmodel_cache_dir()
+        self._refs: dict[tuple[str, str], tuple[str, float]] = {}
+        self._objects: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def get(self: TelmodelCache, repo: str, key: str, ttl: float) -> Any:
+        """
+        Return the data at key in the given telmodel repo.
+
+        :param repo: the telmodel source URI, e.g. car:ska-telmodel-data?main
+        :param key: the path of the data within the repo
+        :param ttl: how long, in seconds, fetched data is used without
+            checking the repo for a newer version
+
+        :raises Exception: the data couldn't be fetched, and isn't cached
+        :return: the deserialised data
+        """
+        with self._lock:
+            ref = self._refs.get((repo, key)) or self._read_ref(repo, key)
+            if ref is not None and time.time() - ref[1] < ttl:
+                return json.loads(self._read_object(ref[0]))
+            try:
+                content = json.dumps(self._fetch(repo, key), sort_keys=True).encode()
+            # pylint: disable=broad-exception-caught
+            except Exception:
+                if ref is None:
+                    raise
+                logging.warning(
+                    f"Couldn't fetch {key} from {repo}, using the copy"
+                    f" cached at {time.ctime(ref[1])}",
+                    exc_info=True,
+                )
+                # Don't try the repo again in this process until the TTL
+                # expires, so devices sharing the definition don't all wait
+                self._refs[repo, key] = ref[0], time.time()
+                return json.loads(self._read_object(ref[0]))
+            digest = hashlib.sha256(content).hexdigest()
+            self._write_object(digest, content)
+            self._write_ref(repo, key, (digest, time.time()))
+            return json.loads(content)
+
+    def _fetch(self: TelmodelCache, repo: str, key: str) -> Any:
+        """
+        Fetch data from a telmodel repo.
+
+        :param repo: the telmodel source URI
+        :param key: the path of the data within the repo
+
+        :return: the deserialised data
+        """
+        logging.info(f"fetching {key} from telmodel repo {repo}")
+        return TMData([repo])[key].get_dict()
+
+    def _ref_path(self: TelmodelCache, repo: str, key: str) -> Path:
+        """
+        Return the path of the file holding the ref for a (repo, key) pair.
+
+        :param repo: the telmodel source URI
+        :param key: the path of the data within the repo
+
+        :return: the path of the ref file
+        """
+        name = hashlib.sha256(f"{repo}\0{key}".encode()).hexdigest()
+        return self._cache_dir / "refs" / f"{name}.json"
+
+    def _read_ref(self: TelmodelCache, repo: str, key: str) -> tuple[str, float] | None:
+        """
+        Read the ref for a (repo, key) pair from disk.
+
+        :param repo: the telmodel source URI
+        :param key: the path of the data within the repo
+
+        :return: the hash of the cached data and when it was fetched,
+            or None if nothing usable is cached
+        """
+        try:
+            with open(self._ref_path(repo, key), encoding="utf-8") as ref_file:
+                ref = json.load(ref_file)
+            digest, fetched_at = ref["sha256"], float(ref["fetched_at"])
+            self._read_object(digest)
+        except (OSError, ValueError, KeyError):
+            return None
+        self._refs[repo, key] = digest, fetched_at
+        return digest, fetched_at
+
+    def _write_ref(
+        self: TelmodelCache, repo: str, key: str, ref: tuple[str, float]
+    ) -> None:
+        """
+        Record the ref for a (repo, key) pair, in memory and on disk.
+
+        :param repo: the telmodel source URI
+        :param key: the path of the data within the repo
+        :param ref: the hash of the data and when it was fetched
+        """
+        self._refs[repo, key] = ref
+        content = {"repo": repo, "key": key, "sha256": ref[0], "fetched_at": ref[1]}
+        self._write_file(self._ref_path(repo, key), json.dumps(content).encode())
+
+    def _read_object(self: TelmodelCache, digest: str) -> bytes:
+        """
+        Return cached data by its hash.
+
+        :param digest: the SHA-256 of the data
+
+        :raises ValueError: the data on disk doesn't match its hash
+        :return: the serialised data
+        """
+        if digest not in self._objects:
+            content = (self._cache_dir / "objects" / digest).read_bytes()
+            if hashlib.sha256(content).hexdigest() != digest:
+                raise ValueError(f"Cached telmodel data {digest} is corrupt")
+            self._objects[digest] = content
+        return self._objects[digest]
+
+    def _write_object(self: TelmodelCache, digest: str, content: bytes) -> None:
+        """
+        Cache data under its hash, in memory and on disk.
+
+        :param digest: the SHA-256 of the data
+        :param content: the serialised data
+        """
+        self._objects[digest] = content
+        self._write_file(self._cache_dir / "objects" / digest, content)
+
+    def _write_file(self: TelmodelCache, path: Path, content: bytes) -> None:
+        """
+        Atomically write a file in the cache, if the cache is writable.
+
+        :param path: the path of the file
+        :param content: the contents of the file
+        """
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=path.parent, delete=False
+            ) as temp_file:
+                temp_file.write(content)
+            os.replace(temp_file.name, path)
+        except OSError:
+            logging.warning(f"Couldn't write {path}, caching in memory only")
+
+
+def telmodel_cache_dir() -> Path:
+    """
+    Return the directory in which fetched telmodel data is cached.
+
+    :return: $SKA_SNMP_DEVICE_TELMODEL_CACHE, or else a directory under the
+        user's cache directory
+    """
+    cache_dir = os.getenv(TELMODEL_CACHE_ENV, "").strip()
+    if cache_dir:
+        return Path(cache_dir)
+    user_cache = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(user_cache) / "ska-snmp-device" / "telmodel"
+
+
+_shared_cache: TelmodelCache | None = None
+_shared_cache_lock = threading.Lock()
+
+
+def shared_telmodel_cache() -> TelmodelCache:
+    """
+    Return the process-wide TelmodelCache, creating it if needed.
+
+    :return: the shared cache
+    """
+    global _shared_cache  # pylint: disable=global-statement
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = TelmodelCache()
+        return _shared_cache
@@ -0,0 +1,250 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module implements a receiver of SNMP notifications for SNMPDevices."""
+from __future__ import annotations
+
+import asyncio
+import socket
+import threading
+from typing import Any, Callable, Coroutine, Sequence, TypeVar
+
+from pysnmp.carrier.asyncio.dgram import udp
+from pysnmp.entity import config
+from pysnmp.entity.engine import SnmpEngine
+from pysnmp.entity.rfc3413 import ntfrcv
+from pysnmp.hlapi.auth import CommunityData, UsmUserData
+from pysnmp.proto.rfc1902 import OctetString
+
+T = TypeVar("T")
+
+# Called with the (numeric OID, value) pairs of each notification
+NotificationCallback = Callable[[Sequence[tuple[tuple[int, ...], Any]]], None]
+
+
+class TrapReceiver:
+    """
+    Receives SNMP traps and informs on a UDP port, for any number of devices.
+
+    SNMPv1 and v2c notifications are accepted from agents using the community
+    of a subscription, and SNMPv3 notifications from agents using its USM
+    user. Informs are acknowledged. Each notification is passed to the
+    callbacks subscribed for its sender's address and credentials.
+
+    The receiver has an SNMP engine and event loop thread of its own. Its
+    socket is opened by the first subscription, and closed again when the
+    last one is cancelled.
+    """
+
+    def __init__(self: TrapReceiver, port: int, host: str = "0.0.0.0") -> None:
+        """
+        Start the event loop thread, without opening the socket yet.
+
+        :param port: the UDP port to receive notifications on
+        :param host: the address to receive notifications on
+        """
+        self.address = (host, port)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=self.loop.run_forever, name=f"snmp-traps-{port}", daemon=True
+        ).start()
+        self._engine: SnmpEngine | None = None
+        self._configured: set[tuple[str, ...]] = set()
+        # sender's IP address -> security name -> callbacks
+        self._subscribers: dict[str, dict[str, list[NotificationCallback]]] = {}
+
+    def subscribe(
+        self: TrapReceiver,
+        agent_host: str,
+        access: CommunityData | UsmUserData,
+        callback: NotificationCallback,
+        engine_id: str = "",
+    ) -> None:
+        """
+        Pass an agent's notifications to a callback, opening the socket if needed.
+
+        The callback is called on the event loop thread, so it mustn't block.
+
+        :param agent_host: the IP address or DNS name of the agent
+        :param access: the community or USM user the agent sends with
+        :param callback: called with the varbinds of each notification
+        :param engine_id: the agent's SNMP engine ID, in hex, which SNMPv3
+            traps can't be authenticated without. SNMPv3 informs don't need it.
+        """
+        agent_ip = socket.gethostbyname(agent_host)
+
+        async def subscribe() -> None:
+            engine = await self._open()
+            self._configure(engine, access, engine_id)
+            by_name = self._subscribers.setdefault(agent_ip, {})
+            by_name.setdefault(access.securityName, []).append(callback)
+
+        self._run(subscribe())
+
+    def unsubscribe(
+        self: TrapReceiver,
+        agent_host: str,
+        access: CommunityData | UsmUserData,
+        callback: NotificationCallback,
+    ) -> None:
+        """
+        Cancel a subscription, closing the socket if it was the last one.
+
+        :param agent_host: the IP address or DNS name of the agent
+        :param access: the community or USM user the agent sends with
+        :param callback: the callback that was subscribed
+        """
+        agent_ip = socket.gethostbyname(agent_host)
+
+        async def unsubscribe() -> None:
+            by_name = self._subscribers.get(agent_ip, {})
+            callbacks = by_name.get(access.securityName, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                by_name.pop(access.securityName, None)
+            if not by_name:
+                self._subscribers.pop(agent_ip, None)
+            if not self._subscribers:
+                self._close()
+
+        self._run(unsubscribe())
+
+    def _run(self: TrapReceiver, coro: Coroutine[Any, Any, T]) -> T:
+        """
+        Run a coroutine on the event loop, and wait for its result.
+
+        :param coro: the coroutine to run
+
+        :return: the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _open(self: TrapReceiver) -> SnmpEngine:
+        """
+        Return the receiving SNMP engine, building it and binding its socket if needed.
+
+        :raises OSError: if the socket can't be bound
+        :return: the engine
+        """
+        if self._engine is None:
+            engine = SnmpEngine()
+            transport = udp.UdpTransport(loop=self.loop)
+            config.addTransport(
+                engine, udp.domainName, transport.openServerMode(self.address)
+            )
+            try:
+                # The socket is bound in the background; wait for any error
+                await transport._lport  # pylint: disable=protected-access
+            except OSError:
+                engine.transportDispatcher.closeDispatcher()
+                raise
+            ntfrcv.NotificationReceiver(engine, self._received)
+            self._engine = engine
+        return self._engine
+
+    def _close(self: TrapReceiver) -> None:
+        """Close the socket and discard the engine, with its configuration."""
+        engine, self._engine = self._engine, None
+        self._configured.clear()
+        if engine is not None:
+            engine.transportDispatcher.closeDispatcher()
+
+    def _configure(
+        self: TrapReceiver,
+        engine: SnmpEngine,
+        access: CommunityData | UsmUserData,
+        engine_id: str,
+    ) -> None:
+        """
+        Add a community or USM user to the engine, unless it's already there.
+
+        :param engine: the receiving engine
+        :param access: the community or USM user
+        :param engine_id: the agent's SNMP engine ID, in hex, if known
+        """
+        if isinstance(access, CommunityData):
+            key: tuple[str, ...] = ("community", access.communityIndex)
+            if key not in self._configured:
+                config.addV1System(
+                    engine,
+                    access.communityIndex,
+                    access.communityName,
+                    securityName=access.securityName,
+                )
+                self._configured.add(key)
+            return
+        # Informs are authenticated with our own engine ID, and traps with
+        # the agent's
+        for security_engine_id in ["", engine_id] if engine_id else [""]:
+            key = ("usm", access.userName, security_engine_id)
+            if key in self._configured:
+                continue
+            extra = (
+                {"securityEngineId": OctetString(hexValue=security_engine_id)}
+                if security_engine_id
+                else {}
+            )
+            config.addV3User(
+                engine,
+                access.userName,
+                access.authProtocol,
+                access.authKey,
+                access.privProtocol,
+                access.privKey,
+                **extra,
+            )
+            self._configured.add(key)
+
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    def _received(
+        self: TrapReceiver,
+        snmp_engine: SnmpEngine,
+        state_reference: Any,
+        context_engine_id: Any,
+        context_name: Any,
+        var_binds: Sequence[tuple[Any, Any]],
+        cb_ctx: Any,
+    ) -> None:
+        """
+        Pass a notification to the callbacks subscribed for its sender.
+
+        :param snmp_engine: the receiving engine
+        :param state_reference: pysnmp's reference to the notification
+        :param context_engine_id: the SNMP context engine ID
+        :param context_name: the SNMP context name
+        :param var_binds: the notification's varbinds
+        :param cb_ctx: unused
+        """
+        context = snmp_engine.observer.getExecutionContext(
+            "rfc3412.receiveMessage:request"
+        )
+        agent_ip = context["transportAddress"][0]
+        security_name = str(context["securityName"])
+        callbacks = self._subscribers.get(agent_ip, {}).get(security_name, [])
+        values = [(oid.asTuple(), value) for oid, value in var_binds]
+        for callback in list(callbacks):
+            callback(values)
+
+
+_receivers: dict[tuple[str, int], TrapReceiver] = {}
+_receivers_lock = threading.Lock()
+
+
+def trap_receiver(port: int, host: str = "0.0.0.0") -> TrapReceiver:
+    """
+    Return the process-wide TrapReceiver for an address, creating it if needed.
+
+    :param port: the UDP port to receive notifications on
+    :param host: the address to receive notifications on
+
+    :return: the receiver
+    """
+    with _receivers_lock:
+        if (host, port) not in _receivers:
+            _receivers[host, port] = TrapReceiver(port, host)
+        return _receivers[host, port]
@@ -0,0 +1,137 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""
+This module defines pytest fixtures shared by the benchmarks.
+
+The benchmarks take minutes, so they are skipped unless
+$SKA_SNMP_DEVICE_BENCHMARKS is set to 1, e.g. by `make python-benchmark`.
+"""
+
+import json
+import logging
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Any, Callable, Generator
+
+import pytest
+
+import ska_snmp_device
+from ska_snmp_device.snmp_component_manager import SNMPComponentManager
+from ska_snmp_device.snmp_device import SNMP_BACKENDS
+from ska_snmp_device.snmp_types import SNMPAttrInfo
+
+# Set to 1 to run the benchmarks
+BENCHMARKS_ENV = "SKA_SNMP_DEVICE_BENCHMARKS"
+
+# Set to override where benchmark results are written
+BENCHMARK_RESULTS_ENV = "SKA_SNMP_DEVICE_BENCHMARK_RESULTS"
+BENCHMARK_RESULTS_PATH = "build/reports/benchmarks.json"
+
+RecordBenchmark = Callable[..., None]
+ComponentManagerFactory = Callable[..., SNMPComponentManager]
+
+
+def pytest_collection_modifyitems(items: list[pytest.Item]) -> None:
+    """
+    Skip the benchmarks, unless they've been asked for.
+
+    They are skipped before any of their fixtures are set up, so that no
+    simulators are started for them.
+
+    :param items: every test collected
+    """
+    if int(os.getenv(BENCHMARKS_ENV, "0").strip() or "0"):
+        return
+    skip = pytest.mark.skip(reason=f"Benchmarks only run if {BENCHMARKS_ENV}=1")
+    benchmarks = Path(__file__).parent
+    for item in items:
+        if benchmarks in item.path.parents:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session", name="benchmark_results")
+def benchmark_results_fixture() -> Generator[list[dict[str, Any]], None, None]:
+    """
+    Collect benchmark results, and write them as JSON at the end of the session.
+
+    The results are written to $SKA_SNMP_DEVICE_BENCHMARK_RESULTS, or else
+    build/reports/benchmarks.json, along with the package version and
+    platform they were measured with, so that runs can be compared.
+
+    :yields: the list of results, one dict per measurement
+    """
+    results: list[dict[str, Any]] = []
+    yield results
+    if not results:
+        return
+    path = Path(os.getenv(BENCHMARK_RESULTS_ENV, "").strip() or BENCHMARK_RESULTS_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "version": ska_snmp_device.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+    path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+@pytest.fixture(name="record_benchmark")
+def record_benchmark_fixture(
+    benchmark_results: list[dict[str, Any]], request: pytest.FixtureRequest
+) -> RecordBenchmark:
+    """
+    Return a function that records the result of a benchmark.
+
+    :param benchmark_results: the results of the session
+    :param request: the pytest request of the benchmark
+    :return: a function taking the name of the measurement and its values,
+        as keyword arguments, e.g. seconds=0.1
+    """
+
+    def record(benchmark: str, **values: Any) -> None:
+        benchmark_results.append(
+            {"test": request.node.nodeid, "benchmark": benchmark, **values}
+        )
+
+    return record
+
+
+@pytest.fixture(name="component_manager_factory")
+def component_manager_factory_fixture() -> ComponentManagerFactory:
+    """
+    Return a function that creates component managers for benchmarking.
+
+    :return: a function taking the attributes to poll, the (host, port) of
+        the agent, the name of the SNMP backend, the component manager class
+        of each backend, and any other component manager arguments. Unless
+        overridden, the community is "private" and the callbacks do nothing.
+    """
+
+    def create(
+        attributes: list[SNMPAttrInfo],
+        endpoint: tuple[str, int],
+        backend: str = "asyncore",
+        backends: dict[str, type[SNMPComponentManager]] = SNMP_BACKENDS,
+        **kwargs: Any,
+    ) -> SNMPComponentManager:
+        host, port = endpoint
+        kwargs = {
+            "authority": "private",
+            "max_objects_per_pdu": 24,
+            "logger": logging.getLogger(),
+            "communication_state_callback": lambda *args: None,
+            "component_state_callback": lambda **kwargs: None,
+            "poll_rate": 2.0,
+            **kwargs,
+        }
+        return backends[backend](host=host, port=port, attributes=attributes, **kwargs)
+
+    return create
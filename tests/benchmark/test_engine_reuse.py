@@ -0,0 +1,106 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module benchmarks reuse of the SNMP engine between polls."""
+
+import logging
+import time
+from pathlib import Path
+
+import pytest
+
+from ska_attribute_polling.attribute_polling_component_manager import AttrPollRequest
+from ska_snmp_device.definitions import load_device_definition, parse_device_definition
+from ska_snmp_device.snmp_component_manager import SNMPComponentManager
+
+from .conftest import ComponentManagerFactory, RecordBenchmark
+
+EN6808_DEFINITION = (
+    Path(__file__).parents[2] / "docs" / "src" / "examples" / "EN6808.yaml"
+)
+
+POLLS = 20
+
+
+@pytest.fixture(name="component_manager")
+def component_manager_fixture(
+    simulator: tuple[str, int] | None,
+    component_manager_factory: ComponentManagerFactory,
+) -> SNMPComponentManager:
+    """
+    Create an SNMP component manager for an EN6808 PDU on the simulator.
+
+    :param simulator: the simulator endpoint
+    :param component_manager_factory: the function creating component managers
+    :return: snmp component manager
+    """
+    if not simulator:
+        pytest.skip("Benchmarks only run against the simulator")
+    definition = load_device_definition(str(EN6808_DEFINITION), None)
+    return component_manager_factory(parse_device_definition(definition), simulator)
+
+
+def _time_polls(mgr: SNMPComponentManager, reuse_engine: bool) -> tuple[float, float]:
+    """
+    Poll every attribute repeatedly, and time it.
+
+    :param mgr: the component manager under test
+    :param reuse_engine: whether to keep the engine between polls. If not,
+        a new engine is built for every poll, as we used to do.
+
+    :return: mean wall-clock and CPU time per poll, in seconds
+    """
+    request = AttrPollRequest(writes={}, reads=list(mgr._attributes))
+    wall_time = cpu_time = 0.0
+    for _ in range(POLLS):
+        if not reuse_engine:
+            mgr._close_engine()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        response = mgr.poll(request)
+        wall_time += time.perf_counter() - wall_start
+        cpu_time += time.process_time() - cpu_start
+        assert response
+    return wall_time / POLLS, cpu_time / POLLS
+
+
+def test_engine_reuse(
+    component_manager: SNMPComponentManager, record_benchmark: RecordBenchmark
+) -> None:
+    """
+    Compare per-poll latency and CPU with and without engine reuse.
+
+    The times are only reported: they're too noisy on shared CI runners to
+    compare in an assertion.
+
+    :param component_manager: the component manager under test
+    :param record_benchmark: the function recording results
+    """
+    # The first poll compiles and loads MIBs, which we don't want to count
+    _time_polls(component_manager, reuse_engine=True)
+
+    fresh_wall, fresh_cpu = _time_polls(component_manager, reuse_engine=False)
+    reused_wall, reused_cpu = _time_polls(component_manager, reuse_engine=True)
+    component_manager._close_engine()
+
+    logging.info(
+        f"{len(component_manager._attributes)} attributes,"
+        f" fresh engine: {fresh_wall * 1000:.1f} ms/poll"
+        f" ({fresh_cpu * 1000:.1f} ms CPU),"
+        f" reused engine: {reused_wall * 1000:.1f} ms/poll"
+        f" ({reused_cpu * 1000:.1f} ms CPU)"
+    )
+    for engine, wall_time, cpu_time in [
+        ("fresh", fresh_wall, fresh_cpu),
+        ("reused", reused_wall, reused_cpu),
+    ]:
+        record_benchmark(
+            "engine_reuse",
+            engine=engine,
+            attributes=len(component_manager._attributes),
+            seconds=wall_time,
+            cpu_seconds=cpu_time,
+        )
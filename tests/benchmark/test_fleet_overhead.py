@@ -0,0 +1,165 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module benchmarks the per-device overhead of each SNMP backend."""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+from typing import Any, Generator
+
+import pytest
+from ska_control_model import PowerState
+
+from ska_attribute_polling.shared_poller import shared_poller
+from ska_snmp_device.asyncio_component_manager import shared_snmp_engine
+from ska_snmp_device.definitions import load_device_definition, parse_device_definition
+from ska_snmp_device.load_test import snmprec_records
+from ska_snmp_device.simulator import run_simulator
+from ska_snmp_device.snmp_device import SNMP_BACKENDS
+
+from .conftest import ComponentManagerFactory, RecordBenchmark
+
+DEFINITION = Path(__file__).parents[1] / "unit" / "snmp" / "SKA-7357.yaml"
+
+# The devices are spread over this many simulators, listening on
+# consecutive ports from FLEET_SIMULATOR_PORT
+FLEET_SIMULATORS = 4
+FLEET_SIMULATOR_PORT = 5170
+
+# Only the first poll is measured, and devices poll no more often than this
+DEADLINE = 30.0
+
+# Devices share the poller's workers and the asyncio event loop, so running
+# more of them mustn't start any more threads than a few transient ones
+MAX_EXTRA_THREADS = 2
+
+
+def _rss_bytes() -> int:
+    """
+    Return the current resident set size of this process.
+
+    :return: RSS in bytes
+    """
+    with open("/proc/self/statm", encoding="utf-8") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@pytest.fixture(scope="module", name="fleet_simulators")
+def fleet_simulators_fixture(
+    simulator: tuple[str, int] | None,
+) -> Generator[list[tuple[str, int]], None, None]:
+    """
+    Run several simulators, each with a value for every attribute of the devices.
+
+    :param simulator: the endpoint of the usual simulator, if we run it
+    :yields: the host & port of each simulator
+    """
+    if not simulator:
+        pytest.skip("Benchmarks only run against the simulator")
+    attributes = parse_device_definition(load_device_definition(str(DEFINITION), None))
+    with tempfile.TemporaryDirectory() as data_dir, ExitStack() as stack:
+        # The simulators may run as another user, who needs to read the data
+        os.chmod(data_dir, 0o755)
+        with open(Path(data_dir) / "private.snmprec", "w", encoding="utf-8") as rec:
+            for oid, tag, value in snmprec_records(attributes):
+                rec.write(f"{oid}|{tag}|{value}\n")
+        os.chmod(Path(data_dir) / "private.snmprec", 0o644)
+        yield [
+            stack.enter_context(run_simulator(data_dir, FLEET_SIMULATOR_PORT + number))
+            for number in range(FLEET_SIMULATORS)
+        ]
+
+
+@pytest.mark.parametrize("backend", list(SNMP_BACKENDS))
+@pytest.mark.parametrize("device_count", [10, 50, 200])
+def test_fleet_overhead(
+    fleet_simulators: list[tuple[str, int]],
+    component_manager_factory: ComponentManagerFactory,
+    record_benchmark: RecordBenchmark,
+    backend: str,
+    device_count: int,
+) -> None:
+    """
+    Measure threads and memory used per device, once every device has polled.
+
+    The devices are spread evenly over the simulators. Whatever their number,
+    they must be polled without starting threads of their own.
+
+    Devices that haven't managed a successful poll within the deadline are
+    recorded rather than failing the test: with an SNMP engine per device,
+    large fleets can spend longer than that building engines.
+
+    :param fleet_simulators: the simulator endpoints
+    :param component_manager_factory: the function creating component managers
+    :param record_benchmark: the function recording results
+    :param backend: the name of the SNMP backend under test
+    :param device_count: how many devices to run at once
+    """
+    attributes = parse_device_definition(load_device_definition(str(DEFINITION), None))
+
+    polled: set[int] = set()
+    all_polled = threading.Condition()
+
+    def component_state_changed(device: int, **state_updates: Any) -> None:
+        if state_updates.get("power") == PowerState.ON:
+            with all_polled:
+                polled.add(device)
+                all_polled.notify()
+
+    # The threads shared by every device are started by the first of them,
+    # however many there are, so they are started before counting
+    shared_poller()
+    shared_snmp_engine()
+    threads_before, rss_before = threading.active_count(), _rss_bytes()
+    start = time.perf_counter()
+    managers = [
+        component_manager_factory(
+            attributes,
+            fleet_simulators[device % len(fleet_simulators)],
+            backend,
+            component_state_callback=partial(component_state_changed, device),
+            poll_rate=DEADLINE,
+        )
+        for device in range(device_count)
+    ]
+    for manager in managers:
+        manager.start_communicating()
+    try:
+        with all_polled:
+            all_polled.wait_for(lambda: len(polled) == device_count, DEADLINE)
+        elapsed = time.perf_counter() - start
+        extra_threads = threading.active_count() - threads_before
+        extra_rss = _rss_bytes() - rss_before
+    finally:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for manager in managers:
+                executor.submit(manager.stop_communicating)
+
+    record_benchmark(
+        "fleet_overhead",
+        backend=backend,
+        devices=device_count,
+        simulators=len(fleet_simulators),
+        seconds=elapsed,
+        polled=len(polled),
+        threads_per_device=extra_threads / device_count,
+        rss_bytes_per_device=extra_rss / device_count,
+    )
+    logging.info(
+        f"{backend} backend, {device_count} devices:"
+        f" {extra_threads / device_count:.2f} threads/device,"
+        f" {extra_rss / device_count / 1024:.0f} KiB/device,"
+        f" {len(polled)} devices polled successfully in {elapsed:.2f} s"
+    )
+    assert extra_threads <= MAX_EXTRA_THREADS
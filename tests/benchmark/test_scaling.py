@@ -0,0 +1,403 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""
+This module benchmarks the polling hot paths, at increasing numbers of attributes.
+
+Each stage of a poll is measured separately: parsing the definition,
+assembling the request, the SNMP round trips, converting the values and
+pushing their events. The component manager's whole poll cycle is measured
+too. Results are recorded as JSON; see conftest.py.
+"""
+
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Generator
+
+import pytest
+import yaml
+from pysnmp.proto.rfc1902 import Integer32, OctetString
+from tango import Util
+from tango.test_context import DeviceTestContext
+
+from ska_attribute_polling.attribute_polling_component_manager import AttrPollRequest
+from ska_snmp_device import definitions
+from ska_snmp_device.definitions import parse_device_definition
+from ska_snmp_device.fake_agent import FAKE_AGENTS, FAKE_BACKENDS, FakeAgent
+from ska_snmp_device.simulator import run_simulator
+from ska_snmp_device.snmp_device import SNMP_BACKENDS, SNMPDevice
+from ska_snmp_device.snmp_types import SNMPAttrInfo, snmp_to_python
+
+from .conftest import ComponentManagerFactory, RecordBenchmark
+
+ATTRIBUTE_COUNTS = [10, 100, 1000, 10000]
+
+# The table columns the attributes are instances of, with the snmprec tag
+# and value of each instance. Values are formatted with the instance number.
+COLUMNS = [
+    ("pduOutletSwitchedSTATUSName", "Name", "4", "Outlet {}"),
+    ("pduOutletSwitchedSTATUSState", "State", "2", "1"),
+    ("pduOutletMeteredSTATUSLoadState", "LoadState", "2", "5"),
+    ("pduOutletMeteredSTATUSCurrent", "Current", "2", "{}"),
+    ("pduOutletMeteredSTATUSActivePower", "ActivePower", "2", "{}"),
+]
+
+# Instances of each column are spread over PDUs of up to this many outlets
+OUTLETS_PER_PDU = 250
+
+# Port of the simulator serving every attribute of the largest definition
+SCALE_SIMULATOR_PORT = 5162
+
+# Address of the in-process agent, which needs no socket of its own
+FAKE_AGENT_ADDRESS = ("10.0.0.1", 161)
+
+SNMPREC_TYPES = {"2": Integer32, "4": OctetString}
+
+
+def _definition(count: int) -> dict[str, Any]:
+    """
+    Return a device definition with the given number of attributes.
+
+    :param count: the number of attributes, a multiple of the number of columns
+    :return: the device definition
+    """
+    outlets = count // len(COLUMNS)
+    pdus = max(1, outlets // OUTLETS_PER_PDU)
+    return {
+        "attributes": [
+            {
+                "name": f"pdu{{}}Outlet{{}}{suffix}",
+                "oid": ["ENLOGIC-PDU-MIB", symbol],
+                "indexes": [[1, pdus], [1, outlets // pdus]],
+            }
+            for symbol, suffix, _, _ in COLUMNS
+        ]
+    }
+
+
+def _snmprec(attributes: list[SNMPAttrInfo]) -> list[tuple[Any, ...]]:
+    """
+    Return the simulated value of each attribute.
+
+    :param attributes: attributes parsed from _definition()
+    :return: (numeric OID, snmprec tag, value) of each attribute, in OID order
+    """
+    columns = {symbol: (tag, value) for symbol, _, tag, value in COLUMNS}
+    records = []
+    for instance, attr in enumerate(attributes):
+        tag, value = columns[str(attr.identity[1])]
+        assert attr.oid is not None
+        records.append((attr.oid, tag, value.format(instance)))
+    return sorted(records)
+
+
+def _snmp_values(attributes: list[SNMPAttrInfo]) -> list[tuple[SNMPAttrInfo, Any]]:
+    """
+    Return the PySNMP value of each attribute, as the simulator returns it.
+
+    :param attributes: attributes parsed from _definition()
+    :return: (attribute, value) pairs
+    """
+    by_oid = {attr.oid: attr for attr in attributes}
+    return [
+        (by_oid[oid], SNMPREC_TYPES[tag](value))
+        for oid, tag, value in _snmprec(attributes)
+    ]
+
+
+def _measure(
+    run: Callable[[], Any], repeats: int, between: Callable[[], Any] | None = None
+) -> tuple[float, float]:
+    """
+    Run a function repeatedly, and time it.
+
+    :param run: the function to time
+    :param repeats: how many times to run it
+    :param between: a function to run, untimed, after each run
+
+    :return: mean wall-clock and CPU time per run, in seconds
+    """
+    wall_time = cpu_time = 0.0
+    for _ in range(repeats):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        run()
+        wall_time += time.perf_counter() - wall_start
+        cpu_time += time.process_time() - cpu_start
+        if between is not None:
+            between()
+    return wall_time / repeats, cpu_time / repeats
+
+
+def _repeats(count: int) -> int:
+    """
+    Return how many times to repeat a measurement at a number of attributes.
+
+    :param count: the number of attributes
+    :return: enough repeats for a stable mean, without taking all day
+    """
+    return max(3, 1000 // count)
+
+
+def _record(
+    record_benchmark: RecordBenchmark,
+    benchmark: str,
+    count: int,
+    times: tuple[float, float],
+    **extra: Any,
+) -> None:
+    """
+    Record and log the result of a benchmark.
+
+    :param record_benchmark: the function recording results
+    :param benchmark: the name of the benchmark
+    :param count: the number of attributes
+    :param times: the mean wall-clock and CPU time per run, in seconds
+    :param extra: any other values to record
+    """
+    wall_time, cpu_time = times
+    record_benchmark(
+        benchmark,
+        attributes=count,
+        seconds=wall_time,
+        cpu_seconds=cpu_time,
+        **extra,
+    )
+    details = "".join(f", {key}={value}" for key, value in extra.items())
+    logging.info(
+        f"{benchmark}, {count} attributes{details}:"
+        f" {wall_time * 1000:.2f} ms ({cpu_time * 1000:.2f} ms CPU),"
+        f" {wall_time / count * 1e6:.1f} us/attribute"
+    )
+
+
+@pytest.fixture(scope="module", name="scale_simulator")
+def scale_simulator_fixture(
+    simulator: tuple[str, int] | None,
+) -> Generator[tuple[str, int], None, None]:
+    """
+    Run a simulator with a value for every attribute of the largest definition.
+
+    :param simulator: the endpoint of the usual simulator, if we run it
+    :yields: host & port
+    """
+    if not simulator:
+        pytest.skip("Benchmarks only run against the simulator")
+    attributes = parse_device_definition(_definition(max(ATTRIBUTE_COUNTS)))
+    with tempfile.TemporaryDirectory() as data_dir:
+        # The simulator may run as another user, who needs to read the data
+        os.chmod(data_dir, 0o755)
+        with open(Path(data_dir) / "private.snmprec", "w", encoding="utf-8") as rec:
+            for oid, tag, value in _snmprec(attributes):
+                rec.write(f"{'.'.join(map(str, oid))}|{tag}|{value}\n")
+        os.chmod(Path(data_dir) / "private.snmprec", 0o644)
+        with run_simulator(data_dir, SCALE_SIMULATOR_PORT) as endpoint:
+            yield endpoint
+
+
+@pytest.mark.parametrize("count", ATTRIBUTE_COUNTS)
+def test_parse_definition(record_benchmark: RecordBenchmark, count: int) -> None:
+    """
+    Measure parsing a definition with MIBs, without the parsed definition cache.
+
+    :param record_benchmark: the function recording results
+    :param count: the number of attributes
+    """
+    # The first parse builds the MIB view, which we don't want to count
+    parse_device_definition(_definition(len(COLUMNS)))
+    definition = _definition(count)
+
+    def parse() -> None:
+        assert len(parse_device_definition(definition)) == count
+
+    times = _measure(parse, _repeats(count), definitions._parsed_definitions.clear)
+    _record(record_benchmark, "parse_device_definition", count, times)
+
+
+@pytest.mark.parametrize("count", ATTRIBUTE_COUNTS)
+def test_get_request(
+    component_manager_factory: ComponentManagerFactory,
+    record_benchmark: RecordBenchmark,
+    count: int,
+) -> None:
+    """
+    Measure assembling the request of a poll in which every attribute is due.
+
+    :param component_manager_factory: the function creating component managers
+    :param record_benchmark: the function recording results
+    :param count: the number of attributes
+    """
+    attributes = parse_device_definition(_definition(count))
+    mgr = component_manager_factory(attributes, ("127.0.0.1", SCALE_SIMULATOR_PORT))
+    response = {
+        attr.name: snmp_to_python(attr, val) for attr, val in _snmp_values(attributes)
+    }
+
+    def get_request() -> None:
+        assert len(mgr.get_request().reads) == count
+
+    # With a polling period of 0, every attribute is due again straight away
+    times = _measure(get_request, _repeats(count), lambda: mgr.poll_succeeded(response))
+    _record(record_benchmark, "get_request", count, times)
+
+
+@pytest.mark.parametrize("backend", list(SNMP_BACKENDS))
+@pytest.mark.parametrize("count", ATTRIBUTE_COUNTS)
+def test_poll(
+    scale_simulator: tuple[str, int],
+    component_manager_factory: ComponentManagerFactory,
+    record_benchmark: RecordBenchmark,
+    count: int,
+    backend: str,
+) -> None:
+    """
+    Measure the SNMP round trips of polling every attribute.
+
+    :param scale_simulator: the endpoint of the simulator
+    :param component_manager_factory: the function creating component managers
+    :param record_benchmark: the function recording results
+    :param count: the number of attributes
+    :param backend: the name of the SNMP backend under test
+    """
+    attributes = parse_device_definition(_definition(count))
+    mgr = component_manager_factory(attributes, scale_simulator, backend)
+    request = AttrPollRequest(writes={}, reads=[attr.name for attr in attributes])
+    try:
+        # The first poll resolves OIDs and builds the engine, which we don't
+        # want to count, and checks the simulator has every value
+        response = mgr.poll(request)
+        assert len(response) == count and None not in response.values()
+        mgr.stats.end_cycle(0)
+        times = _measure(lambda: mgr.poll(request), _repeats(count))
+    finally:
+        mgr._close_engine()
+    # Nothing ends the cycle, so the counts are of every timed poll
+    pdus = mgr.stats.cycle["pdus"] / _repeats(count)
+    _record(record_benchmark, "poll", count, times, backend=backend, pdus=pdus)
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+@pytest.mark.parametrize("count", ATTRIBUTE_COUNTS)
+def test_poll_fake_agent(
+    component_manager_factory: ComponentManagerFactory,
+    record_benchmark: RecordBenchmark,
+    count: int,
+    backend: str,
+) -> None:
+    """
+    Measure polling every attribute from an in-process agent, without UDP.
+
+    This is the component manager's and PySNMP's own cost of a poll, as
+    the agent answers each request with little more than a dict lookup.
+
+    :param component_manager_factory: the function creating component managers
+    :param record_benchmark: the function recording results
+    :param count: the number of attributes
+    :param backend: the name of the SNMP backend under test
+    """
+    attributes = parse_device_definition(_definition(count))
+    FAKE_AGENTS[FAKE_AGENT_ADDRESS] = FakeAgent(
+        (".".join(map(str, oid)), tag, value)
+        for oid, tag, value in _snmprec(attributes)
+    )
+    mgr = component_manager_factory(
+        attributes, FAKE_AGENT_ADDRESS, backend, FAKE_BACKENDS
+    )
+    request = AttrPollRequest(writes={}, reads=[attr.name for attr in attributes])
+    try:
+        response = mgr.poll(request)
+        assert len(response) == count and None not in response.values()
+        times = _measure(lambda: mgr.poll(request), _repeats(count))
+    finally:
+        mgr._close_engine()
+        del FAKE_AGENTS[FAKE_AGENT_ADDRESS]
+    _record(record_benchmark, "poll_fake_agent", count, times, backend=backend)
+
+
+@pytest.mark.parametrize("count", ATTRIBUTE_COUNTS)
+def test_snmp_to_python(record_benchmark: RecordBenchmark, count: int) -> None:
+    """
+    Measure converting the polled value of every attribute to Python.
+
+    :param record_benchmark: the function recording results
+    :param count: the number of attributes
+    """
+    values = _snmp_values(parse_device_definition(_definition(count)))
+
+    def convert() -> None:
+        for attr, value in values:
+            snmp_to_python(attr, value)
+
+    times = _measure(convert, _repeats(count) * 10)
+    _record(record_benchmark, "snmp_to_python", count, times)
+
+
+@pytest.mark.parametrize("count", ATTRIBUTE_COUNTS)
+def test_event_push(
+    tmp_path: Path, record_benchmark: RecordBenchmark, count: int
+) -> None:
+    """
+    Measure the device pushing change and archive events for every attribute.
+
+    The device stays offline, so the only events are the ones pushed here,
+    and no clients subscribe to them: this is the cost to the poller thread.
+
+    :param tmp_path: a directory to write the definition to
+    :param record_benchmark: the function recording results
+    :param count: the number of attributes
+    """
+    definition_path = tmp_path / "definition.yaml"
+    definition_path.write_text(yaml.safe_dump(_definition(count)), encoding="utf-8")
+    snmp_values = _snmp_values(parse_device_definition(_definition(count)))
+    values = {attr.name: snmp_to_python(attr, value) for attr, value in snmp_values}
+    context = DeviceTestContext(
+        SNMPDevice,
+        properties={
+            "DeviceDefinition": str(definition_path),
+            "Host": "127.0.0.1",
+            "Port": SCALE_SIMULATOR_PORT,
+            "V2Community": "private",
+        },
+    )
+    with context as proxy:
+        device = Util.instance().get_device_by_name(proxy.dev_name())
+        times = _measure(
+            lambda: device._component_state_changed(**values), _repeats(count)
+        )
+    _record(record_benchmark, "event_push", count, times)
+
+
+@pytest.mark.parametrize("count", ATTRIBUTE_COUNTS)
+def test_poll_cycle(
+    scale_simulator: tuple[str, int],
+    component_manager_factory: ComponentManagerFactory,
+    record_benchmark: RecordBenchmark,
+    count: int,
+) -> None:
+    """
+    Measure the component manager's whole poll cycle, with every attribute due.
+
+    :param scale_simulator: the endpoint of the simulator
+    :param component_manager_factory: the function creating component managers
+    :param record_benchmark: the function recording results
+    :param count: the number of attributes
+    """
+    mgr = component_manager_factory(
+        parse_device_definition(_definition(count)), scale_simulator
+    )
+
+    def poll_cycle() -> None:
+        mgr.poll_succeeded(mgr.poll(mgr.get_request()))
+
+    try:
+        poll_cycle()
+        times = _measure(poll_cycle, _repeats(count))
+    finally:
+        mgr._close_engine()
+    _record(record_benchmark, "poll_cycle", count, times)
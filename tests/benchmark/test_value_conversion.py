@@ -0,0 +1,119 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module benchmarks the conversion of polled values to Python."""
+
+import logging
+import time
+from math import ceil
+from pathlib import Path
+from typing import Any
+
+from pyasn1.type.univ import Integer
+from pysnmp.proto.rfc1902 import Bits, Counter64, Gauge32, Integer32, OctetString
+from tango import DevEnum, DevULong64
+
+from ska_snmp_device.definitions import load_device_definition, parse_device_definition
+from ska_snmp_device.snmp_types import SNMPAttrInfo, is_bit_enum, strbool
+
+DEFINITIONS = [
+    Path(__file__).parents[2] / "docs" / "src" / "examples" / "UPS.yaml",
+    Path(__file__).parents[2] / "docs" / "src" / "examples" / "EN6808.yaml",
+    Path(__file__).parents[1] / "unit" / "snmp" / "SKA-7357.yaml",
+]
+
+POLLS = 200
+
+
+def _if_chain_snmp_to_python(attr: SNMPAttrInfo, value: Any) -> Any:
+    """
+    Convert a value the way snmp_to_python() used to, for comparison.
+
+    :param attr: attribute information
+    :param value: the PySNMP value
+
+    :raises ValueError: unsupported type
+    :return: the python value
+    """
+    if isinstance(value, Integer) or attr.dtype == int:
+        return int(value)
+    if isinstance(value, Bits) or is_bit_enum(attr.dtype):
+        return [
+            attr.dtype((byte * 8) + bit)
+            for byte, int_val in enumerate(bytes(value))
+            for bit in range(8)
+            if int_val & (0b10000000 >> bit)
+        ]
+    if attr.dtype == bool:
+        return strbool(value)
+    if attr.dtype == float:
+        return float(value)
+    if attr.dtype == DevEnum and attr.attr_args.get("enum_labels"):
+        return int(value)
+    if isinstance(value, OctetString):
+        return str(value)
+    raise ValueError(f"Cannot convert unsupported type {type(value)}")
+
+
+def _payload(attr: SNMPAttrInfo) -> Any:
+    """
+    Return a representative polled value for an attribute.
+
+    :param attr: attribute information
+
+    :return: a PySNMP value, as it arrives without a MIB lookup
+    """
+    if is_bit_enum(attr.dtype):
+        # Every other bit set
+        octets = [0] * ceil(len(attr.dtype) / 8)
+        for bit in range(0, len(attr.dtype), 2):
+            octets[bit // 8] |= 0b10000000 >> (bit % 8)
+        return OctetString(bytes(octets))
+    if attr.dtype == DevULong64:
+        return Counter64(2**40 + 17)
+    if attr.dtype == int:
+        return Gauge32(2305)
+    if attr.dtype == str:
+        return OctetString("Outlet 17 - rack 3 ToR switch")
+    return Integer32(1)
+
+
+def _time_conversions(
+    payloads: list[tuple[SNMPAttrInfo, Any]], convert: Any
+) -> tuple[float, list[Any]]:
+    """
+    Convert every payload POLLS times, and time it.
+
+    :param payloads: (attribute, value) pairs
+    :param convert: function converting (attribute, value) to Python
+
+    :return: mean time per poll in seconds, and the converted values
+    """
+    start = time.perf_counter()
+    for _ in range(POLLS):
+        converted = [convert(attr, value) for attr, value in payloads]
+    return (time.perf_counter() - start) / POLLS, converted
+
+
+def test_value_conversion() -> None:
+    """Compare per-poll conversion time of the if-chain and compiled converters."""
+    for path in DEFINITIONS:
+        attributes = parse_device_definition(load_device_definition(str(path), None))
+        payloads = [(attr, _payload(attr)) for attr in attributes]
+
+        if_chain, expected = _time_conversions(payloads, _if_chain_snmp_to_python)
+        compiled, converted = _time_conversions(
+            payloads, lambda attr, value: attr.from_snmp(value)
+        )
+        assert converted == expected
+
+        logging.info(
+            f"{path.name}: {len(payloads)} values,"
+            f" if-chain: {if_chain * 1e6:.0f} us/poll,"
+            f" compiled: {compiled * 1e6:.0f} us/poll,"
+            f" {if_chain / compiled:.1f}x faster"
+        )
@@ -0,0 +1,50 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module defines pytest fixtures shared by all ska-ser-snmp tests."""
+
+import os
+from typing import Any, Generator
+
+import pytest
+
+from ska_snmp_device.simulator import run_simulator
+
+
+@pytest.fixture(scope="session", name="simulator")
+def simulator_fixture() -> Generator[Any, None, None]:
+    """
+    Create a simulator for snmp unit testing.
+
+    :yields: host & port else None
+    """
+    if int(os.getenv("SKA_SNMP_DEVICE_SIMULATOR", "1").strip()):
+        with run_simulator(
+            "tests/snmpsim_data",
+            5161,
+            (
+                "--variation-module-options=sql:dbtype:sqlite3,"
+                "database:tests/snmpsim_data/snmpsim.db,dbtable:snmprec"
+            ),
+        ) as endpoint:
+            yield endpoint
+    else:
+        yield None
+
+
+@pytest.fixture(name="endpoint")
+def endpoint_fixture(simulator: tuple[str, int]) -> tuple[str, int]:
+    """
+    Define an endpoint.
+
+    :param simulator: the simulator endpoint
+    :return: the host & port
+    """
+    if simulator:
+        return simulator
+    host, port = os.getenv("SKA_SNMP_DEVICE_TEST_ENDPOINT").strip().split(":")
+    return host, int(port)
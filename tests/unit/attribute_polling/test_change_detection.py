@@ -0,0 +1,81 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests detecting changes in polled values."""
+
+from enum import IntEnum
+from typing import Any
+
+import numpy as np
+import pytest
+
+from ska_attribute_polling.attribute_polling_component_manager import (
+    AttrInfo,
+    SpectrumValue,
+)
+
+
+def _attr(**attr_args: Any) -> AttrInfo:
+    return AttrInfo(attr_args={"name": "attr", **attr_args}, polling_period=0)
+
+
+class Colour(IntEnum):
+    """An enumerated attribute type."""
+
+    RED = 0
+    GREEN = 1
+
+
+@pytest.mark.parametrize(
+    ("attr_args", "old", "new", "changed"),
+    [
+        ({}, None, 0, True),
+        ({}, 1, 1, False),
+        ({}, 1.0, 1.5, True),
+        ({"abs_change": 1}, 10, 10, False),
+        ({"abs_change": 1}, 10, 11, True),
+        ({"abs_change": 0.5}, 10.0, 10.4, False),
+        ({"abs_change": 0.5}, 10.0, 9.5, True),
+        ({"abs_change": "-0.5,2"}, 10.0, 10.4, False),
+        ({"abs_change": "-0.5,2"}, 10.0, 10.5, True),
+        ({"rel_change": 10}, 100.0, 109.0, False),
+        ({"rel_change": 10}, 100.0, 90.0, True),
+        ({"rel_change": 10}, 0.0, 0.0, False),
+        ({"rel_change": 10}, 0.0, 0.1, True),
+        ({"abs_change": 5, "rel_change": 10}, 10.0, 12.0, True),
+        ({"abs_change": 0.5}, float("nan"), 1.0, True),
+        ({"abs_change": 0.5}, None, 1.0, True),
+        ({"abs_change": 1}, "up", "up", False),
+        ({"abs_change": 1}, "up", "down", True),
+        ({"abs_change": 1}, True, False, True),
+        ({"abs_change": 1}, Colour.RED, Colour.GREEN, True),
+    ],
+)
+def test_is_change(
+    attr_args: dict[str, Any], old: Any, new: Any, changed: bool
+) -> None:
+    """
+    Test deadbands on scalar values.
+
+    :param attr_args: the attribute's Tango attribute args
+    :param old: the last reported value
+    :param new: the newly polled value
+    :param changed: whether the new value should be reported
+    """
+    assert _attr(**attr_args).is_change(old, new) is changed
+
+
+def test_is_change_spectrum() -> None:
+    """Test deadbands on spectrum values, where any element may change."""
+    attr = _attr(abs_change=1.0)
+    old = np.array([1.0, 2.0, 3.0]).view(SpectrumValue)
+    assert not attr.is_change(old, old + 0.5)
+    assert attr.is_change(old, old + [0, 0, 1])
+    assert attr.is_change(old, np.array([1.0, 2.0]))
+    assert attr.is_change(None, old)
+    assert not _attr().is_change(old, old.copy())
+    assert _attr().is_change(old, old + [0, 0, 1])
@@ -0,0 +1,54 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests the poll scheduler."""
+
+from ska_attribute_polling.poll_scheduler import PollScheduler
+
+
+def test_pop_due() -> None:
+    """Test that only due keys are taken, most overdue first."""
+    scheduler: PollScheduler[str] = PollScheduler()
+    scheduler.schedule("c", 3.0)
+    scheduler.schedule("a", 1.0)
+    scheduler.schedule("b", 2.0)
+    scheduler.schedule("never", float("inf"))
+    assert len(scheduler) == 3
+    assert "never" not in scheduler
+    assert scheduler.next_deadline() == 1.0
+
+    assert not scheduler.pop_due(0.5)
+    assert scheduler.pop_due(2.0) == ["a", "b"]
+    assert scheduler.pop_due(2.0) == []
+    assert "a" not in scheduler
+    assert scheduler.deadline("c") == 3.0
+    assert scheduler.deadline("a") == float("inf")
+    assert scheduler.pop_due(float("inf")) == ["c"]
+    assert scheduler.next_deadline() == float("inf")
+
+
+def test_reschedule() -> None:
+    """Test that rescheduling a key replaces its deadline."""
+    scheduler: PollScheduler[str] = PollScheduler()
+    scheduler.schedule("a", 1.0)
+    scheduler.schedule("b", 2.0)
+    scheduler.schedule("a", 5.0)
+    assert scheduler.next_deadline() == 2.0
+    assert scheduler.pop_due(4.0) == ["b"]
+    scheduler.schedule("a", float("inf"))
+    assert not scheduler.pop_due(10.0)
+    assert len(scheduler) == 0
+
+
+def test_stale_entries_are_compacted() -> None:
+    """Test that repeatedly rescheduling keys doesn't grow the heap unbounded."""
+    scheduler: PollScheduler[int] = PollScheduler()
+    for deadline in range(1000):
+        for key in range(10):
+            scheduler.schedule(key, float(deadline))
+    assert len(scheduler._heap) <= 2 * len(scheduler) + 64
+    assert sorted(scheduler.pop_due(999.0)) == list(range(10))
@@ -0,0 +1,42 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests the poll statistics."""
+
+from ska_attribute_polling.poll_stats import PollStats, RollingWindow
+
+
+def test_rolling_window() -> None:
+    """Test that percentiles cover only the most recent samples."""
+    window = RollingWindow(100)
+    assert window.last == 0
+    assert window.percentile(99) == 0
+
+    for sample in range(1000):
+        window.add(sample)
+    assert len(window) == 100
+    assert window.last == 999
+    assert window.percentile(0) == 900
+    assert window.percentile(50) == 949.5
+    assert window.percentile(100) == 999
+
+
+def test_poll_stats_cycles() -> None:
+    """Test that cycle counts become the last cycle, and add to the totals."""
+    stats = PollStats()
+    stats.cycle["pdus"] += 3
+    stats.end_cycle(0.5)
+    stats.cycle["pdus"] += 2
+    stats.cycle["timeouts"] += 1
+    stats.end_cycle(1.5)
+
+    assert stats.last_cycle == {"pdus": 2, "timeouts": 1}
+    assert stats.totals == {"pdus": 5, "timeouts": 1}
+    assert not stats.cycle
+    assert stats.polls == 2
+    assert stats.durations.last == 1.5
+    assert stats.durations.percentile(50) == 1.0
@@ -0,0 +1,145 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests the shared poller."""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Any
+
+from ska_attribute_polling.shared_poller import SharedPoller
+
+
+class RecordingModel:
+    """A poll model that records the calls the poller makes."""
+
+    def __init__(self, poll_time: float = 0.0, fail: bool = False) -> None:
+        """
+        Create the model.
+
+        :param poll_time: how long each poll takes
+        :param fail: whether polls raise an exception
+        """
+        self.logger = logging.getLogger()
+        self.calls: queue.SimpleQueue[str] = queue.SimpleQueue()
+        self.polling = threading.Event()
+        self.overlapped = False
+        self._poll_time = poll_time
+        self._fail = fail
+
+    def get_request(self) -> str:  # noqa: D102
+        return "request"
+
+    def poll(self, poll_request: Any) -> str:  # noqa: D102
+        if self.polling.is_set():
+            self.overlapped = True
+        self.polling.set()
+        time.sleep(self._poll_time)
+        self.polling.clear()
+        if self._fail:
+            raise ConnectionError("unreachable")
+        return f"response to {poll_request}"
+
+    def poll_succeeded(self, poll_response: Any) -> None:  # noqa: D102
+        self.calls.put(poll_response)
+
+    def poll_failed(self, exception: Exception) -> None:  # noqa: D102
+        self.calls.put(repr(exception))
+
+    def polling_started(self) -> None:  # noqa: D102
+        self.calls.put("started")
+
+    def polling_stopped(self) -> None:  # noqa: D102
+        self.calls.put("stopped")
+
+    def next_calls(self, count: int) -> list[str]:
+        """
+        Wait for the poller's next calls.
+
+        :param count: how many calls to wait for
+
+        :return: the calls
+        """
+        return [self.calls.get(timeout=5) for _ in range(count)]
+
+
+def test_poll_cycle() -> None:
+    """Test that a model is polled between polling_started() and polling_stopped()."""
+    poller = SharedPoller(workers=2)
+    model = RecordingModel()
+    failing = RecordingModel(fail=True)
+    poller.start_polling(model, 0.01)
+    poller.start_polling(failing, 0.01)
+    assert model.next_calls(3) == ["started"] + 2 * ["response to request"]
+    assert failing.next_calls(2) == ["started", "ConnectionError('unreachable')"]
+
+    poller.stop_polling(model)
+    while (call := model.calls.get(timeout=5)) != "stopped":
+        assert call == "response to request"
+    time.sleep(0.1)
+    assert model.calls.empty()
+    poller.stop_polling(failing)
+
+
+def test_poll_rate_and_wake() -> None:
+    """Test that polls are poll_rate apart, unless the poller is woken."""
+    poller = SharedPoller(workers=1)
+    model = RecordingModel()
+    poller.start_polling(model, 30.0)
+    assert model.next_calls(2) == ["started", "response to request"]
+    time.sleep(0.1)
+    assert model.calls.empty()
+
+    poller.wake(model)
+    assert model.next_calls(1) == ["response to request"]
+    poller.stop_polling(model)
+    assert model.next_calls(1) == ["stopped"]
+    poller.wake(model)
+    time.sleep(0.1)
+    assert model.calls.empty()
+
+
+def test_wake_delay() -> None:
+    """Test that a burst of delayed wakes leads to one poll, after the delay."""
+    poller = SharedPoller(workers=1)
+    model = RecordingModel()
+    poller.start_polling(model, 30.0)
+    assert model.next_calls(2) == ["started", "response to request"]
+
+    start = time.monotonic()
+    for _ in range(5):
+        poller.wake(model, 0.2)
+        time.sleep(0.01)
+    assert model.next_calls(1) == ["response to request"]
+    assert 0.2 <= time.monotonic() - start < 5
+    time.sleep(0.3)
+    assert model.calls.empty()
+    poller.stop_polling(model)
+
+
+def test_models_share_workers() -> None:
+    """Test that many models are polled by a few threads, one poll at a time each."""
+    threads = threading.active_count()
+    poller = SharedPoller(workers=4)
+    assert threading.active_count() <= threads + 4
+
+    models = [RecordingModel(poll_time=0.01) for _ in range(50)]
+    for model in models:
+        poller.start_polling(model, 0.0)
+    for model in models:
+        assert model.next_calls(4)[1:] == 3 * ["response to request"]
+    assert threading.active_count() <= threads + 4
+
+    for model in models:
+        poller.stop_polling(model)
+    for model in models:
+        while model.calls.get(timeout=5) != "stopped":
+            pass
+        assert not model.overlapped
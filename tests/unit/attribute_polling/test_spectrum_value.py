@@ -0,0 +1,23 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests spectrum attribute values."""
+
+import numpy as np
+
+from ska_attribute_polling.attribute_polling_component_manager import SpectrumValue
+
+
+def test_spectrum_value_comparison() -> None:
+    """Test that spectrum values compare as a whole, giving a bool."""
+    value = np.arange(4).view(SpectrumValue)
+    assert value == np.arange(4).view(SpectrumValue)
+    assert value == [0, 1, 2, 3]
+    assert value != np.arange(1, 5)
+    assert value != np.arange(3)
+    assert value != None  # noqa: E711
+    assert None != value  # noqa: E711
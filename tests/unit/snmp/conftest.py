@@ -8,10 +8,7 @@
 """This module defines a pytest harness for testing ska-ser-snmp."""
 
 import logging
-import os
 import queue
-import signal
-import subprocess
 import time
 from contextlib import contextmanager
 from pathlib import Path
@@ -87,58 +84,6 @@ def expect_attribute(
         tango_device.unsubscribe_event(subscription_id)
 
 
-# pylint: disable=consider-using-with
-@pytest.fixture(scope="session", name="simulator")
-def simulator_fixture() -> Generator[Any, None, None]:
-    """
-    Create a simulator for snmp unit testing.
-
-    :yields: host & port else None
-    :raises RuntimeError: Simulator failed"
-    """
-    if int(os.getenv("SKA_SNMP_DEVICE_SIMULATOR", "1").strip()):
-        sim_user = os.getenv("SKA_SNMP_DEVICE_SIMULATOR_USER", "").strip()
-        if sim_user:
-            user, group = sim_user.split(":")
-            user_args = [f"--process-user={user}", f"--process-group={group}"]
-        else:
-            user_args = []
-        host, port = "127.0.0.1", 5161
-        sim_process: Any = subprocess.Popen(  # Any because mypy seems to hate Popen
-            [
-                "snmpsim-command-responder",
-                *user_args,
-                "--data-dir=tests/snmpsim_data",
-                (
-                    "--variation-module-options=sql:dbtype:sqlite3,"
-                    "database:tests/snmpsim_data/snmpsim.db,dbtable:snmprec"
-                ),
-                f"--agent-udpv4-endpoint={host}:{port}",
-            ],
-            encoding="utf-8",
-            stderr=subprocess.PIPE,
-        )
-        try:
-            while sim_process.poll() is None:
-                line = sim_process.stderr.readline()
-                if line.startswith(f"  Listening at UDP/IPv4 endpoint {host}:{port}"):
-                    yield host, port
-                    break
-            else:
-                cmd = " ".join(sim_process.args)
-                return_code = sim_process.returncode
-                raise RuntimeError(
-                    f'Simulator command "{cmd}" exited with code {return_code}'
-                    " without ever listening"
-                )
-        finally:
-            sim_process.send_signal(signal.SIGTERM)
-            sim_process.terminate()
-            sim_process.wait()
-    else:
-        yield None
-
-
 @contextmanager
 def restore(
     dev: DeviceProxy, attr: str, setval: Any = object
@@ -169,20 +114,6 @@ def definition_path_fixture() -> str:
     return str(Path(__file__).parent.resolve() / "SKA-7357.yaml")
 
 
-@pytest.fixture(name="endpoint")
-def endpoint_fixture(simulator: tuple[str, int]) -> tuple[str, int]:
-    """
-    Define an endpoint.
-
-    :param simulator: the simulator endpoint
-    :return: the host & port
-    """
-    if simulator:
-        return simulator
-    host, port = os.getenv("SKA_SNMP_DEVICE_TEST_ENDPOINT").strip().split(":")
-    return host, int(port)
-
-
 @pytest.fixture(name="snmp_device")
 def snmp_device_fixture(definition_path: str, endpoint: tuple[str, int]) -> DeviceProxy:
     """
@@ -7,16 +7,37 @@
 # See LICENSE for more info.
 """This module defines the tests the device definitions for ska-ser-snmp."""
 
+import json
+import logging
+import shutil
+from collections import OrderedDict
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
 import pytest
 import yaml
-from tango import AttrWriteType
+from pysnmp.smi.error import MibNotFoundError
+from tango import AttrDataFormat, AttrWriteType
 
+from ska_attribute_polling.attribute_polling_component_manager import AttrPollRequest
+from ska_snmp_device import definitions
 from ska_snmp_device.definitions import (
+    COMPILED_DEFINITION_KEY,
+    MIB_CACHE_ENV,
+    MIB_LIBRARY,
+    MIB_OFFLINE_ENV,
     _adjust_overrides,
+    _create_mib_builder,
     _expand_attribute,
+    compile_device_definition,
+    compile_main,
     load_device_definition,
+    mib_cache_dir,
     parse_device_definition,
 )
+from ska_snmp_device.fake_agent import FAKE_AGENTS, FAKE_BACKENDS, FakeAgent
+from ska_snmp_device.load_test import snmprec_records
 
 
 def test_parse_definition_regression(definition_path: str) -> None:
@@ -31,6 +52,282 @@ def test_parse_definition_regression(definition_path: str) -> None:
     assert len(attributes) == 9
 
 
+def test_parse_definition_numeric_oids(definition_path: str) -> None:
+    """
+    Test that attributes' numeric OIDs are resolved when parsing.
+
+    :param definition_path: localtion of the yaml file
+    """
+    definition = load_device_definition(definition_path, "")
+    attributes = {attr.name: attr for attr in parse_device_definition(definition)}
+    assert attributes["fastPoller"].oid == (1, 3, 6, 1, 2, 1, 11, 1, 0)
+    assert attributes["writeableEnum"].oid == (
+        *(1, 3, 6, 1, 4, 1, 38446, 1, 5, 2, 1, 3),
+        *(1, 1),
+    )
+
+
+def test_parse_definition_shares_mib_builder(
+    definition_path: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test that every definition is parsed with the same MIB builder.
+
+    :param definition_path: location of the yaml file
+    :param monkeypatch: pytest's monkeypatch fixture
+    """
+    builders = []
+
+    def create_mib_builder() -> object:
+        builders.append(_create_mib_builder())
+        return builders[-1]
+
+    monkeypatch.setattr(definitions, "_mib_view", None)
+    monkeypatch.setattr(definitions, "_parsed_definitions", OrderedDict())
+    monkeypatch.setattr(definitions, "_create_mib_builder", create_mib_builder)
+    definition = load_device_definition(definition_path, "")
+    for count in range(1, 4):
+        parse_device_definition({"attributes": definition["attributes"][:count]})
+    assert len(builders) == 1
+
+
+def test_parse_definition_cache(
+    definition_path: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test that identical definitions share the same parsed attributes.
+
+    :param definition_path: location of the yaml file
+    :param monkeypatch: pytest's monkeypatch fixture
+    """
+    monkeypatch.setattr(definitions, "PARSED_DEFINITION_CACHE_SIZE", 2)
+    monkeypatch.setattr(definitions, "_parsed_definitions", OrderedDict())
+    definition = load_device_definition(definition_path, "")
+    attributes = parse_device_definition(definition)
+
+    # The definition isn't modified, so it can be parsed again
+    assert definition == load_device_definition(definition_path, "")
+    again = parse_device_definition(load_device_definition(definition_path, ""))
+    assert all(a is b for a, b in zip(attributes, again, strict=True))
+    with pytest.raises(TypeError):
+        attributes[0].attr_args["name"] = "renamed"  # type: ignore[index]
+
+    # Definitions with different contents are parsed separately
+    definition["attributes"][0]["name"] = "renamed"
+    renamed = parse_device_definition(definition)
+    assert renamed[0].name == "renamed"
+    assert renamed[1] is not attributes[1]
+
+    # Once evicted, a definition is parsed again
+    parse_device_definition({"attributes": definition["attributes"][1:]})
+    again = parse_device_definition(load_device_definition(definition_path, ""))
+    assert again[0] is not attributes[0]
+    assert again[0].identity == attributes[0].identity
+
+
+def test_mib_cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test that a compiled MIB is only recompiled when its own source changes.
+
+    :param tmp_path: a temporary directory
+    :param monkeypatch: pytest's monkeypatch fixture
+    """
+    library = tmp_path / "mib_library"
+    shutil.copytree(MIB_LIBRARY, library)
+    monkeypatch.setattr(definitions, "MIB_LIBRARY", library)
+    monkeypatch.setenv(MIB_CACHE_ENV, str(tmp_path / "cache"))
+    monkeypatch.setenv(MIB_OFFLINE_ENV, "1")
+
+    cache_dir = mib_cache_dir()
+    assert cache_dir.parent == tmp_path / "cache"
+    _create_mib_builder().loadModules("ENLOGIC-PDU-MIB")
+    enlogic, snmpv2 = cache_dir / "ENLOGIC-PDU-MIB.py", cache_dir / "SNMPv2-MIB.py"
+    snmpv2_mtime = snmpv2.stat().st_mtime_ns
+
+    # An unchanged library keeps every compiled MIB
+    _create_mib_builder()
+    assert enlogic.exists()
+
+    with open(library / "ENLOGIC-PDU-MIB", "a", encoding="utf-8") as mib:
+        mib.write("\n")
+    mib_builder = _create_mib_builder()
+    assert mib_cache_dir() == cache_dir
+    assert not enlogic.exists()
+    mib_builder.loadModules("ENLOGIC-PDU-MIB")
+    assert enlogic.exists()
+    assert snmpv2.stat().st_mtime_ns == snmpv2_mtime
+
+
+def test_mib_cache_offline(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test that MIBs in the library are compiled into the cache without fetching.
+
+    :param tmp_path: a temporary directory
+    :param monkeypatch: pytest's monkeypatch fixture
+    """
+    # Any attempt to fetch a MIB fails
+    monkeypatch.setattr(definitions, "MIB_REPOSITORY", "http://127.0.0.1:9/@mib@")
+    monkeypatch.setenv(MIB_CACHE_ENV, str(tmp_path))
+    mib_builder = _create_mib_builder()
+    mib_builder.loadModules("ENLOGIC-PDU-MIB")
+    assert (mib_cache_dir() / "ENLOGIC-PDU-MIB.py").exists()
+
+    # A fresh builder loads the compiled MIB rather than compiling it again
+    mib_builder = _create_mib_builder()
+    mib_builder.setMibCompiler(None, str(mib_cache_dir()))
+    mib_builder.loadModules("ENLOGIC-PDU-MIB")
+
+
+def test_mib_repository_fallback(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test that MIBs missing from the library are fetched, unless offline.
+
+    :param tmp_path: a temporary directory
+    :param monkeypatch: pytest's monkeypatch fixture
+    """
+    library, repository = tmp_path / "mib_library", tmp_path / "repository"
+    shutil.copytree(MIB_LIBRARY, library)
+    repository.mkdir()
+    shutil.move(library / "UPS-MIB", repository / "UPS-MIB")
+    monkeypatch.setattr(definitions, "MIB_LIBRARY", library)
+    monkeypatch.setattr(definitions, "MIB_REPOSITORY", f"file://{repository}")
+    monkeypatch.setenv(MIB_CACHE_ENV, str(tmp_path / "cache"))
+
+    monkeypatch.setenv(MIB_OFFLINE_ENV, "1")
+    with pytest.raises(MibNotFoundError):
+        _create_mib_builder().loadModules("UPS-MIB")
+
+    monkeypatch.setenv(MIB_OFFLINE_ENV, "0")
+    _create_mib_builder().loadModules("UPS-MIB")
+    assert (mib_cache_dir() / "UPS-MIB.py").exists()
+
+    # Once cached, a fetched MIB is loaded without the repository
+    shutil.rmtree(repository)
+    monkeypatch.setenv(MIB_OFFLINE_ENV, "1")
+    _create_mib_builder().loadModules("UPS-MIB")
+
+
+def test_compiled_definition(
+    definition_path: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test that a compiled definition parses to the same attributes, without MIBs.
+
+    :param definition_path: location of the yaml file
+    :param tmp_path: a temporary directory
+    :param monkeypatch: pytest's monkeypatch fixture
+    """
+    expected = parse_device_definition(load_device_definition(definition_path, ""))
+
+    compiled_path = tmp_path / "definition.compiled.json"
+    assert compile_main([definition_path, "-o", str(compiled_path)]) == 0
+
+    def no_mibs() -> None:
+        raise AssertionError("Compiled definitions shouldn't need MIBs")
+
+    monkeypatch.setattr(definitions, "_mib_view", None)
+    monkeypatch.setattr(definitions, "_create_mib_builder", no_mibs)
+    attributes = parse_device_definition(load_device_definition(str(compiled_path), ""))
+
+    assert len(attributes) == len(expected)
+    for attr, expected_attr in zip(attributes, expected):
+        assert attr.identity == expected_attr.identity
+        assert attr.oid == expected_attr.oid
+        assert attr.elements == expected_attr.elements
+        assert attr.polling_period == expected_attr.polling_period
+        assert attr.trap_polling_period == expected_attr.trap_polling_period
+        assert attr.attr_args.keys() == expected_attr.attr_args.keys()
+        for key, value in expected_attr.attr_args.items():
+            if isinstance(value, type) and issubclass(value, Enum):
+                assert attr.attr_args[key].__bases__ == value.__bases__
+                assert list(attr.attr_args[key].__members__.items()) == [
+                    (name, member.value) for name, member in value.__members__.items()
+                ]
+            else:
+                assert attr.attr_args[key] == value
+                assert type(attr.attr_args[key]) is type(value)
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+def test_compiled_definition_write(
+    definition_path: str,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    backend: str,
+) -> None:
+    """
+    Test writing the attributes of a compiled definition, without any MIBs.
+
+    :param definition_path: location of the yaml file
+    :param tmp_path: a temporary directory
+    :param monkeypatch: pytest's monkeypatch fixture
+    :param backend: the name of the SNMP backend
+    """
+    compiled = compile_device_definition(load_device_definition(definition_path, ""))
+
+    def no_mibs() -> None:
+        raise AssertionError("Compiled definitions shouldn't need MIBs")
+
+    # Neither the definitions module nor pysnmp can find any compiled MIBs
+    monkeypatch.setattr(definitions, "_mib_view", None)
+    monkeypatch.setattr(definitions, "_create_mib_builder", no_mibs)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv(MIB_OFFLINE_ENV, "1")
+    attributes = parse_device_definition(json.loads(json.dumps(compiled)))
+
+    address = ("127.0.0.1", 10161)
+    FAKE_AGENTS[address] = FakeAgent(snmprec_records(attributes))
+    mgr = FAKE_BACKENDS[backend](
+        host=address[0],
+        port=address[1],
+        authority="private",
+        max_objects_per_pdu=8,
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=attributes,
+        poll_rate=2.0,
+    )
+    enum = mgr._attributes["writeableEnum"].attr_args["dtype"]
+    values = {
+        "writeableEnum": list(enum)[-1],
+        "writeableInt": 7,
+        "writeableString": "renamed",
+        "writeableConstrainedInt": 5,
+    }
+    try:
+        response = mgr.poll(
+            AttrPollRequest(
+                writes={
+                    name: mgr.from_python(name, value) for name, value in values.items()
+                },
+                reads=list(values),
+            )
+        )
+        assert response == values
+        # The objects were written by OID, without resolving their names
+        engine, _ = mgr._get_engine()
+        assert "ENLOGIC-PDU-MIB" not in engine.getMibBuilder().mibSymbols
+    finally:
+        mgr._close_engine()
+        del FAKE_AGENTS[address]
+
+
+def test_compiled_definition_version(definition_path: str) -> None:
+    """
+    Test that compiled definitions of an unknown version are rejected.
+
+    :param definition_path: location of the yaml file
+    """
+    compiled = compile_device_definition(load_device_definition(definition_path, ""))
+    compiled = json.loads(json.dumps(compiled))
+    compiled[COMPILED_DEFINITION_KEY] += 1
+    with pytest.raises(ValueError, match="recompile"):
+        parse_device_definition(compiled)
+
+
 def test_expand_attribute_singular() -> None:
     """Test loading a single attribute."""
     template = yaml.safe_load(
@@ -126,6 +423,150 @@ def test_expand_attribute_wr16() -> None:
     assert expected == list(_expand_attribute(template))
 
 
+def test_expand_attribute_spectrum() -> None:
+    """Test loading an indexed attribute as a single spectrum attribute."""
+    template = yaml.safe_load(
+        """
+    name: plural_attr
+    oid: [MY-MIB, tableObject, 1]
+    spectrum: true
+    indexes:
+      - [4, 6]
+    """
+    )
+
+    expected = yaml.safe_load(
+        """
+    - name: plural_attr
+      oid: [MY-MIB, tableObject, 1]
+      elements:
+        - [MY-MIB, tableObject, 1, 4]
+        - [MY-MIB, tableObject, 1, 5]
+        - [MY-MIB, tableObject, 1, 6]
+    """
+    )
+
+    assert expected == list(_expand_attribute(template))
+
+
+def test_expand_attribute_spectrum_with_format() -> None:
+    """Test loading a spectrum attribute whose name is a template."""
+    template = yaml.safe_load(
+        """
+    name: plural_attr_{}
+    oid: [MY-MIB, tableObject, 1]
+    spectrum: true
+    indexes:
+      - [4, 6]
+    """
+    )
+
+    with pytest.raises(ValueError, match="must not contain format"):
+        list(_expand_attribute(template))
+
+
+def test_parse_definition_trap_polling_period() -> None:
+    """Test that trap polling periods are given in ms, and are optional."""
+    definition = yaml.safe_load(
+        """
+    attributes:
+      - name: trapDriven
+        oid: [SNMPv2-MIB, sysDescr, 0]
+        polling_period: 1000
+        trap_polling_period: 60000
+      - name: polled
+        oid: [SNMPv2-MIB, sysName, 0]
+        polling_period: 1000
+    """
+    )
+    trap_driven, polled = parse_device_definition(definition)
+    assert trap_driven.polling_period == 1.0
+    assert trap_driven.trap_polling_period == 60.0
+    assert polled.trap_polling_period is None
+    assert parse_device_definition(compile_device_definition(definition)) == [
+        trap_driven,
+        polled,
+    ]
+
+
+def test_parse_definition_rate() -> None:
+    """Test counter rates, published alongside or instead of the counters."""
+    definition = yaml.safe_load(
+        """
+    attributes:
+      - name: inPkts
+        oid: [SNMPv2-MIB, snmpInPkts, 0]
+        rate: alongside
+      - name: outPktRate
+        oid: [SNMPv2-MIB, snmpOutPkts, 0]
+        rate: instead
+        unit: packets/s
+    """
+    )
+    in_pkts, in_pkts_rate, out_pkt_rate = parse_device_definition(definition)
+    assert in_pkts.name == "inPkts" and not in_pkts.rate
+    assert in_pkts.dtype == int
+    assert in_pkts_rate.name == "inPktsRate" and in_pkts_rate.rate
+    assert in_pkts_rate.oid == in_pkts.oid
+    assert dict(in_pkts_rate.attr_args) == {
+        "name": "inPktsRate",
+        "dtype": float,
+        "access": AttrWriteType.READ,
+    }
+    assert out_pkt_rate.rate
+    assert out_pkt_rate.attr_args["dtype"] == float
+    assert out_pkt_rate.attr_args["unit"] == "packets/s"
+    assert "abs_change" not in out_pkt_rate.attr_args
+    assert parse_device_definition(compile_device_definition(definition)) == [
+        in_pkts,
+        in_pkts_rate,
+        out_pkt_rate,
+    ]
+
+
+@pytest.mark.parametrize(
+    ("oid", "rate", "error"),
+    [
+        (["SNMPv2-MIB", "snmpInPkts", 0], "sometimes", ValueError),
+        (["SNMPv2-MIB", "sysDescr", 0], "instead", TypeError),
+    ],
+)
+def test_parse_definition_rate_errors(
+    oid: list[Any], rate: str, error: type[Exception]
+) -> None:
+    """
+    Test that only known rate options, of integer objects, are accepted.
+
+    :param oid: the attribute's OID
+    :param rate: the attribute's rate option
+    :param error: the expected exception
+    """
+    definition = {"attributes": [{"name": "attr", "oid": oid, "rate": rate}]}
+    with pytest.raises(error):
+        parse_device_definition(definition)
+
+
+def test_parse_definition_spectrum() -> None:
+    """Test parsing a spectrum attribute from a table column."""
+    definition = yaml.safe_load(
+        """
+    attributes:
+      - name: outletState
+        oid: [ENLOGIC-PDU-MIB, pduOutletSwitchedSTATUSState, 1]
+        spectrum: true
+        indexes:
+          - [1, 24]
+    """
+    )
+    (attr,) = parse_device_definition(definition)
+    assert attr.attr_args["dformat"] == AttrDataFormat.SPECTRUM
+    assert attr.attr_args["max_dim_x"] == 24
+    assert attr.attr_args["access"] == AttrWriteType.READ
+    assert attr.dtype == int  # enumerated columns are exposed as integers
+    column = (1, 3, 6, 1, 4, 1, 38446, 1, 5, 4, 1, 4)
+    assert attr.elements == tuple((*column, 1, i) for i in range(1, 25))
+
+
 def test_expand_attribute_missing_suffix() -> None:
     """Test loading an attribute with malformed oid definition."""
     template = yaml.safe_load(
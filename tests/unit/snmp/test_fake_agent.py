@@ -0,0 +1,260 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests the in-process fake SNMP agent."""
+
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Generator
+
+import pytest
+from pysnmp.proto.errind import RequestTimedOut
+from pysnmp.proto.rfc1902 import Integer32
+
+from ska_attribute_polling.attribute_polling_component_manager import AttrPollRequest
+from ska_snmp_device.definitions import load_device_definition, parse_device_definition
+from ska_snmp_device.fake_agent import FAKE_AGENTS, FAKE_BACKENDS, FakeAgent
+from ska_snmp_device.snmp_component_manager import SNMPComponentManager
+from ska_snmp_device.snmp_device import SNMP_BACKENDS
+from ska_snmp_device.snmp_types import SNMPAttrInfo
+
+SIMULATOR_DB = Path(__file__).parents[2] / "snmpsim_data" / "snmpsim.db"
+
+FAKE_ADDRESS = ("10.0.0.1", 161)
+
+RECORDS = [
+    ("1.3.6.1.2.1.1.1.0", "4", "fake agent"),
+    *((f"1.3.6.1.4.1.99.1.{index}", "2", str(index)) for index in range(1, 9)),
+]
+
+
+@pytest.fixture(name="fake_agent")
+def fake_agent_fixture() -> Generator[FakeAgent, None, None]:
+    """
+    Make a small fake agent reachable at FAKE_ADDRESS.
+
+    :yields: the agent
+    """
+    FAKE_AGENTS[FAKE_ADDRESS] = agent = FakeAgent(RECORDS, seed=0)
+    yield agent
+    del FAKE_AGENTS[FAKE_ADDRESS]
+
+
+def _fake_manager(backend: str, **kwargs: Any) -> SNMPComponentManager:
+    """
+    Create a component manager for the fake agent, of RECORDS' objects.
+
+    :param backend: the name of the SNMP backend
+    :param kwargs: any other component manager arguments
+
+    :return: the component manager
+    """
+    attributes = [
+        SNMPAttrInfo(
+            attr_args={"name": f"value{index}", "dtype": int},
+            polling_period=0,
+            identity=(),
+            oid=(1, 3, 6, 1, 4, 1, 99, 1, index),
+        )
+        for index in range(1, 9)
+    ]
+    attributes.append(
+        SNMPAttrInfo(
+            attr_args={"name": "sysDescr", "dtype": str},
+            polling_period=0,
+            identity=("SNMPv2-MIB", "sysDescr", 0),
+        )
+    )
+    kwargs.setdefault("max_objects_per_pdu", 8)
+    return FAKE_BACKENDS[backend](
+        host=FAKE_ADDRESS[0],
+        port=FAKE_ADDRESS[1],
+        authority="private",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=attributes,
+        poll_rate=2.0,
+        **kwargs,
+    )
+
+
+def _poll_everything(mgr: SNMPComponentManager) -> dict[str, Any]:
+    """
+    Poll every attribute once, and close the manager's engine.
+
+    :param mgr: the component manager
+
+    :return: the poll response
+    """
+    try:
+        return mgr.poll(AttrPollRequest(writes={}, reads=list(mgr._attributes)))
+    finally:
+        mgr._close_engine()
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+def test_fake_agent_matches_simulator(
+    definition_path: str, endpoint: tuple[str, int], backend: str
+) -> None:
+    """
+    Test that a fake agent with the simulator's data returns the same values.
+
+    :param definition_path: location of the yaml file
+    :param endpoint: host & port of the SNMP agent
+    :param backend: the name of the SNMP backend
+    """
+    with sqlite3.connect(SIMULATOR_DB) as db:
+        records = db.execute("SELECT oid, tag, value FROM snmprec").fetchall()
+    FAKE_AGENTS[FAKE_ADDRESS] = FakeAgent(records)
+    attributes = parse_device_definition(load_device_definition(definition_path, None))
+
+    def poll_everything(host: str, port: int, cls: type[SNMPComponentManager]) -> Any:
+        return _poll_everything(
+            cls(
+                host=host,
+                port=port,
+                authority="private",
+                logger=logging.getLogger(),
+                communication_state_callback=lambda *args: None,
+                component_state_callback=lambda **kwargs: None,
+                attributes=attributes,
+                poll_rate=2.0,
+                max_objects_per_pdu=8,
+                max_in_flight_pdus=4,
+            )
+        )
+
+    try:
+        expected = poll_everything(*endpoint, SNMP_BACKENDS[backend])
+        fake = poll_everything(*FAKE_ADDRESS, FAKE_BACKENDS[backend])
+    finally:
+        del FAKE_AGENTS[FAKE_ADDRESS]
+    assert set(fake) == {attr.name for attr in attributes}
+    # fastPoller and slowPoller are packet counters, so they tick between polls
+    for name in ["fastPoller", "slowPoller"]:
+        del expected[name], fake[name]
+    assert fake == expected
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+def test_fake_agent_faults(fake_agent: FakeAgent, backend: str) -> None:
+    """
+    Test injecting latency, tooBig and lost requests.
+
+    :param fake_agent: the fake agent
+    :param backend: the name of the SNMP backend
+    """
+    expected: dict[str, Any] = {f"value{index}": index for index in range(1, 9)}
+    expected["sysDescr"] = "fake agent"
+    assert _poll_everything(_fake_manager(backend)) == expected
+
+    fake_agent.latency = 0.2
+    start = time.monotonic()
+    assert _poll_everything(_fake_manager(backend)) == expected
+    assert time.monotonic() - start >= 0.2
+
+    fake_agent.latency = 0.0
+    fake_agent.max_varbinds = 3
+    mgr = _fake_manager(backend)
+    assert _poll_everything(mgr) == expected
+    assert fake_agent.counts["too_big"] > 0
+    assert mgr.objects_per_pdu < 8
+
+    fake_agent.loss = 1.0
+    sent = fake_agent.counts["requests"]
+    mgr = _fake_manager(backend, timeout=0.1, retries=1)
+    with pytest.raises(RequestTimedOut):
+        _poll_everything(mgr)
+    # Every request was lost, and sent twice
+    assert fake_agent.counts["lost"] == fake_agent.counts["requests"] - sent
+    assert fake_agent.counts["lost"] % 2 == 0 and fake_agent.counts["lost"] > 0
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+def test_fake_agent_set(fake_agent: FakeAgent, backend: str) -> None:
+    """
+    Test that values written to a fake agent are read back.
+
+    :param fake_agent: the fake agent
+    :param backend: the name of the SNMP backend
+    """
+    mgr = _fake_manager(backend)
+    assert _poll_everything(mgr)["sysDescr"] == "fake agent"
+
+    request = AttrPollRequest(
+        writes={"sysDescr": mgr.from_python("sysDescr", "written")},
+        reads=["sysDescr"],
+    )
+    try:
+        assert mgr.poll(request) == {"sysDescr": "written"}
+    finally:
+        mgr._close_engine()
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+def test_fake_agent_set_without_mib(fake_agent: FakeAgent, backend: str) -> None:
+    """
+    Test writing an object by its numeric OID, when its MIB can't be found.
+
+    :param fake_agent: the fake agent
+    :param backend: the name of the SNMP backend
+    """
+    attr = SNMPAttrInfo(
+        attr_args={"name": "vendorValue", "dtype": int},
+        polling_period=0,
+        identity=("NO-SUCH-MIB", "vendorValue", 1),
+        oid=(1, 3, 6, 1, 4, 1, 99, 1, 1),
+        syntax="Integer32",
+    )
+    mgr = FAKE_BACKENDS[backend](
+        host=FAKE_ADDRESS[0],
+        port=FAKE_ADDRESS[1],
+        authority="private",
+        max_objects_per_pdu=8,
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=[attr],
+        poll_rate=2.0,
+    )
+    request = AttrPollRequest(
+        writes={"vendorValue": mgr.from_python("vendorValue", 42)},
+        reads=["vendorValue"],
+    )
+    try:
+        assert mgr.poll(request) == {"vendorValue": 42}
+    finally:
+        mgr._close_engine()
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+def test_fake_agent_deadline(fake_agent: FakeAgent, backend: str) -> None:
+    """
+    Test that a poll that runs out of time is a partial success.
+
+    :param fake_agent: the fake agent
+    :param backend: the name of the SNMP backend
+    """
+    fake_agent.latency = 0.4
+    mgr = _fake_manager(backend, poll_deadline=0.3)
+    try:
+        # The write leaves no time for the reads, which are left for later
+        request = AttrPollRequest(
+            writes={"value1": Integer32(10)}, reads=["value2", "value3"]
+        )
+        assert mgr.poll(request) == {}
+        # Reads that overrun the deadline don't mean the agent is unreachable
+        mgr.poll(AttrPollRequest(writes={}, reads=["value2", "value3"]))
+        assert mgr._failed_polls == 0
+    finally:
+        mgr._close_engine()
+
+    fake_agent.latency = 0.0
+    assert _poll_everything(_fake_manager(backend))["value1"] == 10
@@ -0,0 +1,134 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests the load test of many SNMPDevices."""
+
+import logging
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from ska_attribute_polling.attribute_polling_component_manager import AttrPollRequest
+from ska_snmp_device.definitions import load_device_definition, parse_device_definition
+from ska_snmp_device.fake_agent import FAKE_AGENTS, FAKE_BACKENDS, FakeAgent
+from ska_snmp_device.load_test import (
+    LoadTestReport,
+    run_load_test,
+    scale_definition,
+    snmprec_records,
+)
+from ska_snmp_device.snmp_types import SNMPAttrInfo
+
+EN6808 = Path(__file__).parents[3] / "docs" / "src" / "examples" / "EN6808.yaml"
+
+
+def test_scale_definition() -> None:
+    """Test that only the last index range of indexed attributes is widened."""
+    definition: dict[str, Any] = {
+        "attributes": [
+            {"name": "scalar", "oid": ["SNMPv2-MIB", "sysDescr", 0]},
+            {"name": "a{}", "oid": ["M", "a", 1], "indexes": [[1, 24]]},
+            {"name": "b{}_{}", "oid": ["M", "b"], "indexes": [[1, 2], [5, 8]]},
+            {"name": "c{}", "oid": ["M", "c"], "indexes": [[2, 8, 2]]},
+        ]
+    }
+    scaled = scale_definition(definition, 3)
+    assert [attr.get("indexes") for attr in scaled["attributes"]] == [
+        None,
+        [[1, 72]],
+        [[1, 2], [5, 16]],
+        [[2, 24, 2]],
+    ]
+    # The template is left alone
+    assert definition["attributes"][1]["indexes"] == [[1, 24]]
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+def test_snmprec_records(backend: str) -> None:
+    """
+    Test that the made-up values are valid for every attribute of a definition.
+
+    :param backend: the name of the SNMP backend
+    """
+    definition = scale_definition(load_device_definition(str(EN6808), None), 2)
+    attributes = parse_device_definition(definition)
+    records = snmprec_records(attributes)
+    assert len(records) == len(attributes) == 4 + 4 * 48
+
+    FAKE_AGENTS["10.0.0.2", 161] = FakeAgent(records)
+    mgr = FAKE_BACKENDS[backend](
+        host="10.0.0.2",
+        port=161,
+        authority="public",
+        max_objects_per_pdu=24,
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=attributes,
+        poll_rate=2.0,
+    )
+    try:
+        response = mgr.poll(
+            AttrPollRequest(writes={}, reads=[attr.name for attr in attributes])
+        )
+        mgr.poll_succeeded(response)
+    finally:
+        mgr._close_engine()
+        del FAKE_AGENTS["10.0.0.2", 161]
+    assert None not in response.values()
+    assert mgr.stats.last_cycle["conversion_failures"] == 0
+    assert response["outlet48Name"] == "outlet48Name"
+
+
+def test_snmprec_records_need_oids() -> None:
+    """Test that attributes whose numeric OIDs aren't known are rejected."""
+    attr = SNMPAttrInfo(
+        attr_args={"name": "unresolved", "dtype": int},
+        polling_period=0,
+        identity=("SNMPv2-MIB", "sysUpTime", 0),
+    )
+    with pytest.raises(ValueError, match="unresolved"):
+        snmprec_records([attr])
+
+
+def test_load_test_report() -> None:
+    """Test whether a report counts as keeping up with the UpdateRate."""
+    report = LoadTestReport(
+        devices=10,
+        attributes=100,
+        update_rate=0.5,
+        duration=30.0,
+        poll_rate=1.9,
+        poll_duration_p95=0.02,
+        scheduler_lag_p95=0.52,
+        cpu=0.25,
+        max_rss=100 * 2**20,
+    )
+    assert report.target_poll_rate == 2.0
+    assert report.sustained
+    assert "10 devices x 100 attributes at UpdateRate 0.5 s: sustained" in (
+        report.summary()
+    )
+    assert not LoadTestReport(**{**report.__dict__, "poll_rate": 1.7}).sustained
+
+
+def test_run_load_test() -> None:
+    """Test a short load test of a few devices polling fake agents."""
+    report = run_load_test(
+        load_device_definition(str(EN6808), None),
+        3,
+        update_rate=0.5,
+        duration=3.0,
+        warmup=3.0,
+        properties={"SNMPBackend": "asyncio"},
+    )
+    assert report.devices == 3
+    assert report.attributes == 4 + 4 * 24
+    assert 0 < report.poll_rate <= report.target_poll_rate * 1.1
+    assert report.cpu > 0 and report.max_rss > 0
+    assert not FAKE_AGENTS
@@ -8,14 +8,29 @@
 """This module defines the component manager tests for ska-ser-snmp."""
 
 import logging
+import queue
 import time
 from typing import Any
 
+import numpy as np
 import pytest
+import yaml
+from pysnmp.proto.errind import requestTimedOut
+from pysnmp.proto.rfc1902 import Counter32, Counter64, Gauge32, Integer32, TimeTicks
+from pysnmp.proto.rfc1905 import noSuchInstance
 from ska_control_model import CommunicationStatus
 
-from ska_snmp_device.snmp_component_manager import SNMPComponentManager
-from ska_snmp_device.snmp_types import SNMPAttrInfo
+from ska_attribute_polling.attribute_polling_component_manager import AttrPollRequest
+from ska_snmp_device.asyncio_component_manager import AsyncioSNMPComponentManager
+from ska_snmp_device.definitions import load_device_definition, parse_device_definition
+from ska_snmp_device.fake_agent import FAKE_AGENTS, FAKE_BACKENDS, FakeAgent
+from ska_snmp_device.snmp_component_manager import (
+    SYS_UPTIME_OID,
+    AgentBackoff,
+    SNMPComponentManager,
+    SNMPErrorStatus,
+)
+from ska_snmp_device.snmp_types import SNMPAttrInfo, snmp_to_python
 
 
 @pytest.fixture(name="component_manager")
@@ -30,7 +45,7 @@ def component_manager_fixture(endpoint: tuple[str, int]) -> SNMPComponentManager
     def comm_state_changed(comm_state: CommunicationStatus) -> None:
         pass
 
-    def component_state_changed(state_updates: dict[str, Any]) -> None:
+    def component_state_changed(**state_updates: Any) -> None:
         pass
 
     host, port = endpoint
@@ -67,23 +82,26 @@ def component_manager_fixture(endpoint: tuple[str, int]) -> SNMPComponentManager
 
 def test_component_manager_polling_periods(
     component_manager: SNMPComponentManager,
+    monkeypatch: pytest.MonkeyPatch,
 ) -> None:
     """
     Test snmp polling period.
 
     :param component_manager: the snmp component manager
+    :param monkeypatch: pytest's monkeypatch fixture, to control the clock
     """
     mgr = component_manager
-    assert all(t == float("-inf") for t in mgr._last_polled.values())
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
 
     def time_travel(d: float) -> None:
-        mgr._last_polled.update((k, v - d) for k, v in mgr._last_polled.items())
+        nonlocal now
+        now += d
 
     attrs_to_poll = set(mgr.get_request().reads)
     assert attrs_to_poll == {"slow", "fast"}
 
-    now = time.time()
-    mgr._last_polled.update({"slow": now, "fast": now})
+    mgr.poll_succeeded({"slow": 1, "fast": 2})
 
     time_travel(0.25)
     assert not mgr.get_request().reads
@@ -96,6 +114,704 @@ def test_component_manager_polling_periods(
     to_poll = set(mgr.get_request().reads)
     assert to_poll == {"slow", "fast"}
 
-    mgr._last_polled["fast"] = time.time()
+    mgr.poll_succeeded({"fast": 2})
     to_poll = set(mgr.get_request().reads)
     assert to_poll == {"slow"}
+
+
+def test_component_manager_failed_reads_are_retried(
+    component_manager: SNMPComponentManager,
+) -> None:
+    """
+    Test that attributes are read again after a failed or partial poll.
+
+    :param component_manager: the snmp component manager
+    """
+    mgr = component_manager
+    assert set(mgr.get_request().reads) == {"slow", "fast"}
+    mgr.poll_failed(TimeoutError())
+    assert set(mgr.get_request().reads) == {"slow", "fast"}
+    mgr.poll_succeeded({"fast": 2})
+    assert set(mgr.get_request().reads) == {"slow"}
+    mgr.poll_succeeded({"slow": 1})
+    assert not mgr.get_request().reads
+
+    mgr.enqueue_write("slow", 3)
+    request = mgr.get_request()
+    assert request.writes == {"slow": 3}
+    assert request.reads == ["slow"]
+
+
+@pytest.mark.parametrize(
+    "manager_cls", [SNMPComponentManager, AsyncioSNMPComponentManager]
+)
+def test_component_manager_concurrent_pdus(
+    definition_path: str,
+    endpoint: tuple[str, int],
+    manager_cls: type[SNMPComponentManager],
+) -> None:
+    """
+    Test that concurrent PDUs return the same values as sequential ones.
+
+    :param definition_path: location of the yaml file
+    :param endpoint: host & port of the SNMP agent
+    :param manager_cls: the component manager class, i.e. SNMP backend
+    """
+    attributes = parse_device_definition(load_device_definition(definition_path, None))
+    host, port = endpoint
+
+    def poll_everything(
+        cls: type[SNMPComponentManager], max_in_flight_pdus: int
+    ) -> dict[str, Any]:
+        mgr = cls(
+            host=host,
+            port=port,
+            authority="private",
+            logger=logging.getLogger(),
+            communication_state_callback=lambda *args: None,
+            component_state_callback=lambda **kwargs: None,
+            attributes=attributes,
+            poll_rate=2.0,
+            max_objects_per_pdu=2,
+            max_in_flight_pdus=max_in_flight_pdus,
+        )
+        response = mgr.poll(AttrPollRequest(writes={}, reads=list(mgr._attributes)))
+        mgr._close_engine()
+        return response
+
+    sequential = poll_everything(SNMPComponentManager, 1)
+    assert set(sequential) == {attr.name for attr in attributes}
+    # fastPoller and slowPoller are packet counters, so they tick between polls
+    for name in ["fastPoller", "slowPoller"]:
+        del sequential[name]
+    concurrent = poll_everything(manager_cls, 4)
+    assert sequential.items() <= concurrent.items()
+
+
+@pytest.mark.parametrize(
+    "manager_cls", [SNMPComponentManager, AsyncioSNMPComponentManager]
+)
+def test_component_manager_getbulk(
+    endpoint: tuple[str, int],
+    manager_cls: type[SNMPComponentManager],
+) -> None:
+    """
+    Test that runs of indexed attributes are read with GETBULK.
+
+    The values must match those read one at a time with GET, including for
+    runs split across PDUs and runs that start at the first index.
+
+    :param endpoint: host & port of the SNMP agent
+    :param manager_cls: the component manager class, i.e. SNMP backend
+    """
+    definition = yaml.safe_load(
+        """
+        attributes:
+          - name: outlet{}Name
+            indexes: [[1, 24]]
+            oid: [ENLOGIC-PDU-MIB, pduOutletSwitchedName, 1]
+          - name: outlet{}State
+            indexes: [[3, 8]]
+            oid: [ENLOGIC-PDU-MIB, pduOutletSwitchedSTATUSState, 1]
+          - name: outlet{}Current
+            indexes: [[10, 12]]
+            oid: [ENLOGIC-PDU-MIB, pduOutletMeteredSTATUSCurrent, 1]
+          - name: description
+            oid: [SNMPv2-MIB, sysDescr, 0]
+        """
+    )
+    attributes = parse_device_definition(definition)
+    host, port = endpoint
+    mgr = manager_cls(
+        host=host,
+        port=port,
+        authority="private",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=attributes,
+        poll_rate=2.0,
+        max_objects_per_pdu=10,
+        max_in_flight_pdus=4,
+    )
+    reads = list(mgr._attributes)
+    mgr._resolve_oids()
+    gets, runs = mgr._plan_reads(reads)
+    assert gets == [*mgr._read_oids["description"]]
+    assert sorted(len(run) for run in runs) == [3, 4, 6, 10, 10]
+
+    # Count the varbinds sent with each command
+    sent = {"get": 0, "bulk": 0}
+    get_cmd, bulk_cmd = mgr._get_cmd, mgr._bulk_cmd
+
+    def counting_get_cmd(*args: Any, **kwargs: Any) -> Any:
+        sent["get"] += len(args) - 4
+        return get_cmd(*args, **kwargs)
+
+    def counting_bulk_cmd(*args: Any, **kwargs: Any) -> Any:
+        sent["bulk"] += len(args) - 6
+        return bulk_cmd(*args, **kwargs)
+
+    mgr._get_cmd = counting_get_cmd  # type: ignore[assignment]
+    mgr._bulk_cmd = counting_bulk_cmd  # type: ignore[assignment]
+    response = mgr.poll(AttrPollRequest(writes={}, reads=reads))
+    assert sent == {"get": 1, "bulk": len(runs)}
+
+    expected = {}
+    for name in reads:
+        (oid,) = mgr._read_oids[name]
+        ((error, ((_, val),)),) = mgr._snmp_cmds(get_cmd, [[mgr._read_objects[oid]]], 1)
+        assert error is None
+        expected[name] = snmp_to_python(mgr._attributes[name], val)
+    mgr._close_engine()
+    assert response == expected
+
+
+def test_component_manager_spectrum(endpoint: tuple[str, int]) -> None:
+    """
+    Test that a spectrum attribute holds the values of its column's rows.
+
+    :param endpoint: host & port of the SNMP agent
+    """
+    host, port = endpoint
+
+    def poll_everything(definition: str) -> dict[str, Any]:
+        mgr = SNMPComponentManager(
+            host=host,
+            port=port,
+            authority="private",
+            logger=logging.getLogger(),
+            communication_state_callback=lambda *args: None,
+            component_state_callback=lambda **kwargs: None,
+            attributes=parse_device_definition(yaml.safe_load(definition)),
+            poll_rate=2.0,
+            max_objects_per_pdu=24,
+        )
+        response = mgr.poll(AttrPollRequest(writes={}, reads=list(mgr._attributes)))
+        mgr._close_engine()
+        return response
+
+    spectrums = poll_everything(
+        """
+        attributes:
+          - name: outletState
+            spectrum: true
+            indexes: [[1, 24]]
+            oid: [ENLOGIC-PDU-MIB, pduOutletSwitchedSTATUSState, 1]
+          - name: outletName
+            spectrum: true
+            indexes: [[1, 24]]
+            oid: [ENLOGIC-PDU-MIB, pduOutletSwitchedName, 1]
+        """
+    )
+    scalars = poll_everything(
+        """
+        attributes:
+          - name: outlet{}State
+            indexes: [[1, 24]]
+            oid: [ENLOGIC-PDU-MIB, pduOutletSwitchedSTATUSState, 1]
+          - name: outlet{}Name
+            indexes: [[1, 24]]
+            oid: [ENLOGIC-PDU-MIB, pduOutletSwitchedName, 1]
+        """
+    )
+
+    assert isinstance(spectrums["outletState"], np.ndarray)
+    assert spectrums["outletState"].dtype == np.int64
+    assert list(spectrums["outletState"]) == [
+        scalars[f"outlet{i}State"] for i in range(1, 25)
+    ]
+    assert list(spectrums["outletName"]) == [
+        scalars[f"outlet{i}Name"] for i in range(1, 25)
+    ]
+    # Must be usable as component state, i.e. comparable with !=
+    assert not spectrums["outletState"] != spectrums["outletState"].copy()
+
+
+def test_component_manager_reports_changes_only(endpoint: tuple[str, int]) -> None:
+    """
+    Test that only values that changed by more than their deadband are reported.
+
+    :param endpoint: host & port of the SNMP agent
+    """
+    reported: list[dict[str, Any]] = []
+    host, port = endpoint
+    mgr = SNMPComponentManager(
+        host=host,
+        port=port,
+        authority="public",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: reported.append(kwargs),
+        attributes=[
+            SNMPAttrInfo(
+                attr_args={"name": "current", "dtype": float, "abs_change": 0.5},
+                polling_period=0,
+                identity=("MIB", "tastic", 1),
+            ),
+            SNMPAttrInfo(
+                attr_args={"name": "label", "dtype": str},
+                polling_period=0,
+                identity=("MIB", "tastic", 2),
+            ),
+        ],
+        poll_rate=2.0,
+        max_objects_per_pdu=24,
+    )
+
+    def changes(poll_response: dict[str, Any]) -> dict[str, Any]:
+        reported.clear()
+        mgr.poll_succeeded(poll_response)
+        return {
+            name: value
+            for update in reported
+            for name, value in update.items()
+            if name != "power"
+        }
+
+    assert changes({"current": 1.0, "label": "a"}) == {"current": 1.0, "label": "a"}
+    assert not changes({"current": 1.0, "label": "a"})
+    assert not changes({"current": 1.4, "label": "a"})
+    assert changes({"current": 1.5, "label": "b"}) == {"current": 1.5, "label": "b"}
+    assert mgr._component_state["current"] == 1.5
+
+
+def test_component_manager_write_wakes_poller(
+    definition_path: str, endpoint: tuple[str, int]
+) -> None:
+    """
+    Test that a burst of writes is sent straight away, in a single poll.
+
+    :param definition_path: location of the yaml file
+    :param endpoint: host & port of the SNMP agent
+    """
+    host, port = endpoint
+    mgr = SNMPComponentManager(
+        host=host,
+        port=port,
+        authority="private",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=parse_device_definition(
+            load_device_definition(definition_path, None)
+        ),
+        poll_rate=30.0,
+        max_objects_per_pdu=24,
+    )
+    polls: queue.SimpleQueue[tuple[AttrPollRequest, dict[str, Any]]]
+    polls = queue.SimpleQueue()
+    poll = mgr.poll
+
+    def recording_poll(poll_request: AttrPollRequest) -> dict[str, Any]:
+        response = poll(poll_request)
+        polls.put((poll_request, response))
+        return response
+
+    mgr.poll = recording_poll  # type: ignore[method-assign]
+    mgr.start_communicating()
+    try:
+        _, values = polls.get(timeout=10)
+        # Write back the current values, so as not to disturb other tests
+        writes = ["writeableInt", "writeableString", "writeableConstrainedInt"]
+        start = time.time()
+        for name in writes:
+            mgr.enqueue_write(name, values[name])
+        request, _ = polls.get(timeout=5)
+        assert time.time() - start < 5
+        assert sorted(request.writes) == sorted(writes)
+    finally:
+        mgr.stop_communicating()
+
+
+def _limited_agent(
+    error: Exception, limit: int, attribute_count: int = 40
+) -> tuple[SNMPComponentManager, list[int]]:
+    """
+    Create a component manager for a fake agent that fails big requests.
+
+    :param error: the error for GETs of more than limit objects
+    :param limit: the most objects the agent will answer in one request
+    :param attribute_count: how many (non-consecutive) attributes to define
+
+    :return: the component manager, and a list that the size of each
+        request will be appended to
+    """
+    mgr = SNMPComponentManager(
+        host="localhost",
+        port=161,
+        authority="public",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=[
+            SNMPAttrInfo(
+                attr_args={"name": f"attr{i}", "dtype": int},
+                polling_period=1.0,
+                identity=(f"1.3.6.1.4.1.99999.{i}.0",),
+            )
+            for i in range(attribute_count)
+        ],
+        poll_rate=2.0,
+        max_objects_per_pdu=24,
+    )
+    sizes: list[int] = []
+
+    def snmp_cmds(
+        cmd_fn: Any, chunks: Any, max_in_flight: int, deadline: float = 0
+    ) -> list[SNMPComponentManager.SNMPCmdResult]:
+        sizes.extend(len(chunk) for chunk in chunks)
+        return [
+            (
+                (error, [])
+                if len(chunk) > limit
+                else (None, [(obj[0].getOid(), Integer32(7)) for obj in chunk])
+            )
+            for chunk in chunks
+        ]
+
+    mgr._snmp_cmds = snmp_cmds  # type: ignore[method-assign]
+    return mgr, sizes
+
+
+def test_component_manager_adapts_pdu_size() -> None:
+    """Test that requests shrink when the agent says they're tooBig, then regrow."""
+    mgr, sizes = _limited_agent(SNMPErrorStatus("tooBig"), 10)
+    request = AttrPollRequest(writes={}, reads=list(mgr._attributes))
+
+    # Requests that are too big are split and retried in the same poll
+    response = mgr.poll(request)
+    assert response == {name: 7 for name in mgr._attributes}
+    assert sizes == [24, 16, 12, 12, 8, 8, 6, 6, 6, 6]
+    assert mgr.objects_per_pdu == 8
+
+    # Successful polls grow the requests again, but never to a size that
+    # has already failed, and only briefly beyond the agent's limit
+    for _ in range(60):
+        sizes.clear()
+        assert mgr.poll(request) == response
+        assert max(sizes) <= 11
+    assert mgr.objects_per_pdu == 10
+
+
+def test_component_manager_adapts_pdu_size_to_timeouts() -> None:
+    """Test that requests shrink when big ones time out, but small ones don't."""
+    mgr, _ = _limited_agent(requestTimedOut, 10)
+    request = AttrPollRequest(writes={}, reads=list(mgr._attributes))
+
+    # With no request answered yet, the agent might just be down
+    with pytest.raises(type(requestTimedOut)):
+        mgr.poll(request)
+    assert mgr.objects_per_pdu == 12
+
+    response = mgr.poll(request)
+    assert set(response) == {f"attr{i}" for i in range(36, 40)}
+    assert mgr.objects_per_pdu == 6
+    assert len(mgr.poll(request)) == 40
+
+
+def test_component_manager_partial_failure() -> None:
+    """Test that objects the agent doesn't have only invalidate their attributes."""
+    mgr, _ = _limited_agent(SNMPErrorStatus("tooBig"), 24, attribute_count=10)
+    mgr._resolve_oids()
+    missing = mgr._read_oids["attr3"][0]
+    rejected = mgr._read_oids["attr7"][0]
+
+    def snmp_cmds(
+        cmd_fn: Any, chunks: Any, max_in_flight: int, deadline: float = 0
+    ) -> list[SNMPComponentManager.SNMPCmdResult]:
+        results: list[SNMPComponentManager.SNMPCmdResult] = []
+        for chunk in chunks:
+            oids = [obj[0].getOid().asTuple() for obj in chunk]
+            if rejected in oids:
+                # As an SNMPv1 agent does, rejecting the whole request
+                index = oids.index(rejected) + 1
+                results.append((SNMPErrorStatus("noSuchName", index), []))
+            else:
+                var_binds = [
+                    (
+                        obj[0].getOid(),
+                        noSuchInstance if oid == missing else Integer32(7),
+                    )
+                    for obj, oid in zip(chunk, oids)
+                ]
+                results.append((None, var_binds))
+        return results
+
+    mgr._snmp_cmds = snmp_cmds  # type: ignore[method-assign]
+    request = AttrPollRequest(writes={}, reads=list(mgr._attributes))
+    response = mgr.poll(request)
+    assert response == {
+        name: None if name in {"attr3", "attr7"} else 7 for name in mgr._attributes
+    }
+
+    # Attributes that keep failing are read less often
+    for _ in range(mgr._quarantine_failures):
+        assert mgr.quarantined_attributes == []
+        mgr.poll_succeeded(response)
+    assert mgr.quarantined_attributes == ["attr3", "attr7"]
+    due = mgr._scheduler.deadline("attr3") - time.time()
+    assert due > mgr._quarantine_period - 1
+    assert mgr._scheduler.deadline("attr0") - time.time() <= 1.0
+
+    mgr.poll_succeeded({"attr3": 1})
+    assert mgr.quarantined_attributes == ["attr7"]
+    assert mgr._scheduler.deadline("attr3") - time.time() <= 1.0
+
+
+def test_component_manager_backoff() -> None:
+    """Test that unreachable agents are retried with backoff and a probe."""
+    mgr, sizes = _limited_agent(requestTimedOut, 0, attribute_count=10)
+    mgr._reconnect_jitter = 0
+    request = AttrPollRequest(writes={}, reads=list(mgr._attributes))
+
+    def poll_and_fail(exc_type: type[Exception]) -> None:
+        sizes.clear()
+        with pytest.raises(exc_type) as exc_info:
+            mgr.poll(request)
+        mgr.poll_failed(exc_info.value)
+
+    poll_and_fail(type(requestTimedOut))
+    assert mgr._reconnect_at - time.monotonic() == pytest.approx(1.0, abs=0.1)
+
+    # Nothing is sent until the reconnect delay has passed
+    poll_and_fail(AgentBackoff)
+    assert not sizes
+
+    # Then a single object is probed, and the delay doubles if that fails
+    mgr._reconnect_at = 0
+    poll_and_fail(type(requestTimedOut))
+    assert sizes == [1]
+    assert mgr._reconnect_at - time.monotonic() == pytest.approx(2.0, abs=0.1)
+
+    # Up to the maximum
+    mgr._failed_polls = 1000
+    mgr._reconnect_at = 0
+    poll_and_fail(type(requestTimedOut))
+    assert mgr._reconnect_at - time.monotonic() == pytest.approx(60.0, abs=0.1)
+
+    # Once the agent answers the probe, the full poll goes ahead
+    mgr, sizes = _limited_agent(requestTimedOut, 24, attribute_count=10)
+    mgr._failed_polls = 1
+    sizes.clear()
+    assert len(mgr.poll(request)) == 10
+    assert sizes == [1, 10]
+    assert mgr._failed_polls == 0
+    assert mgr._probe_object is not None
+    assert mgr._probe_object[0].getOid().asTuple() == SYS_UPTIME_OID
+
+
+@pytest.mark.parametrize(
+    "manager_cls", [SNMPComponentManager, AsyncioSNMPComponentManager]
+)
+def test_component_manager_poll_deadline(
+    manager_cls: type[SNMPComponentManager],
+) -> None:
+    """
+    Test that a poll stops sending requests once its deadline has passed.
+
+    :param manager_cls: the component manager class, i.e. SNMP backend
+    """
+    mgr = manager_cls(
+        host="127.0.0.1",
+        port=9,  # discard, so no agent will answer
+        authority="public",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=[
+            SNMPAttrInfo(
+                attr_args={"name": f"attr{i}", "dtype": int},
+                polling_period=1.0,
+                identity=(f"1.3.6.1.4.1.99999.{i}.0",),
+            )
+            for i in range(4)
+        ],
+        poll_rate=2.0,
+        max_objects_per_pdu=1,
+        timeout=0.2,
+        retries=0,
+        poll_deadline=0.3,
+    )
+    request = AttrPollRequest(writes={}, reads=list(mgr._attributes))
+    mgr._resolve_oids()
+    start = time.monotonic()
+    if manager_cls is AsyncioSNMPComponentManager:
+        # The requests in flight are abandoned at the deadline, before they
+        # time out, which says nothing about the agent
+        assert mgr.poll(request) == {}
+    else:
+        # The first request times out, and the rest are never sent
+        with pytest.raises(type(requestTimedOut)):
+            mgr.poll(request)
+    # pysnmp's timer only ticks every 0.5s, so without the deadline, the four
+    # requests would take at least 2s
+    assert time.monotonic() - start < 1.5
+    mgr._close_engine()
+
+
+@pytest.mark.parametrize(
+    "manager_cls", [SNMPComponentManager, AsyncioSNMPComponentManager]
+)
+def test_component_manager_stats(
+    definition_path: str,
+    endpoint: tuple[str, int],
+    manager_cls: type[SNMPComponentManager],
+) -> None:
+    """
+    Test that polls are counted in the diagnostic statistics.
+
+    :param definition_path: location of the yaml file
+    :param endpoint: host & port of the SNMP agent
+    :param manager_cls: the component manager class, i.e. SNMP backend
+    """
+    host, port = endpoint
+    mgr = manager_cls(
+        host=host,
+        port=port,
+        authority="private",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=parse_device_definition(
+            load_device_definition(definition_path, None)
+        ),
+        poll_rate=2.0,
+        max_objects_per_pdu=4,
+    )
+    request = mgr.get_request()
+    mgr.poll_succeeded(mgr.poll(request))
+    mgr._close_engine()
+
+    stats = mgr.stats
+    oids = sum(len(mgr._read_oids[name]) for name in request.reads)
+    assert stats.last_cycle["varbinds"] == oids
+    assert stats.last_cycle["pdus"] == -(-oids // 4)
+    assert stats.totals == stats.last_cycle
+    assert len(stats.durations) == 1
+    assert stats.durations.last > 0
+
+    traffic = mgr.traffic
+    assert traffic["packets_sent"] == traffic["packets_received"]
+    assert traffic["packets_sent"] == stats.last_cycle["pdus"]
+    assert traffic["bytes_sent"] > 0
+    assert traffic["bytes_received"] > traffic["bytes_sent"]
+
+    # Attributes read late count as scheduler lag
+    mgr._scheduler.schedule(request.reads[0], time.time() - 3.0)
+    mgr.get_request()
+    assert mgr.stats.lags.last >= 3.0
+
+
+def test_component_manager_stats_timeouts() -> None:
+    """Test that timeouts and retries are counted in the statistics."""
+    mgr = SNMPComponentManager(
+        host="127.0.0.1",
+        port=9,  # discard, so no agent will answer
+        authority="public",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=[
+            SNMPAttrInfo(
+                attr_args={"name": "attr", "dtype": int},
+                polling_period=1.0,
+                identity=("1.3.6.1.4.1.99999.1.0",),
+            )
+        ],
+        poll_rate=2.0,
+        max_objects_per_pdu=1,
+        timeout=0.1,
+        retries=1,
+    )
+    with pytest.raises(type(requestTimedOut)) as exc_info:
+        mgr.poll(mgr.get_request())
+    mgr.poll_failed(exc_info.value)
+    assert mgr.stats.totals == {"pdus": 1, "varbinds": 1, "timeouts": 1, "retries": 1}
+    assert mgr.traffic["packets_sent"] == 2
+    assert mgr.traffic["packets_received"] == 0
+
+
+@pytest.mark.parametrize("backend", list(FAKE_BACKENDS))
+def test_component_manager_counter_rates(backend: str) -> None:
+    """
+    Test that a counter's rate is published alongside it, from the second poll.
+
+    :param backend: the name of the SNMP backend
+    """
+    definition = yaml.safe_load(
+        """
+        attributes:
+          - name: inPkts
+            oid: [SNMPv2-MIB, snmpInPkts, 0]
+            rate: alongside
+        """
+    )
+    attributes = parse_device_definition(definition)
+    in_pkts = attributes[0].oid
+    assert in_pkts is not None
+    FAKE_AGENTS["10.0.0.3", 161] = agent = FakeAgent(
+        [
+            (".".join(map(str, in_pkts)), "65", "1000"),
+            (".".join(map(str, SYS_UPTIME_OID)), "67", "100"),
+        ]
+    )
+    mgr = FAKE_BACKENDS[backend](
+        host="10.0.0.3",
+        port=161,
+        authority="public",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=attributes,
+        poll_rate=2.0,
+        max_objects_per_pdu=24,
+    )
+    request = AttrPollRequest(writes={}, reads=["inPkts", "inPktsRate"])
+    start = time.monotonic()
+    try:
+        # The first reading is only the baseline for the rate
+        assert mgr.poll(request) == {"inPkts": 1000}
+        assert mgr._plan_reads(request.reads) == ([SYS_UPTIME_OID, in_pkts], [])
+        time.sleep(0.1)
+        agent._values[in_pkts] = Counter32(1100)
+        response = mgr.poll(request)
+        elapsed = time.monotonic() - start
+    finally:
+        mgr._close_engine()
+        del FAKE_AGENTS["10.0.0.3", 161]
+    assert response["inPkts"] == 1100
+    assert 100 / elapsed <= response["inPktsRate"] <= 100 / 0.1
+
+
+def test_component_manager_counter_wrap_and_restart() -> None:
+    """Test that counter rates survive wraparound, and restart with the agent."""
+    mgr = SNMPComponentManager(
+        host="localhost",
+        port=161,
+        authority="public",
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=[],
+        poll_rate=2.0,
+        max_objects_per_pdu=24,
+    )
+
+    def rate(name: str, count: Any, uptime: int, now: float) -> float | None:
+        return mgr._counter_rate(name, count, TimeTicks(uptime), now)
+
+    assert rate("c32", Counter32(100), 100, 0.0) is None
+    assert rate("c32", Counter32(300), 300, 2.0) == 100.0
+    assert rate("c32", Counter32(99), 500, 4.0) == (2**32 - 300 + 99) / 2
+    assert rate("c64", Counter64(2**64 - 1), 100, 0.0) is None
+    assert rate("c64", Counter64(9), 200, 1.0) == 10.0
+
+    # Other integers going down have been reset
+    assert rate("gauge", Gauge32(10), 100, 0.0) is None
+    assert rate("gauge", Gauge32(5), 200, 1.0) is None
+    assert rate("gauge", Gauge32(8), 300, 2.0) == 3.0
+
+    # If sysUpTime goes down, the agent has restarted, and so has the counter
+    assert rate("c32", Counter32(1000), 10, 5.0) is None
+    assert rate("c32", Counter32(1010), 20, 6.0) == 10.0
@@ -13,12 +13,14 @@ import string
 from enum import Enum
 from itertools import islice
 from queue import SimpleQueue
+from types import SimpleNamespace
 from typing import Any
 
 import pytest
 from more_itertools import iter_except, partition
 from tango import DevFailed, DeviceProxy, EventData, EventType
 
+from ska_snmp_device.snmp_device import SNMP_BACKENDS, SNMPDevice
 from ska_snmp_device.snmp_types import _SNMP_ENUM_INVALID_PREFIX
 
 from .conftest import expect_attribute, restore
@@ -139,6 +141,16 @@ def test_constrained_int(snmp_device: DeviceProxy) -> None:
         snmp_device.writeableConstrainedInt = 3601
 
 
+def test_objects_per_snmp_cmd(snmp_device: DeviceProxy) -> None:
+    """
+    Test that the current number of objects per request is reported.
+
+    :param snmp_device: the snmp device under test
+    """
+    # The simulator accepts requests of the default size, so it doesn't shrink
+    assert snmp_device.objectsPerSNMPCmd >= 24
+
+
 def test_polling_period(snmp_device: DeviceProxy, simulator: Any) -> None:
     """
     Test the polling period.
@@ -180,3 +192,22 @@ def test_polling_period(snmp_device: DeviceProxy, simulator: Any) -> None:
 
     assert len(fast_events) >= 7
     assert len(slow_events) <= 3
+
+
+def test_unknown_backend(definition_path: str) -> None:
+    """
+    Test that an unknown SNMPBackend is rejected, naming the valid ones.
+
+    :param definition_path: location of the yaml file
+    """
+    device = SimpleNamespace(
+        DeviceDefinition=definition_path,
+        TelmodelRepo="",
+        TelmodelCacheTTL=0,
+        V2Community="private",
+        V3UserName="",
+        SNMPBackend="twisted",
+        _backends=SNMP_BACKENDS,
+    )
+    with pytest.raises(ValueError, match="asyncore, asyncio"):
+        SNMPDevice.create_component_manager(device)  # type: ignore[arg-type]
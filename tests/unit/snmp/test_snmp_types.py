@@ -0,0 +1,113 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests the conversion of values between PySNMP and Python."""
+
+from enum import IntEnum
+from typing import Any, cast
+
+import pytest
+from pysnmp.proto.rfc1902 import Counter64, Gauge32, Integer32, OctetString
+from tango import DevEnum
+
+from ska_snmp_device.snmp_types import (
+    BitEnum,
+    SNMPAttrInfo,
+    python_to_snmp,
+    snmp_to_python,
+)
+
+
+def _attr(dtype: Any, **attr_args: Any) -> SNMPAttrInfo:
+    """
+    Return metadata for an attribute of the given type.
+
+    :param dtype: the attribute's dtype
+    :param attr_args: any other attribute args
+
+    :return: the attribute metadata
+    """
+    return SNMPAttrInfo(
+        attr_args={"name": "attr", "dtype": dtype, **attr_args},
+        polling_period=0,
+        identity=(),
+    )
+
+
+@pytest.mark.parametrize(
+    ("dtype", "value", "expected"),
+    [
+        (int, Integer32(-5), -5),
+        (int, Counter64(2**64 - 1), 2**64 - 1),
+        (float, Gauge32(7), 7),
+        (float, OctetString("2.5"), 2.5),
+        (bool, OctetString("1"), True),
+        (str, OctetString("outlet 1"), "outlet 1"),
+        (str, Integer32(3), 3),
+        (IntEnum("SNMPEnum", [("off", 0), ("on", 1)]), Integer32(1), 1),
+    ],
+)
+def test_snmp_to_python(dtype: Any, value: Any, expected: Any) -> None:
+    """
+    Test converting PySNMP values to Python.
+
+    :param dtype: the attribute's dtype
+    :param value: the PySNMP value
+    :param expected: the expected Python value
+    """
+    converted = snmp_to_python(_attr(dtype), value)
+    assert converted == expected
+    assert type(converted) is type(expected)
+
+
+def test_snmp_to_python_enum_labels() -> None:
+    """Test converting values of a DevEnum attribute with labels."""
+    attr = _attr(DevEnum, enum_labels=["zero", "one"])
+    assert snmp_to_python(attr, OctetString("1")) == 1
+
+
+def test_snmp_to_python_unsupported() -> None:
+    """Test that values that can't be converted raise ValueError."""
+    with pytest.raises(ValueError, match="attr"):
+        snmp_to_python(_attr(str), object())
+    with pytest.raises(ValueError, match="attr"):
+        snmp_to_python(_attr(float), OctetString("one"))
+
+
+def test_bits_round_trip() -> None:
+    """Test converting BITS values, including bits beyond the first byte."""
+    dtype = cast(Any, BitEnum)("SNMPEnum", [(f"bit{i}", i) for i in range(12)])
+    attr = _attr(dtype)
+
+    assert python_to_snmp(attr, [dtype.bit1, dtype.bit9]) == b"\x40\x40"
+    assert python_to_snmp(attr, []) == b"\x00\x00"
+    assert snmp_to_python(attr, OctetString(b"\x40\x40")) == [dtype.bit1, dtype.bit9]
+    assert snmp_to_python(attr, OctetString(b"\xff\xf0")) == list(dtype)
+
+    with pytest.raises(ValueError, match="attr"):
+        snmp_to_python(attr, OctetString(b"\x00\x08"))
+
+
+def test_python_to_snmp_enum() -> None:
+    """Test that writing placeholder or unknown enum values is refused."""
+    dtype = cast(Any, IntEnum)(
+        "SNMPEnum", [("_SNMPEnum_INVALID_0", 0), ("on", 1), ("off", 2)]
+    )
+    attr = _attr(dtype)
+
+    assert python_to_snmp(attr, 2) == 2
+    with pytest.raises(ValueError, match="invalid"):
+        python_to_snmp(attr, 0)
+    with pytest.raises(ValueError, match="invalid"):
+        python_to_snmp(attr, 3)
+
+
+def test_converters_are_cached() -> None:
+    """Test that each attribute builds its converters only once."""
+    attr = _attr(int)
+    assert attr.from_snmp is attr.from_snmp
+    assert attr.to_snmp is attr.to_snmp
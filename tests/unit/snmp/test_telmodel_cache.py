@@ -0,0 +1,104 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests the cache of device definitions fetched from telmodel."""
+
+import shutil
+from pathlib import Path
+
+import pytest
+import yaml
+
+from ska_snmp_device import telmodel_cache
+from ska_snmp_device.definitions import load_device_definition
+from ska_snmp_device.telmodel_cache import TelmodelCache
+
+KEY = "instrument/snmp/SKA-7357.yaml"
+
+
+@pytest.fixture(name="repo")
+def repo_fixture(tmp_path: Path, definition_path: str) -> Path:
+    """
+    Return a local directory that stands in for a telmodel repo.
+
+    :param tmp_path: a temporary directory
+    :param definition_path: location of the yaml file
+
+    :return: the repo directory, containing the definition at KEY
+    """
+    repo = tmp_path / "repo"
+    (repo / KEY).parent.mkdir(parents=True)
+    shutil.copy(definition_path, repo / KEY)
+    return repo
+
+
+def _definition(repo: Path) -> dict:
+    """
+    Return the definition at KEY in the repo.
+
+    :param repo: the repo directory
+
+    :return: the deserialised definition
+    """
+    with open(repo / KEY, encoding="utf-8") as def_file:
+        return yaml.safe_load(def_file)
+
+
+def test_telmodel_cache_ttl(repo: Path, tmp_path: Path) -> None:
+    """
+    Test that cached definitions are used until their TTL expires.
+
+    :param repo: the repo directory
+    :param tmp_path: a temporary directory
+    """
+    cache = TelmodelCache(tmp_path / "cache")
+    uri = f"file://{repo}"
+    original = _definition(repo)
+    assert cache.get(uri, KEY, ttl=60) == original
+
+    updated = {"attributes": original["attributes"][:1]}
+    with open(repo / KEY, "w", encoding="utf-8") as def_file:
+        yaml.safe_dump(updated, def_file)
+    assert cache.get(uri, KEY, ttl=60) == original
+    assert cache.get(uri, KEY, ttl=0) == updated
+
+
+def test_telmodel_cache_offline(repo: Path, tmp_path: Path) -> None:
+    """
+    Test that the last good copy is used, across restarts, if the repo is gone.
+
+    :param repo: the repo directory
+    :param tmp_path: a temporary directory
+    """
+    uri = f"file://{repo}"
+    original = _definition(repo)
+    TelmodelCache(tmp_path / "cache").get(uri, KEY, ttl=60)
+    shutil.rmtree(repo)
+
+    assert TelmodelCache(tmp_path / "cache").get(uri, KEY, ttl=0) == original
+    with pytest.raises(Exception):
+        TelmodelCache(tmp_path / "empty").get(uri, KEY, ttl=0)
+
+
+def test_load_device_definition_from_telmodel(
+    repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Test loading a device definition from a telmodel repo, through the cache.
+
+    :param repo: the repo directory
+    :param tmp_path: a temporary directory
+    :param monkeypatch: pytest's monkeypatch fixture
+    """
+    monkeypatch.setattr(
+        telmodel_cache, "_shared_cache", TelmodelCache(tmp_path / "cache")
+    )
+    original = _definition(repo)
+    assert load_device_definition(KEY, f"file://{repo}") == original
+
+    shutil.rmtree(repo)
+    assert load_device_definition(KEY, f"file://{repo}", telmodel_ttl=0) == original
@@ -0,0 +1,181 @@
+#  -*- coding: utf-8 -*-
+#
+# This file is part of the SKA SER SNMP project
+#
+#
+# Distributed under the terms of the BSD 3-clause new license.
+# See LICENSE for more info.
+"""This module tests receiving SNMP notifications."""
+
+import logging
+import queue
+import time
+from typing import Any
+
+import pytest
+from pysnmp.hlapi import (
+    CommunityData,
+    ContextData,
+    Integer32,
+    NotificationType,
+    ObjectIdentity,
+    OctetString,
+    SnmpEngine,
+    UdpTransportTarget,
+    UsmUserData,
+    sendNotification,
+)
+
+from ska_snmp_device.fake_agent import FAKE_AGENTS, FAKE_BACKENDS, FakeAgent
+from ska_snmp_device.snmp_types import SNMPAttrInfo
+from ska_snmp_device.trap_receiver import TrapReceiver
+
+TRAP_PORT = 10162
+VALUE_OID = (1, 3, 6, 1, 4, 1, 99, 1, 1)
+# SNMPv2-MIB::coldStart
+TRAP_OID = "1.3.6.1.6.3.1.1.5.1"
+
+
+def _notify(
+    access: CommunityData | UsmUserData,
+    notify_type: str,
+    value: int,
+    engine_id: str = "",
+) -> None:
+    """
+    Send a notification carrying a value for VALUE_OID to TRAP_PORT.
+
+    :param access: the community or USM user to send with
+    :param notify_type: "trap" or "inform"
+    :param value: the value to send
+    :param engine_id: the sender's SNMP engine ID, in hex, if it needs one
+    """
+    engine = (
+        SnmpEngine(snmpEngineID=OctetString(hexValue=engine_id))
+        if engine_id
+        else SnmpEngine()
+    )
+    error_indication, error_status, _, _ = next(
+        sendNotification(
+            engine,
+            access,
+            UdpTransportTarget(("127.0.0.1", TRAP_PORT), timeout=1, retries=1),
+            ContextData(),
+            notify_type,
+            NotificationType(ObjectIdentity(TRAP_OID)).addVarBinds(
+                (VALUE_OID, Integer32(value))
+            ),
+        )
+    )
+    assert not error_indication and not error_status
+
+
+@pytest.mark.parametrize(
+    ("access", "engine_id"),
+    [
+        (CommunityData("public"), ""),
+        (UsmUserData("trapuser", authKey="authkey123", privKey="privkey123"), ""),
+        (
+            UsmUserData("trapuser", authKey="authkey123", privKey="privkey123"),
+            "8000000001020304",
+        ),
+    ],
+    ids=["v2c", "v3", "v3-engine-id"],
+)
+def test_trap_receiver(access: CommunityData | UsmUserData, engine_id: str) -> None:
+    """
+    Test receiving traps and informs, with each kind of credentials.
+
+    SNMPv3 traps are only accepted if the agent's engine ID is known.
+
+    :param access: the community or USM user that the agent sends with
+    :param engine_id: the agent's SNMP engine ID, in hex, if known
+    """
+    received: queue.Queue[Any] = queue.Queue()
+    receiver = TrapReceiver(TRAP_PORT, "127.0.0.1")
+    receiver.subscribe("localhost", access, received.put, engine_id)
+    try:
+        _notify(access, "inform", 1)
+        assert dict(received.get(timeout=5))[VALUE_OID] == 1
+        _notify(access, "trap", 2, engine_id or "8000000001020305")
+        if engine_id or isinstance(access, CommunityData):
+            assert dict(received.get(timeout=5))[VALUE_OID] == 2
+        else:
+            with pytest.raises(queue.Empty):
+                received.get(timeout=0.5)
+
+        # Other communities and users are ignored
+        if isinstance(access, CommunityData):
+            _notify(CommunityData("private"), "trap", 3)
+            with pytest.raises(queue.Empty):
+                received.get(timeout=0.5)
+    finally:
+        receiver.unsubscribe("localhost", access, received.put)
+    assert receiver._engine is None
+
+
+def test_component_manager_notifications() -> None:
+    """Test that notified values are reported, and trap-driven attributes read."""
+    FAKE_AGENTS["127.0.0.1", 161] = FakeAgent(
+        [
+            ("1.3.6.1.4.1.99.1.1", "65", "1"),
+            ("1.3.6.1.4.1.99.1.2", "2", "2"),
+        ]
+    )
+    mgr = FAKE_BACKENDS["asyncio"](
+        host="127.0.0.1",
+        port=161,
+        authority="public",
+        max_objects_per_pdu=8,
+        logger=logging.getLogger(),
+        communication_state_callback=lambda *args: None,
+        component_state_callback=lambda **kwargs: None,
+        attributes=[
+            SNMPAttrInfo(
+                attr_args={"name": f"value{index}", "dtype": int},
+                polling_period=1.0,
+                identity=(),
+                oid=(1, 3, 6, 1, 4, 1, 99, 1, index),
+                trap_polling_period=60.0 if index == 2 else None,
+            )
+            for index in [1, 2]
+        ]
+        + [
+            SNMPAttrInfo(
+                attr_args={"name": "value1Rate", "dtype": float},
+                polling_period=1.0,
+                identity=(),
+                oid=VALUE_OID,
+                rate=True,
+            )
+        ],
+        poll_rate=2.0,
+        trap_port=TRAP_PORT,
+    )
+    try:
+        mgr.polling_started()
+        assert mgr._polling_period(mgr._attributes["value1"]) == 1.0
+        assert mgr._polling_period(mgr._attributes["value2"]) == 60.0
+        # The rate is reported once the counter has been read twice
+        for _ in range(2):
+            response = mgr.poll(mgr.get_request())
+            mgr.poll_succeeded(response)
+        assert response == {"value1Rate": 0.0}
+        samples = dict(mgr._counter_samples)
+        assert mgr.get_request().reads == []
+
+        _notify(CommunityData("public"), "trap", 42)
+        deadline = time.monotonic() + 5
+        while not mgr._pending_reads and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # The notified value is reported by the next poll, which also reads
+        # the trap-driven attribute, but not the rate of the counter
+        request = mgr.get_request()
+        assert request.reads == ["value2"]
+        assert mgr.poll(request) == {"value1": 42, "value2": 2}
+        assert mgr._counter_samples == samples
+    finally:
+        mgr.polling_stopped()
+        mgr._close_engine()
+        del FAKE_AGENTS["127.0.0.1", 161]
+    assert mgr._polling_period(mgr._attributes["value2"]) == 1.0